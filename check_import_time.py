@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the headless save engine
+
+Imports each headless module in a fresh interpreter with ``python -X importtime``
+and fails when it is slower than its budget or when it pulls in a GUI or
+network dependency. Run it after touching imports:
+
+    python check_import_time.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent / "src"
+
+# Cumulative import time budget in milliseconds (warm bytecode cache, best of RUNS)
+BUDGETS_MS = {
+    "core.es3_codec": 60,
+    "core.encryption": 60,
+    "core.save_manager": 80,
+    "cli": 120,
+}
+
+# Never allowed in a headless import
+FORBIDDEN = ("PyQt6", "PIL", "requests", "webbrowser", "core.language", "core.backup")
+
+RUNS = 5
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    return subprocess.run([sys.executable, *flags, "-c", code], env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module: str) -> float:
+    """Cumulative import time of ``module`` as reported by -X importtime"""
+    best = None
+    for _ in range(RUNS):
+        stderr = _run(f"import {module}", "-X", "importtime").stderr
+        for line in stderr.splitlines():
+            fields = line.rstrip().split("|")
+            # Top-level entries are indented by a single space
+            if len(fields) == 3 and fields[2] == " " + module:
+                elapsed = int(fields[1]) / 1000
+                best = elapsed if best is None else min(best, elapsed)
+    if best is None:
+        raise RuntimeError(f"No importtime entry for {module}")
+    return best
+
+
+def forbidden_imports(module: str):
+    """Forbidden modules loaded as a side effect of importing ``module``"""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {FORBIDDEN!r} if m in sys.modules))")
+    output = _run(code).stdout.strip()
+    return output.split(",") if output else []
+
+
+def main() -> int:
+    failures = 0
+    for module, budget in BUDGETS_MS.items():
+        _run(f"import {module}")  # warm the bytecode cache
+        elapsed = import_time_ms(module)
+        leaked = forbidden_imports(module)
+        ok = elapsed <= budget and not leaked
+        failures += not ok
+        status = "OK  " if ok else "FAIL"
+        extra = f"  imports {', '.join(leaked)}" if leaked else ""
+        print(f"{status} {module:<20} {elapsed:7.1f} ms (budget {budget} ms){extra}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+R.E.P.O Save Editor - command line launcher (repo-save)
+
+Batch operations on save files without starting the GUI, see src/cli.py
+"""
+
+import os
+import sys
+
+# Imposta la directory principale come variabile d'ambiente
+root_dir = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("REPO_SAVE_EDITOR_ROOT", root_dir)
+
+# Aggiungi la directory src al path (anche per i processi worker)
+sys.path.insert(0, os.path.join(root_dir, "src"))
+
+if __name__ == "__main__":
+    from cli import main
+    sys.exit(main())
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+R.E.P.O Save Editor - command line interface
+
+Headless batch operations over save files, directories or glob patterns:
+
+    repo-save summary                      # every save in the default directory
+    repo-save decrypt saves/ -o dumps/
+    repo-save encrypt dumps/*.json -o saves/
+    repo-save get -p teamName.value "saves/**/*.es3"
+    repo-save set -e dictionaryOfDictionaries.value.runStats.currency=999 save.es3
+    repo-save apply patch.json saves/
+    repo-save validate backups/
+    repo-save diff save.es3 backups/
+    repo-save merge base.es3 theirs.es3 ours.es3
+
+Files are processed on a process pool and every result is printed as soon as
+it is ready, one JSON object per line (NDJSON). Qt is never imported.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from core.batch_edit import ALL_PLAYERS
+from core.diff import diff_files, summarize
+from core.merge import OURS, THEIRS
+from core.es3_codec import ES3Codec, default_codec
+from core.es3_stream import ES3_PASSWORD
+from core.save_cache import save_cache
+from core.save_manager import SaveManager
+from core.schema import validate
+
+# Same default as utils.save_manager.savefile_dir, which cannot be imported without Qt
+DEFAULT_SAVE_DIR = Path.home() / "AppData" / "LocalLow" / "semiwork" / "Repo" / "saves"
+
+_GLOB_CHARS = set("*?[")
+
+
+def expand_targets(targets: Iterable[str], pattern: str = "*.es3") -> List[Path]:
+    """
+    Expand files, directories (recursively) and glob patterns into a file list
+
+    Args:
+        targets: Paths or patterns given on the command line
+        pattern: File pattern used inside directories
+
+    Returns:
+        List[Path]: Existing files, in order and without duplicates
+    """
+    files = []
+    seen = set()
+
+    def add(path: Path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen and path.is_file():
+            seen.add(key)
+            files.append(path)
+
+    for target in targets:
+        if _GLOB_CHARS & set(target):
+            matches = [Path(match) for match in sorted(glob.glob(target, recursive=True))]
+        else:
+            matches = [Path(target)]
+        for match in matches:
+            if match.is_dir():
+                for path in sorted(match.rglob(pattern)):
+                    add(path)
+            else:
+                add(match)
+    return files
+
+
+def assign(manager: SaveManager, path: str, value: Any) -> Any:
+    """Set the value at the dotted ``path`` (the parent must exist) and return the previous one"""
+    previous = manager.get_value(path)
+    if not manager.set_value(path, value):
+        raise KeyError(path.rpartition(".")[0] or path)
+    return previous
+
+
+def _selector_rank(table, selector: str) -> int:
+    """Order of the player selectors of a patch: ``*`` first, Steam IDs last"""
+    if selector in ALL_PLAYERS:
+        return 0
+    return 2 if selector in table else 1
+
+
+def parse_value(text: str) -> Any:
+    """Command line values are JSON when they parse as JSON, plain strings otherwise"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def parse_assignment(text: str):
+    path, sep, value = text.partition("=")
+    if not sep or not path:
+        raise argparse.ArgumentTypeError(f"expected PATH=VALUE, got {text!r}")
+    return path, parse_value(value)
+
+
+def _output_path(source: Path, output_dir: Optional[str], name: str) -> Path:
+    return (Path(output_dir) if output_dir else source.parent) / name
+
+
+def _open(path: Path) -> SaveManager:
+    manager = SaveManager()
+    ok, message = manager.open_file(str(path))
+    if not ok:
+        raise RuntimeError(message)
+    return manager
+
+
+def _save(manager: SaveManager, path: Path):
+    ok, message = manager.save_file(str(path))
+    if not ok:
+        raise RuntimeError(message)
+
+
+def cmd_decrypt(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    output = _output_path(path, options["output"], path.stem + ".json")
+    plaintext = ES3Codec(options["password"]).decrypt_file(path)
+    if options["indent"] is not None:
+        plaintext = json.dumps(json.loads(plaintext), indent=options["indent"],
+                               ensure_ascii=False).encode('utf-8')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(plaintext)
+    return {"output": str(output), "bytes": len(plaintext)}
+
+
+def cmd_encrypt(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    # save.json -> save.es3, save.es3.json -> save.es3
+    name = path.stem if path.suffix == ".json" else path.name
+    output = _output_path(path, options["output"], name if name.endswith(".es3") else name + ".es3")
+    data = path.read_bytes()
+    json.loads(data)  # never encrypt something the game cannot parse
+    output.parent.mkdir(parents=True, exist_ok=True)
+    ES3Codec(options["password"]).encrypt_file(data, output, options["gzip"])
+    return {"output": str(output), "bytes": output.stat().st_size}
+
+
+def cmd_summary(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    manager = _open(path)
+    return {
+        "info": manager.get_file_info(),
+        "world": manager.get_world_data(),
+        "players": manager.get_player_data(),
+    }
+
+
+def cmd_get(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    manager = _open(path)
+    return {"values": {dotted: manager.get_value(dotted) for dotted in options["paths"]}}
+
+
+def cmd_set(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    manager = _open(path)
+    changes = {}
+    for dotted, value in options["assignments"]:
+        previous = assign(manager, dotted, value)
+        changes[dotted] = {"old": previous, "new": value}
+    if not options["dry_run"]:
+        _save(manager, path)
+    return {"changes": changes, "saved": not options["dry_run"]}
+
+
+def cmd_apply(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply a patch through the SaveManager accessors
+
+    Patch format::
+
+        {
+            "world": {"currency": 999, "lives": 3},
+            "players": {"*": {"health": 100, "upgrades": {"speed": 5}}},
+            "set": {"teamName.value": "New name"}
+        }
+
+    Player keys are Steam IDs, player names or ``*`` for everyone; Steam IDs
+    win over names, which win over ``*``. Player changes are validated and
+    applied as one batch (see ``core.batch_edit``).
+    """
+    patch = options["patch"]
+    manager = _open(path)
+    changes = {}
+
+    if patch.get("world"):
+        world = manager.get_world_data()
+        updated = dict(world, **patch["world"])
+        ok, message = manager.validate_world_data(updated)
+        if not ok:
+            raise ValueError(message)
+        world_changes = {key: {"old": world.get(key), "new": value}
+                         for key, value in patch["world"].items() if world.get(key) != value}
+        if world_changes:
+            manager.update_world_data(updated)
+            changes["world"] = world_changes
+
+    player_patch = patch.get("players") or {}
+    if player_patch:
+        table = manager.player_table
+        operations = []
+        for selector, update in sorted(player_patch.items(), key=lambda item: _selector_rank(table, item[0])):
+            update = update or {}
+            if "health" in update:
+                operations.append((selector, "health", update["health"]))
+            for field, value in (update.get("upgrades") or {}).items():
+                operations.append((selector, f"upgrade_{field}", value))
+        player_changes = manager.apply_batch(operations)
+        if player_changes:
+            changes["players"] = player_changes.by_player()
+
+    for dotted, value in (patch.get("set") or {}).items():
+        previous = assign(manager, dotted, value)
+        changes.setdefault("set", {})[dotted] = {"old": previous, "new": value}
+
+    if changes and not options["dry_run"]:
+        _save(manager, path)
+    return {"changes": changes, "saved": bool(changes) and not options["dry_run"]}
+
+
+def cmd_validate(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    # Read only: no SaveManager, no trackers or journal for a document nobody edits
+    violations = validate(save_cache.load(path, default_codec.load))
+    return {"valid": not violations, "violations": [violation.to_dict() for violation in violations]}
+
+
+def cmd_diff(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    # Both sides stay indexed per worker: the base is hashed once for all the targets it meets
+    differences = diff_files(path, options["base"])
+    record = {"base": options["base"], "summary": summarize(differences)}
+    if not options["summary_only"]:
+        record["differences"] = [difference.to_dict() for difference in differences]
+    return record
+
+
+def cmd_merge(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Three-way merge of ``theirs`` into the target, from their common ``base``
+
+    Conflicting paths are reported and nothing is saved unless ``--prefer``
+    says which side wins them.
+    """
+    manager = _open(path)
+    prefer = options["prefer"]
+    plan = manager.merge(options["base"], options["theirs"], prefer)
+    record = plan.to_dict()
+    save = (plan.clean or prefer is not None) and bool(plan.resolved(prefer)) and not options["dry_run"]
+    if save:
+        _save(manager, path)
+    record["saved"] = save
+    return record
+
+
+COMMANDS = {
+    "decrypt": cmd_decrypt,
+    "encrypt": cmd_encrypt,
+    "summary": cmd_summary,
+    "get": cmd_get,
+    "set": cmd_set,
+    "apply": cmd_apply,
+    "validate": cmd_validate,
+    "diff": cmd_diff,
+    "merge": cmd_merge,
+}
+
+
+def run_task(command: str, path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one command on one file; never raises, failures become ``ok: false`` records"""
+    record = {"file": path, "command": command}
+    # Options travel with the task: spawned workers do not inherit module state
+    save_cache.enabled = not options.get("no_cache")
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            record.update(COMMANDS[command](Path(path), options))
+        record["ok"] = True
+    except Exception as e:
+        record["ok"] = False
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def run_batch(command: str, files: List[Path], options: Dict[str, Any],
+              jobs: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Run ``command`` on every file, on a process pool when useful, yielding results as they complete"""
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    if jobs <= 1:
+        for path in files:
+            yield run_task(command, str(path), options)
+        return
+    # multiprocessing is only paid for when there is something to fan out
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_task, command, str(path), options) for path in files]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="repo-save",
+        description="Batch operations on R.E.P.O save files (NDJSON output, one line per file)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write the decoded-save cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_text, pattern="*.es3", leading=()):
+        sub = subparsers.add_parser(name, help=help_text)
+        for argument, argument_help in leading:
+            sub.add_argument(argument, help=argument_help)
+        sub.add_argument("targets", nargs="*",
+                         help=f"files, directories or glob patterns (default: {DEFAULT_SAVE_DIR})")
+        sub.set_defaults(pattern=pattern)
+        return sub
+
+    sub = add_command("decrypt", "write the decrypted JSON of each save")
+    sub.add_argument("-o", "--output", help="output directory (default: next to each save)")
+    sub.add_argument("--indent", type=int, default=None, help="re-indent the JSON")
+    sub.add_argument("--password", default=ES3_PASSWORD)
+
+    sub = add_command("encrypt", "encrypt JSON files into saves", pattern="*.json")
+    sub.add_argument("-o", "--output", help="output directory (default: next to each file)")
+    sub.add_argument("--gzip", action="store_true", help="compress before encrypting")
+    sub.add_argument("--password", default=ES3_PASSWORD)
+
+    add_command("summary", "team, world and player data of each save")
+
+    sub = add_command("get", "read values by dotted path")
+    sub.add_argument("-p", "--path", dest="paths", action="append", required=True,
+                     help="dotted path, e.g. teamName.value (repeatable)")
+
+    sub = add_command("set", "write values by dotted path")
+    sub.add_argument("-e", "--set", dest="assignments", action="append", required=True,
+                     type=parse_assignment, help="PATH=VALUE, VALUE parsed as JSON when possible (repeatable)")
+    sub.add_argument("-n", "--dry-run", action="store_true", help="report changes without saving")
+
+    sub = add_command("apply", "apply a JSON patch of world/player/raw changes",
+                      leading=[("patch", "patch file (see cmd_apply for the format)")])
+    sub.add_argument("-n", "--dry-run", action="store_true", help="report changes without saving")
+
+    add_command("validate", "check each save against the save schema (exit status 1 if any is invalid)")
+
+    sub = add_command("diff", "added, removed and changed paths from each save (e.g. backups) to a base save",
+                      leading=[("base", "save compared with every target")])
+    sub.add_argument("-s", "--summary-only", action="store_true", help="only count the differences")
+
+    sub = add_command("merge", "merge the changes of THEIRS into each save, from their common BASE "
+                               "(exit status 1 on unresolved conflicts)",
+                      leading=[("base", "save both versions started from"),
+                               ("theirs", "version edited in parallel")])
+    sub.add_argument("--prefer", choices=(OURS, THEIRS), default=None,
+                     help="side that wins conflicting paths (default: report conflicts, save nothing)")
+    sub.add_argument("-n", "--dry-run", action="store_true", help="report the merge without saving")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    options = {key: value for key, value in vars(args).items()
+               if key not in ("command", "targets", "jobs", "pattern")}
+    if args.command == "apply":
+        with open(args.patch, encoding='utf-8') as f:
+            options["patch"] = json.load(f)
+
+    files = expand_targets(args.targets or [str(DEFAULT_SAVE_DIR)], args.pattern)
+    if not files:
+        print("repo-save: no matching files", file=sys.stderr)
+        return 2
+
+    failures = 0
+    for record in run_batch(args.command, files, options, args.jobs):
+        unresolved = record.get("clean") is False and not options.get("prefer")
+        failures += not record["ok"] or record.get("valid") is False or unresolved
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
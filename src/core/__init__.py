@@ -2,15 +2,31 @@
 Funzionalità core per R.E.P.O Save Editor
 """
 
-from core.language import LanguageManager, tr
-from core.error_handler import handle_error, REPOError, SaveLoadError, DataError, EncryptionError
-from core.backup import BackupManager
+import importlib
 
-# Istanze globali
-language_manager = LanguageManager()
+# Import pigri: il motore dei salvataggi (es3_codec, save_manager, ...) non deve
+# caricare Qt, le lingue o il gestore dei backup solo perché vive in questo package
+_LAZY_ATTRIBUTES = {
+    'LanguageManager': ('core.language', 'LanguageManager'),
+    'language_manager': ('core.language', 'language_manager'),
+    'tr': ('core.language', 'tr'),
+    'BackupManager': ('core.backup', 'BackupManager'),
+    'backup_manager': ('core.backup', 'backup_manager'),
+    'handle_error': ('core.error_handler', 'handle_error'),
+    'REPOError': ('core.error_handler', 'REPOError'),
+    'SaveLoadError': ('core.error_handler', 'SaveLoadError'),
+    'DataError': ('core.error_handler', 'DataError'),
+    'EncryptionError': ('core.error_handler', 'EncryptionError'),
+}
 
-
-backup_manager = BackupManager()
+def __getattr__(name):
+    """Importa alla prima richiesta gli oggetti globali del package"""
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module 'core' has no attribute {name!r}")
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module(module_name), attribute)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'language_manager', 'tr', 'backup_manager',
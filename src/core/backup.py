@@ -3,21 +3,33 @@
 import os
 import json
 import shutil
-import time
-import threading
-from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
+
+from .backup_store import DEFAULT_CHECKPOINT_INTERVAL, BackupStore
+from .diff import Difference, diff_files, summarize
+from .retention import RetentionPolicy, plan_retention
+from .save_watcher import DEFAULT_DEBOUNCE, SaveWatcher
 
 class BackupManager:
     """Gestisce i backup automatici dei salvataggi"""
     
     def __init__(self):
         self.settings = {}
-        self.backup_thread = None
-        self.stop_backup = threading.Event()
+        self.watcher = None
+        self._store = None
         self.load_settings()
         
+    @property
+    def store(self) -> BackupStore:
+        """Archivio deduplicato dei backup nella cartella configurata"""
+        backup_path = self.settings.get("backup_path", "backups")
+        interval = self.settings.get("backup_checkpoint_interval", DEFAULT_CHECKPOINT_INTERVAL)
+        if (self._store is None or self._store.root != Path(backup_path)
+                or self._store.checkpoint_interval != interval):
+            self._store = BackupStore(backup_path, checkpoint_interval=interval)
+        return self._store
+        
     def load_settings(self):
         """Carica le impostazioni di backup dal file settings.json"""
         try:
@@ -61,11 +73,16 @@ class BackupManager:
         """
         Crea un backup del file di salvataggio
         
+        Il contenuto viene salvato una sola volta per stato distinto, come
+        differenza compressa rispetto al backup precedente (vedi
+        core.backup_store): se il salvataggio non è cambiato dall'ultimo
+        backup non viene scritto nulla.
+        
         Args:
             save_path: Percorso del file di salvataggio
             
         Returns:
-            Percorso del file di backup o None in caso di errore
+            Percorso del backup (il suo manifest) o None in caso di errore
         """
         try:
             # Verifica che il file esista
@@ -73,18 +90,12 @@ class BackupManager:
                 print(f"File di salvataggio non trovato: {save_path}")
                 return None
                 
-            # Crea il nome del file di backup
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_name = os.path.basename(save_path)
-            backup_name = f"{os.path.splitext(save_name)[0]}_{timestamp}{os.path.splitext(save_name)[1]}"
-            backup_path = os.path.join(self.settings.get("backup_path", "backups"), backup_name)
-            
-            # Crea la cartella di backup se non esiste
-            os.makedirs(os.path.dirname(backup_path), exist_ok=True)
-            
-            # Copia il file
-            shutil.copy2(save_path, backup_path)
-            print(f"Backup creato: {backup_path}")
+            snapshot, created = self.store.add(save_path)
+            backup_path = self.store.manifest_path(snapshot.id)
+            if not created:
+                print(f"Salvataggio invariato dall'ultimo backup: {snapshot.id}")
+                return backup_path
+            print(f"Backup creato: {snapshot.id}")
             
             # Elimina i backup più vecchi se necessario
             self.cleanup_old_backups()
@@ -95,120 +106,116 @@ class BackupManager:
             print(f"Errore durante la creazione del backup: {str(e)}")
             return None
             
-    def cleanup_old_backups(self):
-        """Elimina i backup più vecchi in base al numero massimo da mantenere"""
-        try:
-            backup_path = self.settings.get("backup_path", "backups")
-            max_backups = self.settings.get("backup_count", 5)
-            
-            # Ottieni tutti i file di backup
-            backup_files = []
-            for file in os.listdir(backup_path):
-                file_path = os.path.join(backup_path, file)
-                if os.path.isfile(file_path) and file.endswith(".es3"):
-                    backup_files.append((file_path, os.path.getmtime(file_path)))
-                    
-            # Ordina per data di modifica (più recente prima)
-            backup_files.sort(key=lambda x: x[1], reverse=True)
+    def cleanup_old_backups(self, dry_run: bool = False,
+                            policy: Optional[RetentionPolicy] = None) -> Optional[Dict[str, Any]]:
+        """
+        Elimina i backup non più necessari secondo la politica di conservazione
+        
+        Ogni salvataggio viene trattato separatamente (vedi core.retention): si
+        tengono gli ultimi "backup_count" backup, tutti quelli dell'ultima ora,
+        uno all'ora per un giorno, uno al giorno per un mese e uno alla
+        settimana oltre.
+        
+        Args:
+            dry_run: Se True non elimina nulla e restituisce solo il resoconto
+            policy: Politica da applicare (quella delle impostazioni se None)
             
-            # Elimina i backup in eccesso
-            if len(backup_files) > max_backups:
-                for file_path, _ in backup_files[max_backups:]:
-                    os.remove(file_path)
-                    print(f"Backup eliminato: {file_path}")
+        Returns:
+            Resoconto dei backup tenuti ed eliminati o None in caso di errore
+        """
+        try:
+            policy = policy or RetentionPolicy.from_settings(self.settings)
+            plan = plan_retention(self.store.snapshots(), policy)
+            report = plan.to_dict()
+            if dry_run or not plan.prune:
+                return report
+                
+            for snapshot in plan.prune:
+                print(f"Backup eliminato: {snapshot.id}")
+            # Un'unica eliminazione; i contenuti ancora usati da altri snapshot restano
+            freed = self.store.remove(plan.prune)
+            report["freed_bytes"] = freed
+            if freed:
+                print(f"Spazio liberato dall'archivio dei backup: {freed} byte")
+            return report
                     
         except Exception as e:
             print(f"Errore durante la pulizia dei backup: {str(e)}")
+            return None
             
     def start_auto_backup(self, save_path: str):
         """
-        Avvia il thread di backup automatico
+        Avvia il backup automatico di un salvataggio
+        
+        Il file viene sorvegliato (inotify su Linux, controllo periodico
+        altrove) da un unico thread per tutti i salvataggi: il backup viene
+        creato quando il file cambia e le scritture del gioco sono terminate,
+        al massimo una volta ogni "backup_interval" minuti.
         
         Args:
             save_path: Percorso del file di salvataggio
         """
-        # Ferma eventuali thread di backup in esecuzione
-        self.stop_auto_backup()
-        
         # Verifica che il backup automatico sia abilitato
         if not self.settings.get("auto_backup", True):
             print("Backup automatico disabilitato")
             return
             
-        # Avvia il thread di backup
-        self.stop_backup.clear()
-        self.backup_thread = threading.Thread(
-            target=self._auto_backup_thread,
-            args=(save_path,),
-            daemon=True
-        )
-        self.backup_thread.start()
-        print(f"Thread di backup automatico avviato per: {save_path}")
+        if self.watcher is None:
+            self.watcher = SaveWatcher(
+                self.create_backup,
+                debounce=self.settings.get("backup_debounce", DEFAULT_DEBOUNCE),
+                min_interval=self.settings.get("backup_interval", 5) * 60
+            )
+        self.watcher.watch(save_path)
+        print(f"Backup automatico avviato per: {save_path}")
         
-    def _auto_backup_thread(self, save_path: str):
+    def stop_auto_backup(self, save_path: Optional[str] = None):
         """
-        Thread di backup automatico
+        Ferma il backup automatico
         
         Args:
-            save_path: Percorso del file di salvataggio
+            save_path: Salvataggio da non sorvegliare più (tutti se None)
         """
-        try:
-            interval_minutes = self.settings.get("backup_interval", 5)
-            interval_seconds = interval_minutes * 60
-            
-            while not self.stop_backup.is_set():
-                # Attendi l'intervallo specificato
-                for _ in range(interval_seconds):
-                    if self.stop_backup.is_set():
-                        break
-                    time.sleep(1)
-                    
-                # Crea il backup
-                if not self.stop_backup.is_set():
-                    self.create_backup(save_path)
-                    
-        except Exception as e:
-            print(f"Errore nel thread di backup automatico: {str(e)}")
-            
-    def stop_auto_backup(self):
-        """Ferma il thread di backup automatico"""
-        if self.backup_thread and self.backup_thread.is_alive():
-            self.stop_backup.set()
-            self.backup_thread.join(timeout=2)
-            print("Thread di backup automatico fermato")
+        if self.watcher is None:
+            return
+        if save_path is not None:
+            if self.watcher.unwatch(save_path):
+                print(f"Backup automatico fermato per: {save_path}")
+            return
+        self.watcher.stop()
+        print("Backup automatico fermato")
             
-    def get_backup_list(self) -> List[Dict[str, Any]]:
+    def get_backup_list(self, save: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Ottiene la lista dei backup disponibili
         
+        La lista viene letta dal catalogo dei backup (vedi core.backup_catalog),
+        senza esaminare la cartella.
+        
+        Args:
+            save: Nome del file di salvataggio di cui elencare i backup (tutti se None)
+            limit: Numero massimo di backup, i più recenti
+            
         Returns:
-            Lista di dizionari con informazioni sui backup
+            Lista di dizionari con informazioni sui backup, dal più recente
         """
         try:
-            backup_path = self.settings.get("backup_path", "backups")
-            
-            # Ottieni tutti i file di backup
+            store = self.store
             backup_files = []
-            for file in os.listdir(backup_path):
-                file_path = os.path.join(backup_path, file)
-                if os.path.isfile(file_path) and file.endswith(".es3"):
-                    # Estrai il timestamp dal nome del file
-                    timestamp_str = file.split("_")[-1].split(".")[0]
-                    try:
-                        timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-                        formatted_date = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                    except:
-                        formatted_date = "Unknown"
-                        
-                    backup_files.append({
-                        "path": file_path,
-                        "name": file,
-                        "date": formatted_date,
-                        "size": os.path.getsize(file_path)
-                    })
-                    
-            # Ordina per data di modifica (più recente prima)
-            backup_files.sort(key=lambda x: x["name"], reverse=True)
+            for snapshot in store.snapshots(save=save, limit=limit):
+                entry = {
+                    # Snapshot dell'archivio: il percorso è il loro manifest
+                    "path": snapshot.path or store.manifest_path(snapshot.id),
+                    "name": snapshot.id,
+                    "save": snapshot.save,
+                    "date": snapshot.created.strftime("%Y-%m-%d %H:%M:%S"),
+                    "size": snapshot.size,
+                    "team_name": snapshot.team_name,
+                    "level": snapshot.level
+                }
+                if snapshot.path is None:
+                    entry["snapshot"] = snapshot.id
+                backup_files.append(entry)
             
             return backup_files
             
@@ -216,18 +223,68 @@ class BackupManager:
             print(f"Errore durante l'ottenimento della lista dei backup: {str(e)}")
             return []
             
+    def diff_backup(self, backup_path: str, current: Union[str, Any]) -> Optional[List[Difference]]:
+        """
+        Differenze tra un backup e il salvataggio corrente
+        
+        Args:
+            backup_path: Percorso del file di backup o del manifest di uno snapshot
+            current: Percorso del salvataggio oppure documento aperto nell'editor
+            
+        Returns:
+            Lista delle differenze (vedi core.diff) o None in caso di errore
+        """
+        try:
+            snapshot = self.store.find(backup_path)
+            if snapshot is not None:
+                return diff_files(backup_path, current, lambda path: self.store.document(snapshot))
+            return diff_files(backup_path, current)
+        except Exception as e:
+            print(f"Errore durante il confronto con il backup {backup_path}: {str(e)}")
+            return None
+            
+    def compare_with_backups(self, current: Union[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Confronta il salvataggio corrente con tutti i backup disponibili
+        
+        Ogni backup viene decifrato e indicizzato una sola volta finché il file
+        non cambia, quindi i confronti successivi percorrono solo i rami diversi.
+        
+        Args:
+            current: Percorso del salvataggio oppure documento aperto nell'editor
+            
+        Returns:
+            Voci di get_backup_list con il conteggio delle differenze in "changes"
+            (None se il backup non è leggibile)
+        """
+        backups = self.get_backup_list()
+        for backup in backups:
+            differences = self.diff_backup(backup["path"], current)
+            backup["changes"] = summarize(differences) if differences is not None else None
+        return backups
+            
     def restore_backup(self, backup_path: str, target_path: str) -> bool:
         """
         Ripristina un backup
         
         Args:
-            backup_path: Percorso del file di backup
+            backup_path: Percorso del file di backup o del manifest di uno snapshot
             target_path: Percorso di destinazione
             
         Returns:
             True se il ripristino è avvenuto con successo, False altrimenti
         """
         try:
+            snapshot = self.store.find(backup_path)
+            if snapshot is not None:
+                # Verifica che lo stato sia ricostruibile prima di toccare il file corrente
+                self.store.payload(snapshot.blob)
+                if os.path.exists(target_path):
+                    self.create_backup(target_path)
+                self.store.restore(snapshot, target_path)
+                print(f"Backup ripristinato: {snapshot.id} -> {target_path}")
+                return True
+                
             # Verifica che il file di backup esista
             if not os.path.exists(backup_path):
                 print(f"File di backup non trovato: {backup_path}")
@@ -276,6 +333,13 @@ class BackupManager:
         
         # Assicurati che la cartella di backup esista
         os.makedirs(self.settings["backup_path"], exist_ok=True)
+        
+        # Applica le nuove impostazioni ai salvataggi sorvegliati
+        if self.watcher is not None:
+            if not self.settings["auto_backup"]:
+                self.stop_auto_backup()
+            else:
+                self.watcher.min_interval = self.settings["backup_interval"] * 60
 
 # Istanza globale del gestore dei backup
 backup_manager = BackupManager()
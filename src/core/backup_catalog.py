@@ -0,0 +1,186 @@
+"""SQLite catalog of the backups of a backup directory
+
+One row per backup with what listing and pruning need: save slot, source
+path, time, size, content hash, team name and level. Lookups by source, slot,
+time and blob go through indexes, so listing, filtering and choosing what to
+prune stay instant with tens of thousands of backups and never touch the
+directory.
+
+The catalog is an index, not the record: the snapshot manifests of
+``backup_store`` (and the plain copies written by older versions) stay on
+disk and the catalog is rebuilt from them whenever the directories it was
+built from changed behind its back (see ``BackupStore.refresh``).
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+# Bump when the table layout changes: older catalogs are rebuilt
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id TEXT PRIMARY KEY,
+    save TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created REAL NOT NULL,
+    blob TEXT,
+    size INTEGER NOT NULL,
+    team_name TEXT,
+    level INTEGER,
+    fingerprint TEXT,
+    cipher TEXT,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_by_source ON backups (source, created);
+CREATE INDEX IF NOT EXISTS backups_by_save ON backups (save, created);
+CREATE INDEX IF NOT EXISTS backups_by_created ON backups (created);
+CREATE INDEX IF NOT EXISTS backups_by_blob ON backups (blob);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = ("id", "save", "source", "created", "blob", "size", "team_name", "level", "fingerprint",
+            "cipher", "path")
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM backups"
+_INSERT = (f"INSERT OR REPLACE INTO backups ({', '.join(_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * len(_COLUMNS))})")
+
+
+class BackupCatalog:
+    """
+    Rows of the backups of one directory
+
+    ``snapshot_type`` builds the returned objects (``backup_store.Snapshot``)
+    from the columns, in table order. Calls are not synchronised: the store
+    serialises them under its own lock.
+
+    Args:
+        path: Database file, created with its directory on first use
+        snapshot_type: Class of the returned backups
+    """
+
+    def __init__(self, path: Union[str, Path], snapshot_type: type):
+        self.path = Path(path)
+        self.snapshot_type = snapshot_type
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Used from the auto-backup thread as well, always under the store lock
+            connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                connection.executescript("DROP TABLE IF EXISTS backups; DROP TABLE IF EXISTS meta;")
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # Rows
+
+    @staticmethod
+    def _row(snapshot: Any) -> tuple:
+        return (snapshot.id, snapshot.save, snapshot.source, snapshot.created.timestamp(), snapshot.blob,
+                snapshot.size, snapshot.team_name, snapshot.level,
+                ",".join(map(str, snapshot.fingerprint)) if snapshot.fingerprint else None,
+                snapshot.cipher, snapshot.path)
+
+    def _snapshot(self, row: tuple) -> Any:
+        id, save, source, created, blob, size, team_name, level, fingerprint, cipher, path = row
+        return self.snapshot_type(id, save, source, datetime.fromtimestamp(created), blob, size,
+                                  tuple(map(int, fingerprint.split(","))) if fingerprint else None,
+                                  cipher, team_name, level, path)
+
+    def put(self, snapshot: Any):
+        """Add or update a backup"""
+        with self.connection:
+            self.connection.execute(_INSERT, self._row(snapshot))
+
+    def delete(self, ids: Iterable[str]):
+        with self.connection:
+            self.connection.executemany("DELETE FROM backups WHERE id = ?", ((id,) for id in ids))
+
+    def replace(self, snapshots: Iterable[Any], state: Optional[str] = None):
+        """Replace every row (rebuild), recording the state of the directories it was built from"""
+        with self.connection:
+            self.connection.execute("DELETE FROM backups")
+            self.connection.executemany(_INSERT, (self._row(snapshot) for snapshot in snapshots))
+            if state is not None:
+                self._set_state(state)
+
+    # Queries
+
+    def get(self, snapshot_id: str) -> Optional[Any]:
+        row = self.connection.execute(f"{_SELECT} WHERE id = ?", (snapshot_id,)).fetchone()
+        return self._snapshot(row) if row else None
+
+    @staticmethod
+    def _where(source: Optional[str], save: Optional[str], team_name: Optional[str],
+               since: Optional[datetime], until: Optional[datetime]):
+        clauses, parameters = [], []
+        for column, value in (("source", source), ("save", save), ("team_name", team_name)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                parameters.append(value)
+        if since is not None:
+            clauses.append("created >= ?")
+            parameters.append(since.timestamp())
+        if until is not None:
+            clauses.append("created < ?")
+            parameters.append(until.timestamp())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", parameters
+
+    def query(self, source: Optional[str] = None, save: Optional[str] = None, team_name: Optional[str] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None,
+              limit: Optional[int] = None, offset: int = 0) -> List[Any]:
+        """
+        Backups, newest first, matching every filter given
+
+        Args:
+            source: Absolute path of the backed-up save
+            save: Save slot (file name of the save)
+            team_name: Team name recorded at backup time
+            since, until: Time range, ``until`` excluded
+            limit, offset: Page of the results
+        """
+        where, parameters = self._where(source, save, team_name, since, until)
+        sql = f"{_SELECT}{where} ORDER BY created DESC, id DESC LIMIT ? OFFSET ?"
+        rows = self.connection.execute(sql, parameters + [-1 if limit is None else limit, offset])
+        return [self._snapshot(row) for row in rows]
+
+    def count(self, source: Optional[str] = None, save: Optional[str] = None, team_name: Optional[str] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+        where, parameters = self._where(source, save, team_name, since, until)
+        return self.connection.execute(f"SELECT COUNT(*) FROM backups{where}", parameters).fetchone()[0]
+
+    def blobs(self) -> Set[str]:
+        """Content hashes referenced by at least one backup"""
+        return {row[0] for row in self.connection.execute("SELECT DISTINCT blob FROM backups WHERE blob IS NOT NULL")}
+
+    def totals(self) -> Dict[str, int]:
+        snapshots, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM backups").fetchone()
+        return {"snapshots": snapshots, "logical_bytes": size}
+
+    # Consistency with the directories
+
+    def state(self) -> Optional[str]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, state: str):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)", (state,))
+
+    def set_state(self, state: str):
+        with self.connection:
+            self._set_state(state)
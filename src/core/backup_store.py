@@ -0,0 +1,559 @@
+"""Content-addressed store of save backups
+
+A backup is split in two parts:
+
+- a blob, ``objects/<2 hex>/<30 hex>.<kind>``: one save state, named after the
+  BLAKE2b hash of its *decrypted* payload. Saving re-encrypts with a fresh IV,
+  so equal states give different files but the same key: each distinct state
+  is stored once, whatever the number of snapshots that point to it;
+- a snapshot, ``snapshots/<save>_<YYYYmmdd_HHMMSS>.json``: a small manifest
+  naming the save, the time, the blob, the team name and the level. Listing
+  and filtering go through an indexed catalog of the manifests instead.
+
+Blobs hold the decrypted payload, since the random IV of every encryption
+leaves nothing for compression to find in two ES3 files. A new state is stored
+as a zlib-compressed delta (see ``delta``) against the state of the previous
+snapshot of the same save (``.delta``), and every ``checkpoint_interval``
+states of a chain as the whole compressed payload (``.full``), so rebuilding
+any state applies fewer than ``checkpoint_interval`` deltas. Blobs written by
+the first version of the store (``.es3``, the original file) are still read.
+
+``add`` costs a ``stat`` when the save did not change since its latest
+snapshot (same fingerprint), a read and a hash of the ciphertext when it was
+only touched, and a decryption when the content changed; a blob is written
+only for states not stored yet. Restoring encrypts the payload again without
+gzip, as the editor saves.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from .backup_catalog import BackupCatalog
+from .delta import apply_delta, make_delta
+from .es3_codec import ES3Codec, default_codec
+from .save_cache import Fingerprint, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+OBJECTS_DIR = "objects"
+SNAPSHOTS_DIR = "snapshots"
+CATALOG_DIR = "catalog"
+CATALOG_NAME = "backups.sqlite"
+CHECKPOINT_SUFFIX = ".full"
+DELTA_SUFFIX = ".delta"
+# Original ES3 files, written before blobs were compressed
+ES3_SUFFIX = ".es3"
+BLOB_SUFFIXES = (CHECKPOINT_SUFFIX, DELTA_SUFFIX, ES3_SUFFIX)
+MANIFEST_SUFFIX = ".json"
+# Same timestamp as the names of the plain copies made by BackupManager
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+# Bump when the manifest layout changes
+FORMAT_VERSION = 1
+
+DEFAULT_CHECKPOINT_INTERVAL = 10
+# A delta larger than this share of its payload is written as a checkpoint
+MAX_DELTA_RATIO = 0.5
+COMPRESSION_LEVEL = 6
+
+_DIGEST_SIZE = 16
+# Base blob (raw digest) and position in the chain, at the start of a delta
+_DELTA_HEADER = struct.Struct(">16sH")
+
+
+def payload_hash(payload: bytes) -> str:
+    """Hex BLAKE2b digest of a decrypted (and gunzipped) save payload"""
+    return hashlib.blake2b(payload, digest_size=_DIGEST_SIZE).hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+class Snapshot:
+    """
+    One backup: a save at a point in time, pointing to the blob of its state
+
+    Plain copies written by older versions of the editor are listed as
+    snapshots too, with their file in ``path`` and no blob.
+    """
+
+    __slots__ = ("id", "save", "source", "created", "blob", "size", "fingerprint", "cipher", "team_name",
+                 "level", "path")
+
+    def __init__(self, id: str, save: str, source: str, created: datetime, blob: Optional[str], size: int,
+                 fingerprint: Optional[Fingerprint] = None, cipher: Optional[str] = None,
+                 team_name: Optional[str] = None, level: Optional[int] = None, path: Optional[str] = None):
+        self.id = id
+        self.save = save
+        self.source = source
+        self.created = created
+        self.blob = blob
+        self.size = size
+        # State of the source file when it was backed up, to skip unchanged saves
+        self.fingerprint = fingerprint
+        self.cipher = cipher
+        self.team_name = team_name
+        self.level = level
+        self.path = path
+
+    def __repr__(self):
+        return f"Snapshot({self.id} -> {self.blob[:12] if self.blob else self.path})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": FORMAT_VERSION,
+            "save": self.save,
+            "source": self.source,
+            "created": self.created.isoformat(timespec="seconds"),
+            "blob": self.blob,
+            "size": self.size,
+            "fingerprint": list(self.fingerprint) if self.fingerprint else None,
+            "cipher": self.cipher,
+            "team_name": self.team_name,
+            "level": self.level,
+        }
+
+    @classmethod
+    def from_dict(cls, id: str, record: Dict[str, Any]) -> "Snapshot":
+        fingerprint = record.get("fingerprint")
+        return cls(id, record["save"], record["source"], datetime.fromisoformat(record["created"]),
+                   record["blob"], record["size"], tuple(fingerprint) if fingerprint else None,
+                   record.get("cipher"), record.get("team_name"), record.get("level"))
+
+
+def copy_time(name: str) -> Optional[datetime]:
+    """Time in the name of a plain backup copy (``<save>_<YYYYmmdd>_<HHMMSS>.es3``)"""
+    parts = Path(name).stem.rsplit("_", 2)
+    if len(parts) < 3:
+        return None
+    try:
+        return datetime.strptime(f"{parts[1]}_{parts[2]}", TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def describe(payload: bytes) -> Tuple[Optional[str], Optional[int]]:
+    """Team name and level of a decrypted save, None where missing"""
+    try:
+        document = json.loads(payload)
+    except ValueError:
+        return None, None
+    team_name = level = None
+    try:
+        team_name = document["teamName"]["value"]
+    except (KeyError, TypeError):
+        pass
+    try:
+        level = document["dictionaryOfDictionaries"]["value"]["runStats"]["level"]
+    except (KeyError, TypeError):
+        pass
+    return (team_name if isinstance(team_name, str) else None,
+            level if type(level) is int else None)
+
+
+class BackupStore:
+    """
+    Snapshots and deduplicated blobs under ``root``
+
+    Backups are listed from a SQLite catalog (``catalog/backups.sqlite``, see
+    ``backup_catalog``). The catalog remembers the modification times of the
+    backup and snapshot directories it was built from and is rebuilt from the
+    manifests and plain copies when another program changed them.
+
+    Args:
+        root: Backup directory; ``objects``, ``snapshots`` and ``catalog`` are created inside
+        codec: Codec used to decrypt saves and to encrypt restored ones
+        checkpoint_interval: Length of a delta chain, checkpoint included
+    """
+
+    def __init__(self, root: Union[str, Path], codec: ES3Codec = default_codec,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        self.root = Path(root)
+        self.objects = self.root / OBJECTS_DIR
+        self.snapshots_dir = self.root / SNAPSHOTS_DIR
+        self._snapshots_prefix = str(self.snapshots_dir)
+        self.codec = codec
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self.catalog = BackupCatalog(self.root / CATALOG_DIR / CATALOG_NAME, Snapshot)
+        self._lock = threading.RLock()
+        # Last payload read or written, the base of the next delta of the same save
+        self._recent: Optional[Tuple[str, bytes]] = None
+
+    def blob_path(self, blob: str, suffix: str = CHECKPOINT_SUFFIX) -> Path:
+        return self.objects / blob[:2] / (blob[2:] + suffix)
+
+    def manifest_path(self, snapshot_id: str) -> str:
+        # Plain text: listing thousands of backups spent most of its time in pathlib
+        return os.path.join(self._snapshots_prefix, snapshot_id + MANIFEST_SUFFIX)
+
+    # Catalog
+
+    def _directory_state(self) -> str:
+        times = []
+        for directory in (self.root, self.snapshots_dir):
+            try:
+                times.append(str(os.stat(directory).st_mtime_ns))
+            except OSError:
+                times.append("-")
+        return ":".join(times)
+
+    def _scan(self) -> List[Snapshot]:
+        """Every manifest and plain copy on disk"""
+        snapshots = []
+        try:
+            names = os.listdir(self.snapshots_dir)
+        except OSError:
+            names = []
+        for name in names:
+            if not name.endswith(MANIFEST_SUFFIX):
+                continue
+            try:
+                with open(self.snapshots_dir / name, encoding='utf-8') as f:
+                    snapshots.append(Snapshot.from_dict(name[:-len(MANIFEST_SUFFIX)], json.load(f)))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable snapshot {name}: {e}")
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith(ES3_SUFFIX) or not entry.is_file():
+                continue
+            st = entry.stat()
+            prefix = entry.name[:-len(ES3_SUFFIX)].rsplit("_", 2)[0]
+            # File names keep the extension, so they never clash with snapshot ids
+            snapshots.append(Snapshot(entry.name, prefix + ES3_SUFFIX, "",
+                                      copy_time(entry.name) or datetime.fromtimestamp(st.st_mtime),
+                                      None, st.st_size, path=os.path.abspath(entry.path)))
+        return snapshots
+
+    def refresh(self, force: bool = False):
+        """
+        Rebuild the catalog if the directories changed since it was written
+
+        Args:
+            force: Rebuild it anyway
+        """
+        with self._lock:
+            # Opening the catalog may create its directory: read the state after
+            stored = self.catalog.state()
+            state = self._directory_state()
+            if force or stored != state:
+                snapshots = self._scan()
+                self.catalog.replace(snapshots, state)
+                logger.debug(f"Rebuilt the backup catalog of {self.root}: {len(snapshots)} backups")
+
+    def _record(self, snapshot: Snapshot):
+        """Write the manifest of a snapshot and its catalog row"""
+        manifest = json.dumps(snapshot.to_dict(), indent=4).encode('utf-8')
+        _write_atomic(Path(self.manifest_path(snapshot.id)), manifest)
+        self.catalog.put(snapshot)
+        self.catalog.set_state(self._directory_state())
+
+    # Snapshots
+
+    def snapshots(self, source: Optional[Union[str, Path]] = None, save: Optional[str] = None,
+                  team_name: Optional[str] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, limit: Optional[int] = None,
+                  offset: int = 0) -> List[Snapshot]:
+        """
+        Backups, newest first, of every save or of those matching the filters
+
+        Args:
+            source: Save file the backups were made from
+            save: Save slot (file name), which also matches plain copies
+            team_name: Team name at backup time
+            since, until: Time range, ``until`` excluded
+            limit, offset: Page of the results
+        """
+        with self._lock:
+            self.refresh()
+            return self.catalog.query(os.path.abspath(source) if source is not None else None, save,
+                                      team_name, since, until, limit, offset)
+
+    def count(self, source: Optional[Union[str, Path]] = None, save: Optional[str] = None) -> int:
+        with self._lock:
+            self.refresh()
+            return self.catalog.count(os.path.abspath(source) if source is not None else None, save)
+
+    def get(self, snapshot_id: str) -> Optional[Snapshot]:
+        with self._lock:
+            self.refresh()
+            return self.catalog.get(snapshot_id)
+
+    def find(self, path: Union[str, Path]) -> Optional[Snapshot]:
+        """Snapshot whose manifest is ``path``, None for any other file"""
+        path = Path(path)
+        if path.suffix != MANIFEST_SUFFIX or path.parent.resolve() != self.snapshots_dir.resolve():
+            return None
+        return self.get(path.stem)
+
+    def latest(self, source: Union[str, Path]) -> Optional[Snapshot]:
+        """Most recent snapshot of the save at ``source``"""
+        snapshots = self.snapshots(source, limit=1)
+        return snapshots[0] if snapshots else None
+
+    def _new_id(self, save: str, created: datetime) -> str:
+        base = f"{Path(save).stem}_{created.strftime(TIMESTAMP_FORMAT)}"
+        snapshot_id, counter = base, 1
+        while self.catalog.get(snapshot_id) is not None or os.path.exists(self.manifest_path(snapshot_id)):
+            counter += 1
+            snapshot_id = f"{base}_{counter}"
+        return snapshot_id
+
+    def add(self, save_path: Union[str, Path], when: Optional[datetime] = None) -> Tuple[Snapshot, bool]:
+        """
+        Back up the save at ``save_path`` unless its latest snapshot holds the same state
+
+        Args:
+            save_path: ES3 save file
+            when: Time of the snapshot, now by default
+
+        Returns:
+            Tuple[Snapshot, bool]: The snapshot holding the current state, and
+            whether it was created by this call
+
+        Raises:
+            OSError: When the save cannot be read or the store written
+            ValueError: When the save cannot be decrypted
+        """
+        source = os.path.abspath(save_path)
+        with self._lock:
+            latest = self.latest(source)
+            fingerprint = file_fingerprint(source)
+            if latest is not None and latest.fingerprint == fingerprint:
+                return latest, False
+
+            with open(source, 'rb') as f:
+                data = f.read()
+            cipher = hashlib.blake2b(data, digest_size=_DIGEST_SIZE).hexdigest()
+            if latest is not None and latest.cipher == cipher:
+                # Touched but not rewritten: remember the new fingerprint, keep the snapshot
+                latest.fingerprint = fingerprint
+                self._record(latest)
+                return latest, False
+
+            payload = self.codec.decrypt(data)
+            blob = payload_hash(payload)
+            if latest is not None and latest.blob == blob:
+                # Saved again without changes (new IV): same state
+                latest.fingerprint, latest.cipher = fingerprint, cipher
+                self._record(latest)
+                return latest, False
+
+            if self.blob_file(blob) is None:
+                self._write_blob(blob, payload, latest.blob if latest is not None else None)
+            self._recent = (blob, payload)
+            created = when or datetime.now()
+            team_name, level = describe(payload)
+            snapshot = Snapshot(self._new_id(source, created), os.path.basename(source), source, created,
+                                blob, len(data), fingerprint, cipher, team_name, level)
+            self._record(snapshot)
+            return snapshot, True
+
+    def remove(self, snapshots: List[Snapshot], collect: bool = True) -> int:
+        """
+        Delete snapshots (and plain copies), then the blobs no snapshot needs any more
+
+        Returns:
+            int: Bytes of blobs freed
+        """
+        with self._lock:
+            self.refresh()
+            for snapshot in snapshots:
+                try:
+                    os.remove(snapshot.path or self.manifest_path(snapshot.id))
+                except FileNotFoundError:
+                    pass
+            self.catalog.delete(snapshot.id for snapshot in snapshots)
+            self.catalog.set_state(self._directory_state())
+            return self.gc() if collect else 0
+
+    def restore(self, snapshot: Snapshot, target: Union[str, Path]):
+        """Write the save of ``snapshot`` to ``target`` (atomically)"""
+        path = Path(snapshot.path) if snapshot.path else self.blob_file(snapshot.blob)
+        if path is not None and path.suffix == ES3_SUFFIX:
+            with open(path, 'rb') as f:
+                _write_atomic(Path(target), f.read())
+            return
+        self.codec.encrypt_file(self.payload(snapshot.blob), target)
+
+    def document(self, snapshot: Snapshot) -> Any:
+        """Decoded save of ``snapshot``"""
+        if snapshot.path:
+            return self.codec.load(snapshot.path)
+        return json.loads(self.payload(snapshot.blob))
+
+    # Blobs
+
+    def blob_file(self, blob: str) -> Optional[Path]:
+        """File of a stored state, whatever its kind; None when it is not stored"""
+        for suffix in BLOB_SUFFIXES:
+            path = self.blob_path(blob, suffix)
+            if path.exists():
+                return path
+        return None
+
+    @staticmethod
+    def _delta_header(path: Path) -> Tuple[str, int]:
+        """Base blob and chain position of a delta, decompressing only its header"""
+        with open(path, 'rb') as f:
+            head = zlib.decompressobj().decompress(f.read(256), _DELTA_HEADER.size)
+        base, depth = _DELTA_HEADER.unpack(head)
+        return base.hex(), depth
+
+    def depth(self, blob: str) -> int:
+        """Deltas applied to rebuild a stored state, 0 for checkpoints"""
+        path = self.blob_file(blob)
+        if path is None:
+            raise FileNotFoundError(f"Backup state {blob} is not stored")
+        return self._delta_header(path)[1] if path.suffix == DELTA_SUFFIX else 0
+
+    def payload(self, blob: str) -> bytes:
+        """
+        Decrypted payload of a stored state
+
+        Raises:
+            FileNotFoundError: When the state or a base of its chain is missing
+            ValueError, zlib.error: When a blob is corrupted
+        """
+        with self._lock:
+            recent = self._recent
+            if recent is not None and recent[0] == blob:
+                return recent[1]
+            # Walk back to the checkpoint, then apply the deltas forward
+            deltas = []
+            current = blob
+            while True:
+                path = self.blob_file(current)
+                if path is None:
+                    raise FileNotFoundError(f"Backup state {current} is not stored")
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if path.suffix == ES3_SUFFIX:
+                    payload = self.codec.decrypt(data)
+                    break
+                data = zlib.decompress(data)
+                if path.suffix == CHECKPOINT_SUFFIX:
+                    payload = data
+                    break
+                deltas.append(data)
+                current = data[:_DIGEST_SIZE].hex()
+            for delta in reversed(deltas):
+                payload = apply_delta(payload, memoryview(delta)[_DELTA_HEADER.size:])
+            if payload_hash(payload) != blob:
+                raise ValueError(f"Backup state {blob} is corrupted")
+            self._recent = (blob, payload)
+            return payload
+
+    def _write_blob(self, blob: str, payload: bytes, base: Optional[str]):
+        """Store a new state, as a delta against ``base`` when the chain allows it"""
+        if base is not None and base != blob:
+            try:
+                depth = self.depth(base) + 1
+                if depth < self.checkpoint_interval:
+                    delta = make_delta(self.payload(base), payload)
+                    if len(delta) <= len(payload) * MAX_DELTA_RATIO:
+                        header = _DELTA_HEADER.pack(bytes.fromhex(base), depth)
+                        _write_atomic(self.blob_path(blob, DELTA_SUFFIX),
+                                      zlib.compress(header + delta, COMPRESSION_LEVEL))
+                        return
+            except (OSError, ValueError, struct.error, zlib.error) as e:
+                logger.warning(f"Writing a checkpoint instead of a delta against {base}: {e}")
+        _write_atomic(self.blob_path(blob, CHECKPOINT_SUFFIX), zlib.compress(payload, COMPRESSION_LEVEL))
+
+    def _blobs(self) -> Dict[str, Path]:
+        blobs = {}
+        try:
+            prefixes = list(os.scandir(self.objects))
+        except OSError:
+            return blobs
+        for prefix in prefixes:
+            if not prefix.is_dir():
+                continue
+            for item in os.scandir(prefix.path):
+                stem, suffix = os.path.splitext(item.name)
+                if suffix in BLOB_SUFFIXES:
+                    blobs[prefix.name + stem] = Path(item.path)
+        return blobs
+
+    def _needed(self, blobs: Dict[str, Path]) -> Set[str]:
+        """Blobs of the snapshots and every base their deltas are built on"""
+        needed = set()
+        pending = list(self.catalog.blobs())
+        while pending:
+            blob = pending.pop()
+            if blob in needed:
+                continue
+            needed.add(blob)
+            path = blobs.get(blob)
+            if path is not None and path.suffix == DELTA_SUFFIX:
+                try:
+                    pending.append(self._delta_header(path)[0])
+                except (OSError, ValueError, struct.error, zlib.error) as e:
+                    logger.warning(f"Unreadable delta {path}: {e}")
+        return needed
+
+    def gc(self) -> int:
+        """
+        Delete the blobs no snapshot needs, directly or as the base of a delta
+
+        Returns:
+            int: Bytes freed
+        """
+        with self._lock:
+            self.refresh()
+            blobs = self._blobs()
+            needed = self._needed(blobs)
+            freed = 0
+            for blob, path in blobs.items():
+                if blob in needed:
+                    continue
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    freed += size
+                except OSError as e:
+                    logger.debug(f"Unable to delete blob {path}: {e}")
+            if self._recent is not None and self._recent[0] not in needed:
+                self._recent = None
+            return freed
+
+    def stats(self) -> Dict[str, int]:
+        """Backups, stored states and bytes on disk versus the bytes of full copies"""
+        with self._lock:
+            self.refresh()
+            totals = self.catalog.totals()
+        stored = 0
+        blobs = self._blobs()
+        for path in blobs.values():
+            try:
+                stored += path.stat().st_size
+            except OSError:
+                pass
+        return {
+            "snapshots": totals["snapshots"],
+            "blobs": len(blobs),
+            "deltas": sum(path.suffix == DELTA_SUFFIX for path in blobs.values()),
+            "bytes": stored,
+            "logical_bytes": totals["logical_bytes"],
+        }
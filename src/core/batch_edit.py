@@ -0,0 +1,205 @@
+"""Batch edits of player stats
+
+``apply_batch(table, operations)`` takes ``(selector, field, value)`` tuples:
+
+- selector: a Steam ID, a player name, or ``*`` / ``all`` for every player
+- field: ``health``, an upgrade (``speed``, ``upgrade_speed``,
+  ``upgrades.speed``, the UI names ``agility`` / ``intelligence`` /
+  ``endurance``) or a stat dictionary of the save (``playerUpgradeSpeed``)
+- value: the new value
+
+Fields are compiled once into the stat they target and the schema node (see
+``schema``) their values must match. The whole batch is resolved and validated before anything is
+written: a single invalid operation raises ``BatchError`` listing every
+problem and leaves the table and the document untouched. A valid batch is
+written straight into the table columns, one pass per operation, and flushed
+once, so it is a single step in the edit journal.
+"""
+
+import functools
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .edit_journal import ABSENT, Change
+from .player_table import HEALTH_KEY, MISSING, UPGRADE_KEYS, UPGRADE_PREFIX, PlayerTable
+from .schema import HEALTH, UPGRADE, Scalar
+from .tracked_document import unchanged
+
+ALL_PLAYERS = ("*", "all")
+
+# Upgrade names accepted in fields, without underscores and lowercase -> stat dictionary
+_UPGRADE_ALIASES = {field.replace("_", ""): key for field, key in UPGRADE_KEYS.items()}
+_UPGRADE_ALIASES.update({
+    # Names used by the interface
+    "agility": "playerUpgradeStamina",
+    "intelligence": "playerUpgradeRange",
+    "endurance": "playerUpgradeHealth",
+    "mapcount": "playerUpgradeMapPlayerCount",
+})
+_UPGRADE_PREFIXES = ("upgrades.", "upgrade.", "upgrade_")
+
+# Stat dictionary -> field name used in change sets
+FIELD_NAMES = {HEALTH_KEY: "health", **{key: field for field, key in UPGRADE_KEYS.items()}}
+
+
+class BatchError(ValueError):
+    """A batch was rejected; ``errors`` lists one message per invalid operation"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+class FieldRule:
+    """Stat dictionary targeted by a field and the schema node of its values"""
+
+    __slots__ = ("key", "name", "node", "_accepts")
+
+    def __init__(self, key: str, name: str, node: Scalar):
+        self.key = key
+        self.name = name
+        self.node = node
+        self._accepts = node.accepts()
+
+    def check(self, value: Any) -> Optional[str]:
+        """Why ``value`` cannot be stored, None when it can"""
+        if self._accepts(value):
+            return None
+        return f"{self.name} {self.node.problem(value)}"
+
+
+HEALTH_RULE = FieldRule(HEALTH_KEY, "health", HEALTH)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_field(field: str) -> FieldRule:
+    """
+    Rule of ``field``, compiled once per process
+
+    Raises:
+        KeyError: When the field is not a player stat
+    """
+    if field == HEALTH_KEY or field.lower() == "health":
+        return HEALTH_RULE
+    if field.startswith(UPGRADE_PREFIX):
+        return FieldRule(field, FIELD_NAMES.get(field, field), UPGRADE)
+    name = field
+    for prefix in _UPGRADE_PREFIXES:
+        if name.lower().startswith(prefix):
+            name = name[len(prefix):]
+            break
+    key = _UPGRADE_ALIASES.get(name.replace("_", "").lower())
+    if key is None:
+        raise KeyError(field)
+    return FieldRule(key, FIELD_NAMES[key], UPGRADE)
+
+
+class ChangeSet:
+    """Cells changed by a batch, as edit journal changes on the document paths"""
+
+    __slots__ = ("changes",)
+
+    def __init__(self, changes: List[Change]):
+        self.changes = changes
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def __iter__(self) -> Iterator[Change]:
+        return iter(self.changes)
+
+    def __repr__(self):
+        return f"ChangeSet({len(self.changes)} changes)"
+
+    def by_player(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Steam ID -> field -> ``{"old": ..., "new": ...}`` (None for absent values)"""
+        players: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for change in self.changes:
+            key, player_id = change.keys[-2], change.keys[-1]
+            players.setdefault(player_id, {})[FIELD_NAMES.get(key, key)] = {
+                "old": None if change.old is ABSENT else change.old,
+                "new": None if change.new is ABSENT else change.new,
+            }
+        return players
+
+
+def _select(table: PlayerTable, selector: Any, by_name: Dict[Any, List[int]]) -> Sequence[int]:
+    if not isinstance(selector, str):
+        return ()
+    if selector in ALL_PLAYERS:
+        return range(len(table))
+    if selector in table:
+        return (table.row(selector),)
+    return by_name.get(selector, ())
+
+
+def compile_batch(table: PlayerTable,
+                  operations: Iterable[Tuple[Any, str, Any]]) -> List[Tuple[str, Sequence[int], Any]]:
+    """
+    Resolve and validate every operation of a batch
+
+    Returns:
+        List[Tuple[str, Sequence[int], Any]]: Stat dictionary, rows and value of each operation
+
+    Raises:
+        BatchError: When at least one operation is invalid
+    """
+    by_name: Dict[Any, List[int]] = {}
+    for row, name in enumerate(table.names):
+        by_name.setdefault(name, []).append(row)
+
+    plan = []
+    errors = []
+    for index, operation in enumerate(operations):
+        try:
+            selector, field, value = operation
+        except (TypeError, ValueError):
+            errors.append(f"operation {index}: expected (player, field, value), got {operation!r}")
+            continue
+        try:
+            rule = compile_field(field)
+        except (KeyError, AttributeError):
+            errors.append(f"operation {index}: unknown field {field!r}")
+            continue
+        problem = rule.check(value)
+        if problem:
+            errors.append(f"operation {index}: {problem}")
+            continue
+        rows = _select(table, selector, by_name)
+        if not rows:
+            errors.append(f"operation {index}: unknown player {selector!r}")
+            continue
+        plan.append((rule.key, rows, value))
+    if errors:
+        raise BatchError(errors)
+    return plan
+
+
+def apply_batch(table: PlayerTable, operations: Iterable[Tuple[Any, str, Any]]) -> ChangeSet:
+    """
+    Validate and apply a batch of ``(selector, field, value)`` operations
+
+    Later operations win over earlier ones on the same cell, so put wildcards
+    first and specific players after them.
+
+    Raises:
+        BatchError: When an operation is invalid; nothing is changed then
+
+    Returns:
+        ChangeSet: Cells whose value changed, in the order they were first touched
+    """
+    plan = compile_batch(table, operations)
+
+    # First previous value of every touched cell: several operations may hit the same one
+    previous: Dict[Tuple[str, int], Any] = {}
+    for key, rows, value in plan:
+        for row, old in table.set_rows(key, rows, value):
+            previous.setdefault((key, row), old)
+
+    changes = []
+    for (key, row), old in previous.items():
+        new = table.columns[key][row]
+        if not unchanged(old, new):
+            changes.append(Change(("dictionaryOfDictionaries", "value", key, table.ids[row]),
+                                  ABSENT if old is MISSING else old, new))
+    table.flush()
+    return ChangeSet(changes)
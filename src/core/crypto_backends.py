@@ -0,0 +1,382 @@
+"""AES-128-CBC providers for the ES3 codec
+
+Three interchangeable implementations are available:
+
+* ``pycryptodome`` - the historical dependency of the editor
+* ``cryptography`` - OpenSSL bindings, usually the fastest when installed
+* ``pure-python`` - table driven AES that works everywhere, slowly
+
+The fastest installed provider is picked once by a micro-benchmark the first
+time a codec needs one.
+"""
+
+import functools
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 16
+
+# Environment override, e.g. REPO_ES3_CRYPTO=pure-python
+PROVIDER_ENV_VAR = "REPO_ES3_CRYPTO"
+
+
+class CryptoProvider:
+    """Base class: creates incremental CBC encryptors and decryptors"""
+
+    name = "abstract"
+    # Whether update() runs without the GIL, so segments can be decrypted on threads
+    releases_gil = False
+
+    @classmethod
+    def available(cls) -> bool:
+        return False
+
+    def cbc_decryptor(self, key: bytes, iv: bytes):
+        """Return an object whose ``update(data)`` decrypts whole blocks, chaining across calls"""
+        raise NotImplementedError
+
+    def cbc_encryptor(self, key: bytes, iv: bytes):
+        """Return an object whose ``update(data)`` encrypts whole blocks, chaining across calls"""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+
+class _PyCryptodomeStream:
+    __slots__ = ("update",)
+
+    def __init__(self, update):
+        self.update = update
+
+
+class PyCryptodomeProvider(CryptoProvider):
+    name = "pycryptodome"
+    releases_gil = True
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            from Crypto.Cipher import AES  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def cbc_decryptor(self, key, iv):
+        from Crypto.Cipher import AES
+        return _PyCryptodomeStream(AES.new(key, AES.MODE_CBC, bytes(iv)).decrypt)
+
+    def cbc_encryptor(self, key, iv):
+        from Crypto.Cipher import AES
+        return _PyCryptodomeStream(AES.new(key, AES.MODE_CBC, bytes(iv)).encrypt)
+
+
+class CryptographyProvider(CryptoProvider):
+    name = "cryptography"
+    releases_gil = True
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            from cryptography.hazmat.primitives.ciphers import Cipher  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _cipher(key, iv):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        return Cipher(algorithms.AES(key), modes.CBC(bytes(iv)))
+
+    def cbc_decryptor(self, key, iv):
+        return self._cipher(key, iv).decryptor()
+
+    def cbc_encryptor(self, key, iv):
+        return self._cipher(key, iv).encryptor()
+
+
+def _xtime(a: int) -> int:
+    a <<= 1
+    return (a ^ 0x11B) if a & 0x100 else a
+
+
+def _gmul(a: int, b: int) -> int:
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a = _xtime(a)
+        b >>= 1
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _tables():
+    """S-boxes and T-tables, built on first use of the pure Python provider"""
+    sbox = [0] * 256
+    p = q = 1
+    while True:
+        # p walks the multiplicative group with generator 3, q = p^-1
+        p ^= _xtime(p) & 0xFF
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        x = q
+        for shift in (1, 2, 3, 4):
+            x ^= ((q << shift) | (q >> (8 - shift))) & 0xFF
+        sbox[p] = x ^ 0x63
+        if p == 1:
+            break
+    sbox[0] = 0x63
+
+    inv_sbox = [0] * 256
+    for i, s in enumerate(sbox):
+        inv_sbox[s] = i
+
+    def ror8(word):
+        return ((word >> 8) | (word << 24)) & 0xFFFFFFFF
+
+    te0 = []
+    td0 = []
+    for i in range(256):
+        s = sbox[i]
+        te0.append((_gmul(s, 2) << 24) | (s << 16) | (s << 8) | _gmul(s, 3))
+        s = inv_sbox[i]
+        td0.append((_gmul(s, 14) << 24) | (_gmul(s, 9) << 16) | (_gmul(s, 13) << 8) | _gmul(s, 11))
+
+    te = [te0]
+    td = [td0]
+    for _ in range(3):
+        te.append([ror8(w) for w in te[-1]])
+        td.append([ror8(w) for w in td[-1]])
+    return sbox, inv_sbox, te, td
+
+
+_RCON = (0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36)
+_WORDS = struct.Struct(">4I")
+
+
+def _expand_key(key: bytes):
+    """AES-128 key schedule, returning encryption and (equivalent inverse) decryption round keys"""
+    if len(key) != 16:
+        raise ValueError("Only AES-128 keys are supported")
+    sbox, _, _, td = _tables()
+    rk = list(struct.unpack(">4I", key))
+    for i in range(4, 44):
+        t = rk[i - 1]
+        if i % 4 == 0:
+            t = ((sbox[(t >> 16) & 0xFF] << 24) | (sbox[(t >> 8) & 0xFF] << 16) |
+                 (sbox[t & 0xFF] << 8) | sbox[t >> 24]) ^ (_RCON[i // 4 - 1] << 24)
+        rk.append(rk[i - 4] ^ t)
+
+    td0, td1, td2, td3 = td
+    dk = list(rk[40:44])
+    for r in range(9, 0, -1):
+        for w in rk[4 * r:4 * r + 4]:
+            # Td[S[b]] applies InvMixColumns to a single byte
+            dk.append(td0[sbox[w >> 24]] ^ td1[sbox[(w >> 16) & 0xFF]] ^
+                      td2[sbox[(w >> 8) & 0xFF]] ^ td3[sbox[w & 0xFF]])
+    dk.extend(rk[0:4])
+    return rk, dk
+
+
+class _PurePythonCBC:
+    def __init__(self, key, iv, decrypt):
+        enc_keys, dec_keys = _expand_key(bytes(key))
+        self._keys = dec_keys if decrypt else enc_keys
+        self._prev = _WORDS.unpack(bytes(iv))
+        self.update = self._decrypt if decrypt else self._encrypt
+
+    def _encrypt(self, data) -> bytes:
+        if len(data) % BLOCK_SIZE:
+            raise ValueError("Data must be aligned to block boundary in CBC mode")
+        sbox, _, te, _ = _tables()
+        te0, te1, te2, te3 = te
+        rk = self._keys
+        p0, p1, p2, p3 = self._prev
+        out = bytearray(len(data))
+        for off in range(0, len(data), BLOCK_SIZE):
+            w0, w1, w2, w3 = _WORDS.unpack_from(data, off)
+            s0 = w0 ^ p0 ^ rk[0]
+            s1 = w1 ^ p1 ^ rk[1]
+            s2 = w2 ^ p2 ^ rk[2]
+            s3 = w3 ^ p3 ^ rk[3]
+            k = 4
+            for _ in range(9):
+                t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k]
+                t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1]
+                t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2]
+                t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3]
+                s0, s1, s2, s3 = t0, t1, t2, t3
+                k += 4
+            p0 = ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) |
+                  (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ rk[40]
+            p1 = ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) |
+                  (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ rk[41]
+            p2 = ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) |
+                  (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ rk[42]
+            p3 = ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) |
+                  (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ rk[43]
+            _WORDS.pack_into(out, off, p0, p1, p2, p3)
+        self._prev = (p0, p1, p2, p3)
+        return bytes(out)
+
+    def _decrypt(self, data) -> bytes:
+        if len(data) % BLOCK_SIZE:
+            raise ValueError("Data must be aligned to block boundary in CBC mode")
+        _, inv, _, td = _tables()
+        td0, td1, td2, td3 = td
+        dk = self._keys
+        p0, p1, p2, p3 = self._prev
+        out = bytearray(len(data))
+        for off in range(0, len(data), BLOCK_SIZE):
+            c0, c1, c2, c3 = _WORDS.unpack_from(data, off)
+            s0 = c0 ^ dk[0]
+            s1 = c1 ^ dk[1]
+            s2 = c2 ^ dk[2]
+            s3 = c3 ^ dk[3]
+            k = 4
+            for _ in range(9):
+                t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ dk[k]
+                t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ dk[k + 1]
+                t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ dk[k + 2]
+                t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ dk[k + 3]
+                s0, s1, s2, s3 = t0, t1, t2, t3
+                k += 4
+            o0 = ((inv[s0 >> 24] << 24) | (inv[(s3 >> 16) & 0xFF] << 16) |
+                  (inv[(s2 >> 8) & 0xFF] << 8) | inv[s1 & 0xFF]) ^ dk[40]
+            o1 = ((inv[s1 >> 24] << 24) | (inv[(s0 >> 16) & 0xFF] << 16) |
+                  (inv[(s3 >> 8) & 0xFF] << 8) | inv[s2 & 0xFF]) ^ dk[41]
+            o2 = ((inv[s2 >> 24] << 24) | (inv[(s1 >> 16) & 0xFF] << 16) |
+                  (inv[(s0 >> 8) & 0xFF] << 8) | inv[s3 & 0xFF]) ^ dk[42]
+            o3 = ((inv[s3 >> 24] << 24) | (inv[(s2 >> 16) & 0xFF] << 16) |
+                  (inv[(s1 >> 8) & 0xFF] << 8) | inv[s0 & 0xFF]) ^ dk[43]
+            _WORDS.pack_into(out, off, o0 ^ p0, o1 ^ p1, o2 ^ p2, o3 ^ p3)
+            p0, p1, p2, p3 = c0, c1, c2, c3
+        self._prev = (p0, p1, p2, p3)
+        return bytes(out)
+
+
+class PurePythonProvider(CryptoProvider):
+    name = "pure-python"
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def cbc_decryptor(self, key, iv):
+        return _PurePythonCBC(key, iv, decrypt=True)
+
+    def cbc_encryptor(self, key, iv):
+        return _PurePythonCBC(key, iv, decrypt=False)
+
+
+PROVIDERS = (CryptographyProvider, PyCryptodomeProvider, PurePythonProvider)
+
+_default_provider = None
+_default_lock = threading.Lock()
+
+
+def available_providers() -> List[CryptoProvider]:
+    """Instances of every provider whose library is importable"""
+    return [cls() for cls in PROVIDERS if cls.available()]
+
+
+def get_provider(name: str) -> CryptoProvider:
+    """Return the provider called ``name``"""
+    for cls in PROVIDERS:
+        if cls.name == name:
+            if not cls.available():
+                raise ValueError(f"Crypto provider not installed: {name}")
+            return cls()
+    raise ValueError(f"Unknown crypto provider: {name}")
+
+
+def benchmark_providers(size: int = 16 * 1024, repeat: int = 3,
+                        providers: Optional[List[CryptoProvider]] = None) -> Dict[str, float]:
+    """
+    Measure CBC decryption throughput of each provider
+
+    Args:
+        size: Bytes decrypted per run (rounded to whole blocks)
+        repeat: Runs per provider, the best one counts
+        providers: Providers to measure, every available one by default
+
+    Returns:
+        Dict[str, float]: Throughput in MB/s by provider name
+    """
+    size -= size % BLOCK_SIZE
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(size)
+    results = {}
+    for provider in providers or available_providers():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            provider.cbc_decryptor(key, iv).update(data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[provider.name] = size / max(best, 1e-9) / 1e6
+    return results
+
+
+def default_provider() -> CryptoProvider:
+    """
+    The provider used when a codec is not given one explicitly
+
+    Chosen once per process: the ``REPO_ES3_CRYPTO`` environment variable
+    wins, otherwise the fastest available provider according to
+    ``benchmark_providers``.
+    """
+    global _default_provider
+    if _default_provider is not None:
+        return _default_provider
+    with _default_lock:
+        if _default_provider is None:
+            forced = os.environ.get(PROVIDER_ENV_VAR)
+            if forced:
+                provider = get_provider(forced)
+            else:
+                candidates = available_providers()
+                # Table driven AES only runs when nothing native is installed
+                native = [p for p in candidates if not isinstance(p, PurePythonProvider)]
+                if len(native) > 1:
+                    scores = benchmark_providers(providers=native)
+                    logger.debug(f"Crypto provider benchmark (MB/s): {scores}")
+                    provider = max(native, key=lambda p: scores[p.name])
+                else:
+                    provider = (native or candidates)[0]
+            logger.info(f"Crypto provider: {provider.name}")
+            _default_provider = provider
+    return _default_provider
+
+
+def set_default_provider(provider):
+    """Force the default provider (instance or name); None re-runs the selection"""
+    global _default_provider
+    with _default_lock:
+        _default_provider = get_provider(provider) if isinstance(provider, str) else provider
+
+
+def pkcs7_pad(data: bytes) -> bytes:
+    pad_len = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return bytes(data) + bytes([pad_len]) * pad_len
+
+
+def pkcs7_unpad(data: bytes) -> bytes:
+    if not data or len(data) % BLOCK_SIZE:
+        raise ValueError("Data must be padded to 16 byte boundary in CBC mode")
+    pad_len = data[-1]
+    if not 1 <= pad_len <= BLOCK_SIZE or data[-pad_len:] != bytes([pad_len]) * pad_len:
+        raise ValueError("Padding is incorrect.")
+    return data[:-pad_len]
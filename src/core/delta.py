@@ -0,0 +1,131 @@
+"""Binary deltas between two versions of a save payload
+
+Consecutive saves of one game differ in a few numbers, but a save's JSON
+shifts by a byte whenever a value changes length, so fixed-size blocks stop
+lining up after the first edit. ``make_delta`` cuts both payloads into
+content-defined chunks instead: the text is split after commas and a chunk
+ends after the tokens whose CRC has its low bits clear, so the same text is
+cut the same way wherever it moves. Chunks of the new payload found in the old
+one become copies of a byte range, the others are stored literally.
+
+A delta is a sequence of records, ``C`` + offset + length (copy from the base)
+or ``D`` + length + bytes (literal), and rebuilds the exact bytes of the new
+payload; compressing it is left to the caller.
+"""
+
+import struct
+import zlib
+from typing import Dict, List
+
+# A chunk ends after about one token in 32
+_BOUNDARY_MASK = 31
+_SEPARATOR = b","
+
+_COPY = ord("C")
+_DATA = ord("D")
+_COPY_RECORD = struct.Struct(">BQI")
+_DATA_RECORD = struct.Struct(">BI")
+
+
+def _chunks(data: bytes) -> List[int]:
+    """End offsets of the content-defined chunks of ``data``"""
+    ends = []
+    position = 0
+    for token in data.split(_SEPARATOR):
+        position += len(token) + 1
+        if not zlib.crc32(token) & _BOUNDARY_MASK:
+            ends.append(position)
+    if not ends or ends[-1] < len(data):
+        ends.append(len(data))
+    else:
+        # The last token has no separator after it
+        ends[-1] = len(data)
+    return ends
+
+
+def make_delta(base: bytes, target: bytes) -> bytes:
+    """
+    Records that rebuild ``target`` from ``base``
+
+    Args:
+        base: Previous payload
+        target: New payload
+
+    Returns:
+        bytes: Delta for ``apply_delta(base, delta)``
+    """
+    base_view = memoryview(base)
+    offsets: Dict[bytes, int] = {}
+    start = 0
+    for end in _chunks(base):
+        offsets.setdefault(base[start:end], start)
+        start = end
+
+    records = []
+    literal: List[bytes] = []
+    copy_offset = copy_length = 0
+
+    def flush_copy():
+        if copy_length:
+            records.append(_COPY_RECORD.pack(_COPY, copy_offset, copy_length))
+
+    def flush_literal():
+        if literal:
+            data = b"".join(literal)
+            records.append(_DATA_RECORD.pack(_DATA, len(data)))
+            records.append(data)
+            literal.clear()
+
+    start = 0
+    for end in _chunks(target):
+        chunk = target[start:end]
+        start = end
+        size = len(chunk)
+        follows = copy_offset + copy_length
+        if copy_length and base_view[follows:follows + size] == chunk:
+            # Keep extending the current copy, even through repeated chunks
+            copy_length += size
+            continue
+        offset = offsets.get(chunk)
+        if offset is None:
+            flush_copy()
+            copy_length = 0
+            literal.append(chunk)
+            continue
+        flush_copy()
+        flush_literal()
+        copy_offset, copy_length = offset, size
+    flush_copy()
+    flush_literal()
+    return b"".join(records)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Rebuild the payload a delta was made for
+
+    Raises:
+        ValueError: When the delta is truncated or reads outside ``base``
+    """
+    base_view = memoryview(base)
+    delta_view = memoryview(delta)
+    pieces = []
+    position = 0
+    while position < len(delta):
+        kind = delta[position]
+        if kind == _COPY:
+            _, offset, length = _COPY_RECORD.unpack_from(delta, position)
+            position += _COPY_RECORD.size
+            if offset + length > len(base):
+                raise ValueError(f"Delta copies bytes {offset}-{offset + length} of a {len(base)} byte base")
+            pieces.append(base_view[offset:offset + length])
+        elif kind == _DATA:
+            _, length = _DATA_RECORD.unpack_from(delta, position)
+            position += _DATA_RECORD.size
+            if position + length > len(delta):
+                raise ValueError("Truncated delta")
+            pieces.append(delta_view[position:position + length])
+            position += length
+        else:
+            raise ValueError(f"Unknown delta record {kind!r} at byte {position}")
+    return b"".join(pieces)
@@ -0,0 +1,240 @@
+"""Structural diff between saves
+
+Every container of a document gets a Merkle digest: objects and lists that
+hold other containers hash the digests of their children, objects and lists
+of scalars hash their canonical JSON in one go. ``diff_documents`` compares
+digests top-down and only descends into branches whose digests differ, so
+identical parts of two large saves are skipped without being walked.
+
+Digests are memoised per document (``MerkleIndex``). The index of an edited
+document is rebuilt when its tracker reports a new revision (see
+``tracked_document``); documents read from files are indexed once per file
+version and kept in a small LRU (``index_file``), so comparing one save with
+dozens of backups in a row hashes each of them only once.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .es3_codec import default_codec
+from .save_cache import Fingerprint, file_fingerprint, save_cache
+from .tracked_document import tracked
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+# Indexed files kept in memory
+MAX_INDEXED_FILES = 32
+
+_DIGEST_SIZE = 16
+
+
+class Difference:
+    """One added, removed or changed value"""
+
+    __slots__ = ("kind", "path", "old", "new")
+
+    def __init__(self, kind: str, path: Tuple[Any, ...], old: Any = None, new: Any = None):
+        self.kind = kind
+        self.path = path
+        self.old = old
+        self.new = new
+
+    @property
+    def dotted(self) -> str:
+        """Path as dotted keys, like ``SavePath``"""
+        return ".".join(map(str, self.path))
+
+    def __repr__(self):
+        return f"Difference({self.kind} {self.dotted or '<document>'}: {self.old!r} -> {self.new!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {"kind": self.kind, "path": self.dotted}
+        if self.kind != ADDED:
+            record["old"] = self.old
+        if self.kind != REMOVED:
+            record["new"] = self.new
+        return record
+
+
+def _is_container(value: Any) -> bool:
+    return type(value) is dict or type(value) is list
+
+
+class MerkleIndex:
+    """
+    Memoised subtree digests of one document
+
+    Args:
+        document: Decoded save; keep using the same index only while it is not edited
+    """
+
+    def __init__(self, document: Any):
+        self.document = document
+        self._digests: Dict[int, bytes] = {}
+        tracker = tracked(document)
+        self._tracker = tracker
+        self._revision = tracker.revision if tracker is not None else None
+        self.hashed = 0
+
+    @property
+    def stale(self) -> bool:
+        """Whether the document may have been edited since its digests were computed"""
+        tracker = tracked(self.document)
+        if tracker is not self._tracker:
+            # Tracked (or evicted) since: edits may not have been counted
+            return True
+        return tracker is not None and tracker.revision != self._revision
+
+    def digest(self, value: Any) -> bytes:
+        """Digest of a container of the document (computed once)"""
+        digest = self._digests.get(id(value))
+        if digest is not None:
+            return digest
+        self.hashed += 1
+        children = value.items() if type(value) is dict else enumerate(value)
+        if not any(_is_container(child) for _, child in children):
+            # Containers of scalars: canonical JSON in one C call
+            digest = hashlib.blake2b(json.dumps(value, sort_keys=True).encode('utf-8'),
+                                     digest_size=_DIGEST_SIZE).digest()
+        else:
+            h = hashlib.blake2b(b"{" if type(value) is dict else b"[", digest_size=_DIGEST_SIZE)
+            items = sorted(value.items()) if type(value) is dict else enumerate(value)
+            for key, child in items:
+                h.update(json.dumps(key).encode('utf-8'))
+                h.update(self.digest(child) if _is_container(child) else json.dumps(child).encode('utf-8'))
+                h.update(b"\0")
+            digest = h.digest()
+        # The index keeps the document alive, so ids of its containers are not reused
+        self._digests[id(value)] = digest
+        return digest
+
+
+_indexes: "OrderedDict[int, MerkleIndex]" = OrderedDict()
+_files: "OrderedDict[Tuple[str, Fingerprint], MerkleIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def index_of(document: Any) -> MerkleIndex:
+    """Shared index of ``document``, rebuilt after edits reported to its tracker"""
+    with _lock:
+        index = _indexes.get(id(document))
+        if index is None or index.document is not document or index.stale:
+            index = _indexes[id(document)] = MerkleIndex(document)
+            while len(_indexes) > MAX_INDEXED_FILES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(id(document))
+        return index
+
+
+def forget(document: Any):
+    """Drop the shared index of ``document`` (e.g. when it is closed)"""
+    with _lock:
+        index = _indexes.get(id(document))
+        if index is not None and index.document is document:
+            del _indexes[id(document)]
+
+
+def index_file(path: Union[str, Path], loader: Optional[Callable[[Union[str, Path]], Any]] = None) -> MerkleIndex:
+    """
+    Index of the document stored in ``path``, shared while the file does not change
+
+    Args:
+        path: Save file
+        loader: Reads the document of ``path`` (e.g. a backup snapshot), an ES3 save by default
+    """
+    key = (os.path.abspath(path), file_fingerprint(path))
+    with _lock:
+        index = _files.get(key)
+        if index is not None:
+            _files.move_to_end(key)
+            return index
+    index = MerkleIndex(save_cache.load(path, loader or default_codec.load))
+    with _lock:
+        _files[key] = index
+        while len(_files) > MAX_INDEXED_FILES:
+            _files.popitem(last=False)
+    return index
+
+
+def _same_scalar(old: Any, new: Any) -> bool:
+    return type(old) is type(new) and old == new
+
+
+def _walk(old: Any, new: Any, path: Tuple[Any, ...], old_index: MerkleIndex, new_index: MerkleIndex,
+          out: List[Difference]):
+    if _is_container(old) and type(old) is type(new):
+        if old_index.digest(old) == new_index.digest(new):
+            return
+        if type(old) is dict:
+            for key, old_child in old.items():
+                if key in new:
+                    _walk(old_child, new[key], path + (key,), old_index, new_index, out)
+                else:
+                    out.append(Difference(REMOVED, path + (key,), old=old_child))
+            for key, new_child in new.items():
+                if key not in old:
+                    out.append(Difference(ADDED, path + (key,), new=new_child))
+        else:
+            common = min(len(old), len(new))
+            for position in range(common):
+                _walk(old[position], new[position], path + (position,), old_index, new_index, out)
+            for position in range(common, len(old)):
+                out.append(Difference(REMOVED, path + (position,), old=old[position]))
+            for position in range(common, len(new)):
+                out.append(Difference(ADDED, path + (position,), new=new[position]))
+    elif not _same_scalar(old, new):
+        out.append(Difference(CHANGED, path, old=old, new=new))
+
+
+def diff_documents(old: Any, new: Any, old_index: Optional[MerkleIndex] = None,
+                   new_index: Optional[MerkleIndex] = None) -> List[Difference]:
+    """
+    Added, removed and changed paths from ``old`` to ``new``
+
+    Args:
+        old: Reference document (e.g. a backup)
+        new: Compared document (e.g. the open save)
+        old_index: Digests of ``old``, shared through ``index_of`` by default
+        new_index: Digests of ``new``, shared through ``index_of`` by default
+
+    Returns:
+        List[Difference]: Differences in document order, removed keys of an
+        object before the added ones
+    """
+    out: List[Difference] = []
+    _walk(old, new, (), old_index or index_of(old), new_index or index_of(new), out)
+    return out
+
+
+def diff_files(old_path: Union[str, Path], new: Union[str, Path, Any],
+               loader: Optional[Callable[[Union[str, Path]], Any]] = None) -> List[Difference]:
+    """
+    Differences from the save at ``old_path`` to another save file or to a document
+
+    Args:
+        old_path: Reference save file (e.g. a backup)
+        new: Save file, or a decoded document such as the one being edited
+        loader: Reads the document of ``old_path`` when it is not an ES3 save
+    """
+    old_index = index_file(old_path, loader)
+    if isinstance(new, (str, Path)):
+        new_index = index_file(new)
+    else:
+        new_index = index_of(new)
+    return diff_documents(old_index.document, new_index.document, old_index, new_index)
+
+
+def summarize(differences: List[Difference]) -> Dict[str, int]:
+    """Number of differences of each kind"""
+    counts = {ADDED: 0, REMOVED: 0, CHANGED: 0}
+    for difference in differences:
+        counts[difference.kind] += 1
+    return counts
@@ -0,0 +1,341 @@
+"""Undo/redo history of the edits made to a save
+
+The writers that report their mutations to the document tracker
+(``SavePath.set``, ``PlayerTable.flush``, the tabs) also report them here with
+``record(document, keys, old, new)``. When somebody keeps a journal for the
+document (``journal(document)``) the change is appended to it; otherwise the
+call does nothing, so headless batch runs keep no history.
+
+A change holds references to the value that was replaced and to the one that
+was stored, never a copy of the save. History is linear and every later
+mutation is recorded at its own path, so those values are not modified behind
+the journal's back: replacing the whole document from the raw JSON editor
+keeps the previous tree itself, shared with nothing but the journal. Only
+writers that mutate a container in place must record ``snapshot`` copies of
+that (small) container.
+
+Consecutive edits of the same fields within ``COALESCE_SECONDS`` (a spin box
+being scrolled) are merged into one step. History is bounded both in steps and
+in estimated bytes; the oldest steps are dropped first.
+"""
+
+import copy
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .tracked_document import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_STEPS = 200
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+COALESCE_SECONDS = 1.0
+# Documents whose history is kept at the same time (see workspace.DEFAULT_MAX_RESIDENT)
+MAX_JOURNALS = 12
+
+
+class _Absent:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "ABSENT"
+
+
+# Value of a field that does not exist (before its creation, after its removal)
+ABSENT = _Absent()
+
+
+def _same(old: Any, new: Any) -> bool:
+    return type(old) is type(new) and old == new
+
+
+def _deep_size(value: Any, seen: set) -> int:
+    """Estimated bytes held by ``value``, skipping containers already in ``seen``"""
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if item is ABSENT:
+            continue
+        if isinstance(item, (dict, list)):
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            size += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            else:
+                stack.extend(item)
+        else:
+            size += sys.getsizeof(item)
+    return size
+
+
+def snapshot(value: Any) -> Any:
+    """Copy of a container about to be mutated in place (scalars are returned as is)"""
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+class Change:
+    """Value at ``keys`` going from ``old`` to ``new`` (either may be ``ABSENT``)"""
+
+    __slots__ = ("keys", "old", "new")
+
+    def __init__(self, keys: Tuple[Any, ...], old: Any, new: Any):
+        self.keys = keys
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"Change({'.'.join(map(str, self.keys)) or '<document>'}: {self.old!r} -> {self.new!r})"
+
+
+class Step:
+    """Changes undone and redone together"""
+
+    __slots__ = ("changes", "time", "size")
+
+    def __init__(self, changes: List[Change], when: float):
+        self.changes = changes
+        self.time = when
+        seen = set()
+        self.size = sys.getsizeof(changes) + sum(
+            _deep_size(change.old, seen) + _deep_size(change.new, seen) for change in changes)
+
+    @property
+    def paths(self) -> List[Tuple[Any, ...]]:
+        return [change.keys for change in self.changes]
+
+
+def _store(document: Any, keys: Tuple[Any, ...], value: Any):
+    if not keys:
+        document.clear()
+        document.update(value)
+        return
+    node = document
+    for key in keys[:-1]:
+        node = node[int(key)] if isinstance(node, list) else node[key]
+    key = keys[-1]
+    if isinstance(node, list):
+        node[int(key)] = value
+    elif value is ABSENT:
+        node.pop(key, None)
+    else:
+        node[key] = value
+
+
+class EditJournal:
+    """
+    Undo and redo stacks of the edits made to one document
+
+    Args:
+        document: Decoded save, mutated in place by its owners
+        max_steps: Steps kept on the undo stack
+        max_bytes: Estimated memory kept by both stacks; the latest step is
+            always kept, whatever its size
+        coalesce: Seconds within which edits of the same fields are merged
+    """
+
+    def __init__(self, document: Any, max_steps: int = DEFAULT_MAX_STEPS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, coalesce: float = COALESCE_SECONDS):
+        self.document = document
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.coalesce = coalesce
+        self._undo: Deque[Step] = deque()
+        self._redo: List[Step] = []
+        self._pending: Optional[List[Change]] = None
+        # Set after undo/redo: the next edit starts a new step
+        self._sealed = True
+        self._bytes = 0
+        # Steps forgotten to stay within the bounds
+        self.dropped = 0
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by the history (values kept alive by the journal)"""
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes of the history, for status bars and logs"""
+        return {
+            "undo": len(self._undo),
+            "redo": len(self._redo),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "dropped": self.dropped,
+        }
+
+    def clear(self):
+        """Forget the whole history"""
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+        self._sealed = True
+
+    def seal(self):
+        """Keep the next edit out of the current step, even within the coalescing window"""
+        self._sealed = True
+
+    # Recording
+
+    def record(self, keys: Iterable[Any], old: Any, new: Any):
+        """
+        Add the change of the value at ``keys`` (the whole document when empty)
+
+        Storing a value equal to the previous one is not an edit.
+        """
+        if _same(old, new):
+            return
+        change = Change(tuple(keys), old, new)
+        if self._pending is not None:
+            self._pending.append(change)
+        else:
+            self._commit([change])
+
+    @contextmanager
+    def group(self) -> Iterator["EditJournal"]:
+        """Record every change made inside the block as a single step"""
+        if self._pending is not None:
+            # Nested group: part of the enclosing step
+            yield self
+            return
+        self._pending = []
+        try:
+            yield self
+        finally:
+            changes, self._pending = self._pending, None
+            if changes:
+                self._commit(changes)
+
+    def _commit(self, changes: List[Change]):
+        now = time.monotonic()
+        for step in self._redo:
+            self._bytes -= step.size
+        self._redo.clear()
+
+        top = self._undo[-1] if self._undo else None
+        if (top is not None and not self._sealed and now - top.time <= self.coalesce
+                and top.paths == [change.keys for change in changes]):
+            self._undo.pop()
+            self._bytes -= top.size
+            merged = [Change(before.keys, before.old, after.new)
+                      for before, after in zip(top.changes, changes) if not _same(before.old, after.new)]
+            if not merged:
+                # Back where the step started: nothing left to undo
+                self._sealed = True
+                return
+            changes = merged
+
+        step = Step(changes, now)
+        self._undo.append(step)
+        self._bytes += step.size
+        self._sealed = False
+        while len(self._undo) > 1 and (len(self._undo) > self.max_steps or self._bytes > self.max_bytes):
+            self._bytes -= self._undo.popleft().size
+            self.dropped += 1
+
+    # Replay
+
+    def _apply(self, keys: Tuple[Any, ...], value: Any, previous: Any):
+        _store(self.document, keys, value)
+        mark_dirty(self.document, *keys)
+        if isinstance(value, (dict, list)) or isinstance(previous, (dict, list)):
+            # save_path records into the journal: imported here to avoid the cycle
+            from .save_path import invalidate_paths
+            invalidate_paths()
+
+    def undo(self) -> Optional[Step]:
+        """
+        Restore the values the last step replaced
+
+        Returns:
+            Optional[Step]: The step undone, None when there is nothing to undo
+        """
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        for change in reversed(step.changes):
+            self._apply(change.keys, change.old, change.new)
+        self._redo.append(step)
+        self._sealed = True
+        logger.debug(f"Undone {len(step.changes)} change(s), history {self._bytes} bytes")
+        return step
+
+    def redo(self) -> Optional[Step]:
+        """
+        Apply again the last step undone
+
+        Returns:
+            Optional[Step]: The step redone, None when there is nothing to redo
+        """
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        for change in step.changes:
+            self._apply(change.keys, change.new, change.old)
+        self._undo.append(step)
+        self._sealed = True
+        logger.debug(f"Redone {len(step.changes)} change(s), history {self._bytes} bytes")
+        return step
+
+
+_journals: "OrderedDict[int, EditJournal]" = OrderedDict()
+
+
+def journal(document: Any) -> EditJournal:
+    """Shared journal of ``document``, created on first use: edits are recorded from then on"""
+    history = journal_of(document)
+    if history is None:
+        history = EditJournal(document)
+        _journals[id(document)] = history
+        while len(_journals) > MAX_JOURNALS:
+            _journals.popitem(last=False)
+    else:
+        _journals.move_to_end(id(document))
+    return history
+
+
+def journal_of(document: Any) -> Optional[EditJournal]:
+    """Journal of ``document`` if somebody keeps one"""
+    history = _journals.get(id(document))
+    # id() values are reused once a document is freed: check it is the same object
+    if history is not None and history.document is document:
+        return history
+    return None
+
+
+def drop_journal(document: Any):
+    """Stop recording the edits of ``document`` and forget its history"""
+    if journal_of(document) is not None:
+        del _journals[id(document)]
+
+
+def record(document: Any, keys: Iterable[Any], old: Any, new: Any):
+    """Record a change in the journal of ``document``, if any"""
+    history = journal_of(document)
+    if history is not None:
+        history.record(keys, old, new)
+
+
+@contextmanager
+def group(document: Any) -> Iterator[Optional[EditJournal]]:
+    """Record the changes made to ``document`` inside the block as one step"""
+    history = journal_of(document)
+    if history is None:
+        yield None
+    else:
+        with history.group():
+            yield history
@@ -1,9 +1,4 @@
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Util.Padding import pad
-from Crypto.Hash import HMAC, SHA1
-import gzip
-import os
+from .es3_codec import ES3Codec
 
 def encrypt_es3(data, output_file, password, should_gzip=False):
     """Cripta e salva i dati in un file
@@ -22,26 +17,8 @@ def encrypt_es3(data, output_file, password, should_gzip=False):
         if isinstance(data, str):
             data = data.encode('utf-8')
             
-        # Compress the data if required
-        if should_gzip:
-            data = gzip.compress(data)
-
-        # Generate a random IV
-        iv = os.urandom(16)
-
-        # Derive the key using PBKDF2
-        key = PBKDF2(password, iv, dkLen=16, count=100, prf=lambda p, s: HMAC.new(p, s, SHA1).digest())
-
-        # Encrypt the data using AES-128-CBC
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        encrypted_data = cipher.encrypt(pad(data, AES.block_size))
-
-        # Prepend the IV to the encrypted data
-        result = iv + encrypted_data
-        
-        # Salva il risultato nel file
-        with open(output_file, 'wb') as f:
-            f.write(result)
+        # Compressione, criptazione e scrittura avvengono a blocchi
+        ES3Codec(password).encrypt_file(data, output_file, should_gzip)
             
         return True
     except Exception as e:
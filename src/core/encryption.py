@@ -1,17 +1,14 @@
 """Save file encryption functions"""
 
-import os
 import json
+import mmap
 import logging
-import gzip
 from typing import Dict, Any, Union, List
 from pathlib import Path
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Hash import HMAC, SHA1
 
 from .error_handler import EncryptionError, DataError
+from .es3_codec import ES3Codec, default_codec
+from .kdf import key_cache_info
 
 logger = logging.getLogger(__name__)
 
@@ -27,35 +24,10 @@ def decrypt_es3(file_path, password):
         bytes: Decrypted data
     """
     try:
-        with open(file_path, 'rb') as f:
-            encrypted_data = f.read()
-
-        logger.debug(f"Data received: {len(encrypted_data)} bytes")
-        
-        # Extract the IV (first 16 bytes)
-        iv = encrypted_data[:16]
-        encrypted_data = encrypted_data[16:]
-        
-        iv_hex = iv.hex()
-        logger.debug(f"Extracted IV: {iv_hex}")
-        logger.debug(f"Encrypted data: {encrypted_data[:100].hex()}...")
-        
-        # Ensure password is string type
-        if isinstance(password, bytes):
-            password = password.decode('utf-8')
-            
-        # Derive the key using PBKDF2
-        key = PBKDF2(password, iv, dkLen=16, count=100, prf=lambda p, s: HMAC.new(p, s, SHA1).digest())
-        logger.debug("Key derived successfully")
-        
-        # Decrypt the data using AES-128-CBC
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        decrypted_data = unpad(cipher.decrypt(encrypted_data), AES.block_size)
-        
-        # Check if the data is GZip compressed
-        if decrypted_data[:2] == b'\x1f\x8b':  # GZip magic number
-            decrypted_data = gzip.decompress(decrypted_data)
-        
+        # The payload is decrypted and gunzipped incrementally, so only the
+        # final plaintext is materialised
+        decrypted_data = ES3Codec(password).decrypt_file(file_path)
+        logger.debug(f"Decrypted data: {len(decrypted_data)} bytes")
         return decrypted_data
     except Exception as e:
         logger.error(f"Error during decryption: {str(e)}")
@@ -73,21 +45,8 @@ def encrypt_es3(data, password, should_gzip=False):
     Returns:
         bytes: Encrypted data
     """
-    if should_gzip:
-        data = gzip.compress(data)
-
-    iv = os.urandom(16)
-    
-    # Ensure password is string type
-    if isinstance(password, bytes):
-        password = password.decode('utf-8')
-
-    key = PBKDF2(password, iv, dkLen=16, count=100, prf=lambda p, s: HMAC.new(p, s, SHA1).digest())
-
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    encrypted_data = cipher.encrypt(pad(data, AES.block_size))
-
-    return iv + encrypted_data
+    # Random IV, cached key derivation and the fastest installed AES provider
+    return ES3Codec(password).encrypt(data, should_gzip)
 
 def encrypt_save(data: Union[Dict[str, Any], str], password: Union[str, bytes] = "REPO") -> bytes:
     """
@@ -131,6 +90,34 @@ def decrypt_save(file_path: Union[str, Path], password: Union[str, bytes] = "Why
         file_path: File path
         password: Decryption password
         
+    Returns:
+        Dict[str, Any]: Decrypted data
+    """
+    # Read the file once: every candidate is probed against the same buffer
+    try:
+        with open(file_path, 'rb') as f:
+            encrypted_data = f.read()
+    except OSError as e:
+        logger.error(f"Error reading save file: {str(e)}")
+        raise EncryptionError(
+            "Error during decryption",
+            f"Unable to read file: {str(e)}"
+        )
+    
+    return decrypt_buffer(encrypted_data, password)
+
+def decrypt_buffer(encrypted_data: Union[bytes, bytearray, memoryview, mmap.mmap],
+                   password: Union[str, bytes] = "Why would you want to cheat?... :o It's no fun. :') :'D") -> Dict[str, Any]:
+    """
+    Decrypt a save already held in memory
+    
+    The buffer is never copied or written to disk: the cipher reads slices of it
+    directly, so archives, uploads and tests can decrypt without a temp file
+    
+    Args:
+        encrypted_data: Whole save content (IV included)
+        password: Decryption password
+        
     Returns:
         Dict[str, Any]: Decrypted data
     """
@@ -147,14 +134,18 @@ def decrypt_save(file_path: Union[str, Path], password: Union[str, bytes] = "Why
     errors = []
     
     for pwd in passwords_to_try:
-        try:
-            # Decrypt the data
-            decrypted_data = decrypt_es3(file_path, pwd)
+        codec = default_codec.with_password(pwd)
+        # Decrypting the first and last blocks is enough to rule out a wrong password
+        if not codec.probe(encrypted_data):
+            errors.append(f"Password {pwd}: rejected by first/last block probe")
+            continue
             
-            # Convert to dictionary
+        try:
+            # Decrypt and parse the data in a single streaming pass
             try:
-                result = json.loads(decrypted_data.decode('utf-8'))
+                result = codec.load(encrypted_data)
                 logger.info(f"Decryption successful with password: {pwd}")
+                logger.debug(f"Key cache: {key_cache_info()}")
                 return result
             except json.JSONDecodeError as e:
                 errors.append(f"Password {pwd}: JSON Error: {str(e)}")
@@ -172,30 +163,23 @@ def decrypt_save(file_path: Union[str, Path], password: Union[str, bytes] = "Why
     )
 
 # Alias for compatibility with save_manager.py
-def decrypt_data(file_path: Union[str, Path, bytes]) -> Dict[str, Any]:
+def decrypt_data(file_path: Union[str, Path, bytes, bytearray, memoryview, mmap.mmap]) -> Dict[str, Any]:
     """
     Alias for decrypt_save that handles both paths and binary data
     
     Args:
-        file_path: File path or binary data to decrypt
+        file_path: File path or binary data (bytes, bytearray, memoryview, mmap) to decrypt
         
     Returns:
         Dict[str, Any]: Decrypted data
     """
     # If the parameter is already a path, use decrypt_save directly
-    if isinstance(file_path, (str, Path)) and not isinstance(file_path, bytes):
+    if isinstance(file_path, (str, Path)):
         return decrypt_save(file_path)
     
-    # If it's binary data, save it to a temporary file and then use decrypt_save
-    elif isinstance(file_path, bytes):
-        temp_file = Path("temp_decrypt.es3")
-        try:
-            with open(temp_file, 'wb') as f:
-                f.write(file_path)
-            return decrypt_save(temp_file)
-        finally:
-            if temp_file.exists():
-                temp_file.unlink()
+    # Binary data is decrypted in place, without touching the disk
+    elif isinstance(file_path, (bytes, bytearray, memoryview, mmap.mmap)):
+        return decrypt_buffer(file_path)
     else:
         raise TypeError("The parameter must be a path or binary data")
 
@@ -3,18 +3,25 @@
 import logging
 import traceback
 from typing import Optional, Type, Union
-from PyQt6.QtWidgets import QMessageBox
-
-# Configurazione del logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='repo_editor.log',
-    filemode='a'
-)
 
 logger = logging.getLogger('REPOEditor')
 
+def setup_error_logging(filename: str = 'repo_editor.log') -> None:
+    """
+    Configura il log degli errori su file
+    
+    Chiamata dagli entry point della GUI: importare il modulo non ha effetti collaterali
+    
+    Args:
+        filename: File di log
+    """
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        filename=filename,
+        filemode='a'
+    )
+
 class REPOError(Exception):
     """Eccezione base per tutti gli errori dell'applicazione"""
     
@@ -64,6 +71,8 @@ def handle_error(
             message = "Si è verificato un errore imprevisto"
             details = str(error)
             
+        # Importato solo qui: il core deve restare utilizzabile senza Qt (CLI)
+        from PyQt6.QtWidgets import QMessageBox
         msg_box = QMessageBox(parent)
         msg_box.setIcon(QMessageBox.Icon.Critical)
         msg_box.setWindowTitle("Errore")
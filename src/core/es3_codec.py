@@ -0,0 +1,217 @@
+"""Unified ES3 codec
+
+``ES3Codec`` is the single entry point for reading and writing ES3 saves. It
+binds a password and an AES provider (see ``crypto_backends``) and exposes
+the same pipeline through three kinds of API:
+
+* bytes: ``decrypt`` / ``encrypt``
+* paths: ``decrypt_file`` / ``encrypt_file`` / ``load`` / ``dump``
+* streams: ``iter_decrypted`` / ``reader`` / ``writer``
+
+Running ``python -m core.es3_codec`` from ``src`` benchmarks every installed
+provider on a synthetic save, and segmented parallel decryption against the
+sequential path.
+"""
+
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Union
+
+from .crypto_backends import (CryptoProvider, available_providers, benchmark_providers,
+                              default_provider, get_provider)
+from .es3_stream import (DEFAULT_CHUNK_SIZE, ES3_PASSWORD, PARALLEL_THRESHOLD, Buffer, ES3Reader,
+                         ES3Writer, Source, default_workers, iter_decrypted, load_es3,
+                         probe_password, write_es3, dump_es3)
+
+logger = logging.getLogger(__name__)
+
+
+class ES3Codec:
+    """
+    Encrypts and decrypts ES3 saves with one password and one AES provider
+
+    Args:
+        password: Save password
+        provider: Provider instance or name; the benchmarked process default when omitted
+        chunk_size: Bytes processed per streaming step
+        workers: Decryption threads for payloads above ``PARALLEL_THRESHOLD``;
+            1 disables parallel decryption, None picks one per core
+    """
+
+    def __init__(self, password: Union[str, bytes] = ES3_PASSWORD,
+                 provider: Union[CryptoProvider, str, None] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None):
+        self.password = password
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._provider = get_provider(provider) if isinstance(provider, str) else provider
+
+    @property
+    def provider(self) -> CryptoProvider:
+        # Resolved lazily so that creating a codec never runs the benchmark
+        if self._provider is None:
+            self._provider = default_provider()
+        return self._provider
+
+    def with_password(self, password: Union[str, bytes]) -> "ES3Codec":
+        """Same provider and settings, different password"""
+        return ES3Codec(password, self._provider, self.chunk_size, self.workers)
+
+    def __repr__(self):
+        provider = self._provider.name if self._provider else "auto"
+        return f"<ES3Codec provider={provider}>"
+
+    # Bytes
+
+    def probe(self, data: Buffer) -> bool:
+        """Whether the password plausibly decrypts ``data`` (first/last block check)"""
+        return probe_password(data, self.password, self.provider)
+
+    def decrypt(self, data: Buffer) -> bytes:
+        """Decrypt (and gunzip when needed) a whole ES3 payload held in memory, without copying it"""
+        return b"".join(self.iter_decrypted(data))
+
+    def encrypt(self, data: Union[str, bytes], should_gzip: bool = False) -> bytes:
+        """Encrypt ``data`` into a complete ES3 payload (IV included)"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        buffer = io.BytesIO()
+        write_es3([data], buffer, self.password, should_gzip, self.chunk_size, self.provider)
+        return buffer.getvalue()
+
+    # Paths
+
+    def decrypt_file(self, source: Source) -> bytes:
+        """Decrypt an ES3 file to its plaintext"""
+        return b"".join(self.iter_decrypted(source))
+
+    def encrypt_file(self, data: Union[str, bytes], target: Source, should_gzip: bool = False):
+        """Encrypt ``data`` and write it to ``target`` (atomically for paths)"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        write_es3([data], target, self.password, should_gzip, self.chunk_size, self.provider)
+
+    def load(self, source: Union[Source, Buffer]) -> Any:
+        """Decrypt and parse a save (path, file object or in-memory payload) in a single streaming pass"""
+        return load_es3(source, self.password, self.chunk_size, self.provider, self.workers)
+
+    def dump(self, obj: Any, target: Source, should_gzip: bool = False, indent: Optional[int] = 4):
+        """Serialise and encrypt a document straight to ``target``"""
+        dump_es3(obj, target, self.password, should_gzip, indent, self.chunk_size, self.provider)
+
+    # Streams
+
+    def iter_decrypted(self, source: Union[Source, Buffer]) -> Iterator[bytes]:
+        """Decrypted chunks of ``source`` as they are produced"""
+        return iter_decrypted(source, self.password, self.chunk_size, self.provider, self.workers)
+
+    def reader(self, source: Union[Source, Buffer]) -> ES3Reader:
+        """File-like reader over the plaintext of ``source``"""
+        return ES3Reader(source, self.password, self.chunk_size, self.provider, self.workers)
+
+    def writer(self, fileobj: BinaryIO, should_gzip: bool = False) -> ES3Writer:
+        """Incremental writer encrypting into ``fileobj``"""
+        return ES3Writer(fileobj, self.password, should_gzip, self.chunk_size, self.provider)
+
+    def write_chunks(self, chunks: Iterable[bytes], target: Source, should_gzip: bool = False):
+        """Encrypt a stream of plaintext chunks into ``target``"""
+        write_es3(chunks, target, self.password, should_gzip, self.chunk_size, self.provider)
+
+
+# Shared codec for the default ES3 password
+default_codec = ES3Codec()
+
+
+def benchmark_codecs(document: Any, repeat: int = 3, should_gzip: bool = False) -> Dict[str, Dict[str, float]]:
+    """
+    Time a full save round trip with every available provider
+
+    Args:
+        document: JSON document used as payload
+        repeat: Runs per measurement, the best one counts
+        should_gzip: Whether to compress the payload
+
+    Returns:
+        Dict[str, Dict[str, float]]: Seconds for ``dump`` and ``load`` by provider name
+    """
+    results = {}
+    for provider in available_providers():
+        codec = ES3Codec(provider=provider)
+        timings = {"dump": float("inf"), "load": float("inf")}
+        for _ in range(repeat):
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            codec.dump(document, buffer, should_gzip)
+            timings["dump"] = min(timings["dump"], time.perf_counter() - start)
+
+            buffer.seek(0)
+            start = time.perf_counter()
+            loaded = codec.load(buffer)
+            timings["load"] = min(timings["load"], time.perf_counter() - start)
+            if loaded != document:
+                raise AssertionError(f"Round trip mismatch with provider {provider.name}")
+        results[provider.name] = timings
+    return results
+
+
+def benchmark_parallel(size: int = 4 * PARALLEL_THRESHOLD, workers: Optional[int] = None,
+                       repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Compare sequential and segmented parallel decryption of a large payload
+
+    Args:
+        size: Plaintext bytes of the synthetic payload
+        workers: Threads for the parallel run, one per core by default
+        repeat: Runs per measurement, the best one counts
+
+    Returns:
+        Dict[str, Dict[str, float]]: Seconds for ``sequential`` and ``parallel`` by provider name
+    """
+    workers = workers or max(default_workers(), 2)
+    plaintext = os.urandom(size)
+    results = {}
+    for provider in available_providers():
+        if not provider.releases_gil:
+            continue
+        payload = ES3Codec(provider=provider, workers=1).encrypt(plaintext)
+        timings = {}
+        for label, count in (("sequential", 1), ("parallel", workers)):
+            codec = ES3Codec(provider=provider, workers=count)
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                decrypted = codec.decrypt(payload)
+                best = min(best, time.perf_counter() - start)
+            if decrypted != plaintext:
+                raise AssertionError(f"Parallel decryption mismatch with provider {provider.name}")
+            timings[label] = best
+        results[provider.name] = timings
+    return results
+
+
+def _sample_document(entries: int) -> Dict[str, Any]:
+    players = {str(76561198000000000 + i): 100 for i in range(4)}
+    value = {f"playerUpgrade{i}": dict(players) for i in range(entries)}
+    return {"dictionaryOfDictionaries": {"__type": "Dictionary", "value": value}}
+
+
+if __name__ == "__main__":
+    print("Raw CBC decryption (MB/s)")
+    for name, speed in benchmark_providers(size=256 * 1024).items():
+        print(f"  {name:<14} {speed:10.1f}")
+
+    doc = _sample_document(2000)
+    size = len(json.dumps(doc, indent=4))
+    print(f"Save round trip, {size / 1e6:.1f} MB of JSON (seconds)")
+    for name, timings in benchmark_codecs(doc, repeat=1 if size > 1e6 else 3).items():
+        print(f"  {name:<14} dump {timings['dump']:.3f}  load {timings['load']:.3f}")
+
+    workers = max(default_workers(), 2)
+    print(f"Decryption of {4 * PARALLEL_THRESHOLD >> 20} MB, 1 vs {workers} threads (seconds)")
+    for name, timings in benchmark_parallel(workers=workers).items():
+        speedup = timings['sequential'] / timings['parallel']
+        print(f"  {name:<14} {timings['sequential']:.3f} -> {timings['parallel']:.3f}  x{speedup:.2f}")
+    print(f"Default provider: {default_provider().name}")
@@ -0,0 +1,608 @@
+"""Streaming ES3 decoding and encoding
+
+Chunked AES-128-CBC decryption feeds an incremental gzip inflater, which in
+turn feeds an incremental JSON parser. A save is never materialised more than
+once: peak memory stays close to the size of the decoded object graph plus a
+single read chunk.
+
+Saving runs the same pipeline backwards: ``JSONEncoder.iterencode`` chunks go
+through optional gzip into an incremental CBC encryptor and straight to disk.
+"""
+
+import codecs
+import json
+import logging
+import mmap
+import os
+import re
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from json.decoder import JSONDecodeError, scanstring
+from json.scanner import make_scanner
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Union
+
+from .crypto_backends import BLOCK_SIZE, CryptoProvider, default_provider, pkcs7_pad, pkcs7_unpad
+from .kdf import derive_key
+
+logger = logging.getLogger(__name__)
+
+ES3_PASSWORD = "Why would you want to cheat?... :o It's no fun. :') :'D"
+DEFAULT_CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+# Payloads at least this large are decrypted in segments on a thread pool
+PARALLEL_THRESHOLD = 8 * 1024 * 1024
+PARALLEL_SEGMENT_SIZE = 1024 * 1024
+
+Source = Union[str, Path, BinaryIO]
+# In-memory payloads, decrypted through memoryview slices without copying
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+class _Inflater:
+    """Incremental gunzip stage that passes plain payloads through untouched"""
+
+    def __init__(self):
+        self._head = b""
+        self._gzip = None
+        self._decided = False
+
+    def feed(self, data: bytes) -> bytes:
+        if not self._decided:
+            self._head += data
+            if len(self._head) < len(GZIP_MAGIC):
+                return b""
+            data, self._head = self._head, b""
+            self._decided = True
+            if data[:2] == GZIP_MAGIC:
+                self._gzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gzip is None:
+            return data
+        out = []
+        while data:
+            out.append(self._gzip.decompress(data))
+            # Multi-member archives: restart on whatever follows the trailer
+            data = self._gzip.unused_data
+            if data:
+                self._gzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        if not self._decided:
+            # Payload shorter than the gzip magic: it cannot be compressed
+            self._decided = True
+            data, self._head = self._head, b""
+            return data
+        if self._gzip is None:
+            return b""
+        tail = self._gzip.flush()
+        if not self._gzip.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        return tail
+
+
+def _open_source(source: Source):
+    if isinstance(source, (str, Path)):
+        return open(source, 'rb'), True
+    return source, False
+
+
+def default_workers() -> int:
+    """Thread count used for parallel decryption when none is given"""
+    return min(os.cpu_count() or 1, 8)
+
+
+def _parallel_cbc(provider: CryptoProvider, key: bytes, view: memoryview, start: int, end: int,
+                  workers: int, segment_size: int = PARALLEL_SEGMENT_SIZE) -> Iterator[bytes]:
+    """
+    Decrypt ``view[start:end]`` in block-aligned segments on a thread pool
+
+    In CBC each plaintext block only depends on its ciphertext block and the
+    one before it, so every segment can be decrypted independently using the
+    last ciphertext block of the previous segment as IV. Results are yielded
+    in order and at most two segments per worker are in flight.
+    """
+    segment_size = max(segment_size - segment_size % BLOCK_SIZE, BLOCK_SIZE)
+
+    def decrypt_segment(offset):
+        iv = view[offset - BLOCK_SIZE:offset]
+        return provider.cbc_decryptor(key, iv).update(view[offset:min(offset + segment_size, end)])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for offset in range(start, end, segment_size):
+            in_flight.append(pool.submit(decrypt_segment, offset))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def _iter_decrypted_buffer(data: Buffer, password: Union[str, bytes], chunk_size: int,
+                           provider: Optional[CryptoProvider], workers: int) -> Iterator[bytes]:
+    with memoryview(data) as raw, raw.cast('B') as view:
+        if len(view) < BLOCK_SIZE:
+            raise ValueError("Data too short to contain an ES3 IV")
+        if len(view) == BLOCK_SIZE or len(view) % BLOCK_SIZE:
+            raise ValueError("Data must be padded to 16 byte boundary in CBC mode")
+
+        provider = provider or default_provider()
+        iv = bytes(view[:BLOCK_SIZE])
+        key = derive_key(password, iv)
+        inflater = _Inflater()
+        # Slices of the view go straight to the cipher; the last block is
+        # decrypted on its own so it can be unpadded
+        last = len(view) - BLOCK_SIZE
+
+        if workers > 1 and provider.releases_gil and len(view) >= PARALLEL_THRESHOLD:
+            pieces = _parallel_cbc(provider, key, view, BLOCK_SIZE, last, workers)
+        else:
+            cipher = provider.cbc_decryptor(key, iv)
+            step = max(chunk_size - chunk_size % BLOCK_SIZE, BLOCK_SIZE)
+            pieces = (cipher.update(view[start:min(start + step, last)])
+                      for start in range(BLOCK_SIZE, last, step))
+        for piece in pieces:
+            out = inflater.feed(piece)
+            if out:
+                yield out
+
+        tail = provider.cbc_decryptor(key, view[last - BLOCK_SIZE:last]).update(view[last:])
+        out = inflater.feed(pkcs7_unpad(tail))
+        out += inflater.flush()
+        if out:
+            yield out
+
+
+def iter_decrypted(source: Union[Source, Buffer], password: Union[str, bytes] = ES3_PASSWORD,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   provider: Optional[CryptoProvider] = None,
+                   workers: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Decrypt an ES3 file chunk by chunk
+
+    Args:
+        source: File path, binary file object positioned at the IV, or the
+            whole payload as bytes, bytearray, memoryview or mmap
+        password: Decryption password
+        chunk_size: Number of ciphertext bytes read per step
+        provider: AES implementation, the process default when omitted
+        workers: Threads used for payloads above ``PARALLEL_THRESHOLD``
+            (paths and buffers only); 1 disables, None uses ``default_workers()``
+
+    Yields:
+        bytes: Consecutive pieces of the decrypted (and gunzipped) payload
+    """
+    if workers is None:
+        workers = default_workers()
+    if isinstance(source, BUFFER_TYPES):
+        yield from _iter_decrypted_buffer(source, password, chunk_size, provider, workers)
+        return
+    if (workers > 1 and isinstance(source, (str, Path))
+            and os.path.getsize(source) >= PARALLEL_THRESHOLD):
+        # Large files are mapped so the segments can be sliced without reading them first
+        with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from _iter_decrypted_buffer(mapped, password, chunk_size, provider, workers)
+        return
+
+    f, owned = _open_source(source)
+    try:
+        iv = f.read(BLOCK_SIZE)
+        if len(iv) != BLOCK_SIZE:
+            raise ValueError("Data too short to contain an ES3 IV")
+
+        cipher = (provider or default_provider()).cbc_decryptor(derive_key(password, iv), iv)
+        inflater = _Inflater()
+        # The last block is always held back so it can be unpadded at EOF
+        pending = b""
+
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % BLOCK_SIZE
+            if usable == len(pending):
+                usable -= BLOCK_SIZE
+            if usable <= 0:
+                continue
+            out = inflater.feed(cipher.update(pending[:usable]))
+            pending = pending[usable:]
+            if out:
+                yield out
+
+        if len(pending) != BLOCK_SIZE:
+            raise ValueError("Data must be padded to 16 byte boundary in CBC mode")
+        out = inflater.feed(pkcs7_unpad(cipher.update(pending)))
+        out += inflater.flush()
+        if out:
+            yield out
+    finally:
+        if owned:
+            f.close()
+
+
+_JSON_WHITESPACE = b' \t\n\r'
+
+
+def _plausible_json_prefix(block: bytes) -> bool:
+    """Whether a decrypted first block can be the start of a JSON document"""
+    if block.startswith(codecs.BOM_UTF8):
+        block = block[len(codecs.BOM_UTF8):]
+    stripped = block.lstrip(_JSON_WHITESPACE)
+    if stripped[:1] not in (b'{', b'['):
+        return False
+    # Wrong keys produce noise; JSON text never contains raw control bytes
+    return all(b >= 0x20 or b in _JSON_WHITESPACE for b in block)
+
+
+def probe_password(data: Buffer, password: Union[str, bytes] = ES3_PASSWORD,
+                   provider: Optional[CryptoProvider] = None) -> bool:
+    """
+    Cheaply check whether ``password`` can decrypt an ES3 payload
+
+    Only the first and the last CBC blocks are decrypted: the first must start
+    a gzip stream or a JSON document and the last must carry valid PKCS#7
+    padding. A wrong password passes both checks with negligible probability.
+
+    Args:
+        data: Whole ES3 file content (IV included); only the probed blocks are copied
+        password: Candidate password
+        provider: AES implementation, the process default when omitted
+
+    Returns:
+        bool: True when a full decryption with this password is worth trying
+    """
+    if len(data) < 2 * BLOCK_SIZE or len(data) % BLOCK_SIZE:
+        return False
+
+    iv = bytes(data[:BLOCK_SIZE])
+    key = derive_key(password, iv)
+    provider = provider or default_provider()
+
+    last = provider.cbc_decryptor(key, data[-2 * BLOCK_SIZE:-BLOCK_SIZE]).update(data[-BLOCK_SIZE:])
+    pad_len = last[-1]
+    if not 1 <= pad_len <= BLOCK_SIZE or last[-pad_len:] != bytes([pad_len]) * pad_len:
+        return False
+
+    if len(data) == 2 * BLOCK_SIZE:
+        # Single block payload: the first block is the last one, minus padding
+        first = last[:-pad_len]
+    else:
+        first = provider.cbc_decryptor(key, iv).update(data[BLOCK_SIZE:2 * BLOCK_SIZE])
+    return first[:2] == GZIP_MAGIC or _plausible_json_prefix(first)
+
+
+class ES3Reader:
+    """
+    File-like reader over the decrypted payload of an ES3 save
+
+    Iterating yields decrypted chunks as they are produced; ``read`` offers the
+    usual buffered interface on top of the same stream.
+    """
+
+    def __init__(self, source: Union[Source, Buffer], password: Union[str, bytes] = ES3_PASSWORD,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, provider: Optional[CryptoProvider] = None,
+                 workers: Optional[int] = None):
+        self._chunks = iter_decrypted(source, password, chunk_size, provider, workers)
+        self._buffer = b""
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            yield data
+        yield from self._chunks
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._buffer + b"".join(self._chunks)
+            self._buffer = b""
+            return data
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._chunks.close()
+        self._buffer = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_START = '-0123456789'
+_NUMBER_RUN = re.compile(r'[-+0-9.eE]*')
+_MISSING = object()
+
+# Parser states for an open container
+_FIRST, _KEY, _COLON, _VALUE, _NEXT = range(5)
+
+
+class StreamingJSONParser:
+    """
+    Incremental JSON parser
+
+    Text is pushed in with ``feed``; complete values are decoded by the C
+    scanner of the ``json`` module while containers that straddle a chunk
+    boundary are opened and filled member by member. Only the unparsed tail of
+    the text is kept around between calls.
+    """
+
+    def __init__(self):
+        self._scan_once = make_scanner(json.JSONDecoder())
+        self._buf = ""
+        self._pos = 0
+        # Each frame is [container, is_object, state, pending_key]
+        self._stack = []
+        # Shares key strings between members parsed outside the C scanner
+        self._memo = {}
+        self._result = _MISSING
+        self._eof = False
+
+    def feed(self, text: str):
+        if text:
+            self._buf = self._buf[self._pos:] + text
+            self._pos = 0
+        self._parse()
+
+    def close(self) -> Any:
+        self._eof = True
+        self._parse()
+        if self._stack or self._result is _MISSING:
+            raise JSONDecodeError("Expecting value", self._buf, len(self._buf))
+        result, self._result = self._result, _MISSING
+        self._buf = ""
+        self._memo.clear()
+        return result
+
+    def _emit(self, value):
+        if not self._stack:
+            self._result = value
+            return
+        frame = self._stack[-1]
+        if frame[1]:
+            frame[0][frame[3]] = value
+        else:
+            frame[0].append(value)
+        frame[2] = _NEXT
+
+    def _start_value(self, buf: str, pos: int) -> Optional[int]:
+        """Parse the value at ``pos``; returns the new position or None when more text is needed"""
+        ch = buf[pos]
+        # A number touching the end of the buffer may still continue
+        if ch in _NUMBER_START and not self._eof and _NUMBER_RUN.match(buf, pos).end() == len(buf):
+            return None
+        try:
+            value, end = self._scan_once(buf, pos)
+        except (StopIteration, JSONDecodeError):
+            pass
+        else:
+            self._emit(value)
+            return end
+
+        if ch == '{' or ch == '[':
+            self._stack.append([{} if ch == '{' else [], ch == '{', _FIRST, None])
+            return pos + 1
+        if self._eof:
+            raise JSONDecodeError("Expecting value", buf, pos)
+        return None
+
+    def _parse(self):
+        buf = self._buf
+        pos = self._pos
+        stack = self._stack
+        try:
+            while True:
+                pos = _WHITESPACE.match(buf, pos).end()
+                if pos >= len(buf):
+                    return
+
+                if not stack:
+                    if self._result is not _MISSING:
+                        raise JSONDecodeError("Extra data", buf, pos)
+                    new_pos = self._start_value(buf, pos)
+                    if new_pos is None:
+                        return
+                    pos = new_pos
+                    continue
+
+                frame = stack[-1]
+                container, is_object, state = frame[0], frame[1], frame[2]
+                ch = buf[pos]
+
+                if state == _FIRST or state == _NEXT:
+                    if ch == ('}' if is_object else ']'):
+                        pos += 1
+                        stack.pop()
+                        self._emit(container)
+                    elif state == _NEXT:
+                        if ch != ',':
+                            raise JSONDecodeError("Expecting ',' delimiter", buf, pos)
+                        pos += 1
+                        frame[2] = _KEY if is_object else _VALUE
+                    else:
+                        frame[2] = _KEY if is_object else _VALUE
+                elif state == _KEY:
+                    if ch != '"':
+                        raise JSONDecodeError("Expecting property name enclosed in double quotes", buf, pos)
+                    try:
+                        key, pos = scanstring(buf, pos + 1)
+                    except JSONDecodeError:
+                        if self._eof:
+                            raise
+                        return
+                    frame[3] = self._memo.setdefault(key, key)
+                    frame[2] = _COLON
+                elif state == _COLON:
+                    if ch != ':':
+                        raise JSONDecodeError("Expecting ':' delimiter", buf, pos)
+                    pos += 1
+                    frame[2] = _VALUE
+                else:
+                    new_pos = self._start_value(buf, pos)
+                    if new_pos is None:
+                        return
+                    pos = new_pos
+        finally:
+            self._pos = pos
+
+
+def load_es3(source: Union[Source, Buffer], password: Union[str, bytes] = ES3_PASSWORD,
+             chunk_size: int = DEFAULT_CHUNK_SIZE, provider: Optional[CryptoProvider] = None,
+             workers: Optional[int] = None) -> Any:
+    """
+    Decrypt and parse an ES3 save without buffering the whole payload
+
+    Args:
+        source: File path, binary file object or in-memory payload
+        password: Decryption password
+        chunk_size: Number of ciphertext bytes read per step
+        provider: AES implementation, the process default when omitted
+        workers: Decryption threads for large payloads, see ``iter_decrypted``
+
+    Returns:
+        Any: The decoded JSON document
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    parser = StreamingJSONParser()
+    for chunk in iter_decrypted(source, password, chunk_size, provider, workers):
+        parser.feed(text_decoder.decode(chunk))
+    parser.feed(text_decoder.decode(b"", final=True))
+    return parser.close()
+
+
+class ES3Writer:
+    """
+    Incremental ES3 encryptor writing straight to a binary file object
+
+    Plaintext handed to ``write`` is optionally gzipped, encrypted as soon as a
+    chunk worth of whole blocks is available and written out; ``close`` pads
+    and encrypts the tail. Only one chunk of plaintext is buffered at a time.
+    """
+
+    def __init__(self, fileobj: BinaryIO, password: Union[str, bytes] = ES3_PASSWORD,
+                 should_gzip: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 provider: Optional[CryptoProvider] = None):
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._pending = bytearray()
+        self._gzip = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if should_gzip else None
+        self._closed = False
+
+        iv = os.urandom(BLOCK_SIZE)
+        self._cipher = (provider or default_provider()).cbc_encryptor(derive_key(password, iv), iv)
+        self._file.write(iv)
+
+    def write(self, data: bytes):
+        if self._gzip is not None:
+            data = self._gzip.compress(data)
+        self._pending += data
+        if len(self._pending) >= self._chunk_size:
+            self._encrypt_blocks()
+
+    def _encrypt_blocks(self):
+        usable = len(self._pending) - len(self._pending) % BLOCK_SIZE
+        with memoryview(self._pending) as view, view[:usable] as blocks:
+            encrypted = self._cipher.update(blocks)
+        del self._pending[:usable]
+        self._file.write(encrypted)
+
+    def close(self):
+        """Flush the compressor, pad the final block and encrypt it"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._gzip is not None:
+            self._pending += self._gzip.flush()
+        self._file.write(self._cipher.update(pkcs7_pad(self._pending)))
+        self._pending = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        # Never finalise a half-written stream as if it were complete
+        if exc_type is None:
+            self.close()
+
+
+def write_es3(chunks: Iterable[bytes], target: Source, password: Union[str, bytes] = ES3_PASSWORD,
+              should_gzip: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              provider: Optional[CryptoProvider] = None):
+    """
+    Encrypt a stream of plaintext chunks into an ES3 file
+
+    When ``target`` is a path the data goes to a temporary sibling first and
+    replaces the destination only once it is complete, so a failed save never
+    leaves a truncated file behind.
+
+    Args:
+        chunks: Plaintext pieces, in order
+        target: File path or binary file object
+        password: Encryption password
+        should_gzip: Whether to compress the data with GZip
+        chunk_size: Plaintext bytes buffered before each encryption step
+        provider: AES implementation, the process default when omitted
+    """
+    if not isinstance(target, (str, Path)):
+        with ES3Writer(target, password, should_gzip, chunk_size, provider) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        return
+
+    temp_path = f"{target}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            with ES3Writer(f, password, should_gzip, chunk_size, provider) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def iter_json_bytes(obj: Any, indent: Optional[int] = 4,
+                    batch_tokens: int = 8192) -> Iterator[bytes]:
+    """
+    Serialise ``obj`` as UTF-8 JSON in batches of ``batch_tokens`` tokens
+
+    ``iterencode`` produces one tiny string per token; they are joined in
+    batches (sliced in C, not counted in Python) so the downstream compressor
+    and cipher see reasonably sized writes.
+    """
+    tokens = json.JSONEncoder(indent=indent).iterencode(obj)
+    while True:
+        batch = list(islice(tokens, batch_tokens))
+        if not batch:
+            return
+        yield "".join(batch).encode('utf-8')
+
+
+def dump_es3(obj: Any, target: Source, password: Union[str, bytes] = ES3_PASSWORD,
+             should_gzip: bool = False, indent: Optional[int] = 4,
+             chunk_size: int = DEFAULT_CHUNK_SIZE, provider: Optional[CryptoProvider] = None):
+    """
+    Serialise, optionally compress and encrypt a document without building it in memory
+
+    Args:
+        obj: JSON document to save
+        target: File path or binary file object
+        password: Encryption password
+        should_gzip: Whether to compress the data with GZip
+        indent: JSON indentation, as for ``json.dumps``
+        chunk_size: Plaintext bytes buffered before each encryption step
+        provider: AES implementation, the process default when omitted
+    """
+    write_es3(iter_json_bytes(obj, indent), target, password, should_gzip, chunk_size, provider)
@@ -1,13 +1,19 @@
 import json
+import logging
 from typing import Dict, Any, Optional
+from .schema import validate
+
+logger = logging.getLogger(__name__)
 
 class GameData:
     def __init__(self, json_data: Dict[str, Any]):
         self.json_data = json_data
+        # Violazioni dello schema trovate al caricamento (avvisi, non errori)
+        self.warnings = []
         self._validate_data()
 
     def _validate_data(self):
-        """Valida la struttura dei dati del gioco"""
+        """Valida la struttura dei dati del gioco; il resto dello schema produce solo avvisi"""
         if 'dictionaryOfDictionaries' not in self.json_data:
             raise ValueError("Invalid save file: missing dictionaryOfDictionaries")
         
@@ -17,6 +23,11 @@ class GameData:
         if 'runStats' not in self.json_data['dictionaryOfDictionaries']['value']:
             raise ValueError("Invalid save file: missing runStats")
 
+        # Valori fuori dallo schema (es. salute oltre MAX_HEALTH impostata dall'editor) non impediscono di aprirlo
+        self.warnings = validate(self.json_data)
+        if self.warnings:
+            logger.warning("Save file does not match the schema: " + "; ".join(map(str, self.warnings)))
+
     @property
     def world_data(self) -> Dict[str, Any]:
         """Restituisce i dati del mondo"""
@@ -0,0 +1,124 @@
+"""Key derivation for ES3 saves
+
+ES3 derives the AES-128 key with PBKDF2-HMAC-SHA1 (100 iterations) using the
+IV as salt. Derived keys are kept in a bounded LRU cache keyed by
+(password, salt), so re-opening a save, probing passwords or verifying the
+same backups twice never repeats the derivation.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Callable, Union
+
+logger = logging.getLogger(__name__)
+
+ES3_KDF_ITERATIONS = 100
+ES3_KEY_SIZE = 16
+DEFAULT_CACHE_SIZE = 1024
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "backend"])
+
+
+def _pbkdf2_hashlib(password: bytes, salt: bytes) -> bytes:
+    return hashlib.pbkdf2_hmac('sha1', password, salt, ES3_KDF_ITERATIONS, ES3_KEY_SIZE)
+
+
+def _pbkdf2_pycryptodome(password: bytes, salt: bytes) -> bytes:
+    from Crypto.Protocol.KDF import PBKDF2
+    from Crypto.Hash import SHA1
+    # hmac_hash_module keeps the iteration loop in C, unlike a custom prf
+    return PBKDF2(password, salt, dkLen=ES3_KEY_SIZE, count=ES3_KDF_ITERATIONS, hmac_hash_module=SHA1)
+
+
+def _select_backend() -> Callable[[bytes, bytes], bytes]:
+    """Prefer the OpenSSL-backed hashlib implementation, then pycryptodome"""
+    if getattr(hashlib.pbkdf2_hmac, '__module__', None) == '_hashlib':
+        return _pbkdf2_hashlib
+    try:
+        import Crypto.Protocol.KDF  # noqa: F401
+        return _pbkdf2_pycryptodome
+    except ImportError:
+        # Pure Python hashlib fallback: slow, but always correct
+        return _pbkdf2_hashlib
+
+
+def _password_bytes(password: Union[str, bytes]) -> bytes:
+    # Mirror the historical behaviour: bytes passwords were decoded as UTF-8
+    # and pycryptodome then encoded the string as latin-1
+    if isinstance(password, (bytes, bytearray)):
+        password = bytes(password).decode('utf-8')
+    try:
+        return password.encode('latin-1')
+    except UnicodeEncodeError:
+        return password.encode('utf-8')
+
+
+class KeyCache:
+    """Thread-safe bounded LRU cache of derived keys"""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, backend: Callable[[bytes, bytes], bytes] = None):
+        self.maxsize = maxsize
+        self.backend = backend or _select_backend()
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def derive(self, password: Union[str, bytes], salt: bytes) -> bytes:
+        """
+        Return the key for ``password`` and ``salt``, deriving it on a miss
+
+        Args:
+            password: Save password
+            salt: The 16-byte IV of the save
+
+        Returns:
+            bytes: The 16-byte AES key
+        """
+        cache_key = (_password_bytes(password), bytes(salt))
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is not None:
+                self._keys.move_to_end(cache_key)
+                self.hits += 1
+                return key
+            self.misses += 1
+
+        key = self.backend(*cache_key)
+
+        with self._lock:
+            self._keys[cache_key] = key
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+        return key
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._keys), self.backend.__name__)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every ES3 code path
+key_cache = KeyCache()
+
+
+def derive_key(password: Union[str, bytes], salt: bytes) -> bytes:
+    """Derive (or fetch from the shared cache) the AES key of an ES3 save"""
+    return key_cache.derive(password, salt)
+
+
+def key_cache_info() -> CacheInfo:
+    """Hit/miss counters of the shared key cache"""
+    return key_cache.info()
+
+
+def clear_key_cache():
+    """Drop every cached key and reset the counters"""
+    key_cache.clear()
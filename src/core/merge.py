@@ -0,0 +1,238 @@
+"""Three-way merge of saves edited in parallel
+
+``plan_merge(base, ours, theirs)`` diffs both edited versions against their
+common base (see ``diff``) and keeps the changes of ``theirs`` that ``ours``
+does not touch. Two changes conflict when they hit the same path with
+different results, or when one replaces or removes a branch the other edits
+inside. A list whose length changed is handled as a single change of the
+whole list, since its positions no longer line up.
+
+Only the branches whose digests differ are walked, and the changes are
+matched through their paths and path prefixes, so once the three documents
+are indexed a merge costs time in the number of changed paths, not in the
+size of the save. ``apply_merge`` writes the plan into ``ours`` in place as
+one step of its edit journal.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .diff import ADDED, REMOVED, MerkleIndex, diff_documents
+from .edit_journal import ABSENT, Change, group, record, snapshot
+from .save_path import invalidate_paths
+from .tracked_document import mark_dirty
+
+OURS = "ours"
+THEIRS = "theirs"
+
+Path = Tuple[Any, ...]
+
+
+def _lookup(document: Any, path: Path) -> Any:
+    node = document
+    for key in path:
+        if type(node) is dict:
+            node = node.get(key, ABSENT)
+        elif type(node) is list and type(key) is int and key < len(node):
+            node = node[key]
+        else:
+            return ABSENT
+        if node is ABSENT:
+            break
+    return node
+
+
+def _same(old: Any, new: Any) -> bool:
+    return type(old) is type(new) and old == new
+
+
+def _put(document: Any, path: Path, value: Any):
+    if not path:
+        document.clear()
+        document.update(value)
+        return
+    node = document
+    for key in path[:-1]:
+        node = node[key]
+    if value is ABSENT:
+        node.pop(path[-1], None)
+    else:
+        node[path[-1]] = value
+
+
+class Conflict:
+    """Path changed differently on both sides; values are ``ABSENT`` where the path does not exist"""
+
+    __slots__ = ("path", "base", "ours", "theirs")
+
+    def __init__(self, path: Path, base: Any, ours: Any, theirs: Any):
+        self.path = path
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+
+    @property
+    def dotted(self) -> str:
+        """Path as dotted keys, like ``SavePath``"""
+        return ".".join(map(str, self.path))
+
+    def __repr__(self):
+        return f"Conflict({self.dotted or '<document>'}: {self.ours!r} / {self.theirs!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {"path": self.dotted}
+        for side in ("base", "ours", "theirs"):
+            value = getattr(self, side)
+            if value is not ABSENT:
+                record[side] = value
+        return record
+
+
+class MergePlan:
+    """
+    Outcome of a three-way merge
+
+    Attributes:
+        changes: Changes of ``theirs`` to write into ``ours`` (``old`` is the value in ``ours``)
+        conflicts: Paths changed differently on both sides
+        identical: Paths both sides changed the same way
+    """
+
+    __slots__ = ("changes", "conflicts", "identical")
+
+    def __init__(self, changes: List[Change], conflicts: List[Conflict], identical: int):
+        self.changes = changes
+        self.conflicts = conflicts
+        self.identical = identical
+
+    @property
+    def clean(self) -> bool:
+        return not self.conflicts
+
+    def __repr__(self):
+        return f"MergePlan({len(self.changes)} changes, {len(self.conflicts)} conflicts)"
+
+    def resolved(self, prefer: Optional[str] = None) -> List[Change]:
+        """
+        Changes to write into ``ours``, conflicts included when ``prefer`` is ``THEIRS``
+
+        Raises:
+            ValueError: When ``prefer`` is not None, ``OURS`` or ``THEIRS``
+        """
+        if prefer not in (None, OURS, THEIRS):
+            raise ValueError(f"prefer must be {OURS!r} or {THEIRS!r}, got {prefer!r}")
+        if prefer != THEIRS:
+            return list(self.changes)
+        return self.changes + [Change(conflict.path, conflict.ours, conflict.theirs)
+                               for conflict in self.conflicts]
+
+    def summary(self) -> Dict[str, int]:
+        return {"merged": len(self.changes), "conflicts": len(self.conflicts), "identical": self.identical}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly plan; removed paths have no ``new`` value"""
+        changes = []
+        for change in self.changes:
+            entry = {"path": ".".join(map(str, change.keys))}
+            if change.new is not ABSENT:
+                entry["new"] = change.new
+            changes.append(entry)
+        return {
+            "summary": self.summary(),
+            "changes": changes,
+            "conflicts": [conflict.to_dict() for conflict in self.conflicts],
+            "clean": self.clean,
+        }
+
+
+def _side_changes(base: Any, edited: Any, base_index: Optional[MerkleIndex],
+                  edited_index: Optional[MerkleIndex]) -> Dict[Path, Any]:
+    """Path -> new value (``ABSENT`` when removed) of the changes from ``base`` to ``edited``"""
+    changes: Dict[Path, Any] = {}
+    for difference in diff_documents(base, edited, base_index, edited_index):
+        path = difference.path
+        if difference.kind in (ADDED, REMOVED) and path and type(path[-1]) is int:
+            # Items added or removed at the end of a list: the whole list changed
+            path = path[:-1]
+            changes[path] = _lookup(edited, path)
+        else:
+            changes[path] = ABSENT if difference.kind == REMOVED else difference.new
+    # Keep the outermost changes: a whole list replaces the changes of its items
+    kept: Dict[Path, Any] = {}
+    for path in sorted(changes, key=len):
+        if not any(path[:depth] in kept for depth in range(len(path))):
+            kept[path] = changes[path]
+    return kept
+
+
+def plan_merge(base: Any, ours: Any, theirs: Any, base_index: Optional[MerkleIndex] = None,
+               ours_index: Optional[MerkleIndex] = None,
+               theirs_index: Optional[MerkleIndex] = None) -> MergePlan:
+    """
+    Changes of ``theirs`` that can be merged into ``ours``, and the conflicts
+
+    Args:
+        base: Common ancestor of both versions (e.g. a backup)
+        ours: Version the result is written into (e.g. the open save)
+        theirs: Version whose changes are brought in
+        base_index, ours_index, theirs_index: Digests of the documents,
+            shared through ``diff.index_of`` by default
+    """
+    ours_changes = _side_changes(base, ours, base_index, ours_index)
+    theirs_changes = _side_changes(base, theirs, base_index, theirs_index)
+    # Branches that contain a change of ours
+    inside_ours = {path[:depth] for path in ours_changes for depth in range(len(path))}
+
+    changes: List[Change] = []
+    conflicts: Dict[Path, Conflict] = {}
+    identical = 0
+    for path, value in theirs_changes.items():
+        if path in ours_changes:
+            if _same(ours_changes[path], value):
+                identical += 1
+                continue
+            at = path
+        elif path in inside_ours:
+            # Theirs replaced or removed a branch ours edited inside
+            at = path
+        else:
+            at = next((path[:depth] for depth in range(len(path)) if path[:depth] in ours_changes), None)
+            if at is None:
+                changes.append(Change(path, _lookup(ours, path), value))
+                continue
+            # Ours replaced or removed a branch theirs edited inside
+        if at not in conflicts:
+            conflicts[at] = Conflict(at, _lookup(base, at), _lookup(ours, at), _lookup(theirs, at))
+    return MergePlan(changes, list(conflicts.values()), identical)
+
+
+def apply_merge(document: Any, plan: MergePlan, prefer: Optional[str] = None) -> List[Change]:
+    """
+    Write the changes of a plan into ``document`` (the ``ours`` of the plan)
+
+    Values are copied, so the merged document shares nothing with ``theirs``.
+    The writes are reported to the document tracker and recorded as a single
+    step of its edit journal.
+
+    Args:
+        document: Document the plan was computed for as ``ours``
+        plan: Result of ``plan_merge``
+        prefer: ``THEIRS`` to resolve conflicts with the values of ``theirs``;
+            None or ``OURS`` keeps ours on conflicting paths
+
+    Returns:
+        List[Change]: Changes written
+    """
+    written = []
+    containers = False
+    with group(document):
+        for change in plan.resolved(prefer):
+            value = snapshot(change.new)
+            previous = _lookup(document, change.keys)
+            _put(document, change.keys, value)
+            record(document, change.keys, previous, value)
+            mark_dirty(document, *change.keys)
+            containers = containers or isinstance(value, (dict, list)) or isinstance(previous, (dict, list))
+            written.append(Change(change.keys, previous, value))
+    if containers:
+        invalidate_paths()
+    return written
@@ -0,0 +1,229 @@
+"""Columnar view of the per-player stats of a save
+
+REPO stores every player stat in its own dictionary under
+``dictionaryOfDictionaries.value`` (``playerHealth``, ``playerUpgradeSpeed``,
+...), keyed by Steam ID. ``PlayerTable`` walks those dictionaries once and
+lays the values out as one list per stat, with players indexed by row, so
+per-player reads and bulk edits are plain list indexing instead of a chain
+of nested lookups per field.
+
+Edits are kept in the table and written back to the document only by
+``flush`` (the save managers flush before serialising), which records them in
+the edit journal as one step. Changes made straight on the document after the
+table is built are not seen by it: build a new table after replacing or
+hand-editing the document, and after an undo or redo.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from .edit_journal import ABSENT, group, record
+from .tracked_document import mark_dirty, unchanged
+
+HEALTH_KEY = "playerHealth"
+UPGRADE_PREFIX = "playerUpgrade"
+
+# Field name used by the save managers -> stat dictionary in the save
+UPGRADE_KEYS = {
+    "health": "playerUpgradeHealth",
+    "stamina": "playerUpgradeStamina",
+    "extra_jump": "playerUpgradeExtraJump",
+    "launch": "playerUpgradeLaunch",
+    "map_player_count": "playerUpgradeMapPlayerCount",
+    "speed": "playerUpgradeSpeed",
+    "strength": "playerUpgradeStrength",
+    "range": "playerUpgradeRange",
+    "throw": "playerUpgradeThrow",
+}
+STAT_KEYS = (HEALTH_KEY,) + tuple(UPGRADE_KEYS.values())
+
+# Marks a cell whose player has no entry in the stat dictionary
+MISSING = object()
+
+
+def _unwrap(node: Any) -> Dict:
+    """ES3 wraps dictionaries as {"__type": ..., "value": {...}}; accept both forms"""
+    if isinstance(node, dict) and isinstance(node.get("value"), dict):
+        return node["value"]
+    return node if isinstance(node, dict) else {}
+
+
+class PlayerTable:
+    """
+    Player stats of a save as one column per stat and one row per player
+
+    Args:
+        document: Decoded save; rows follow the order of ``playerNames``
+    """
+
+    __slots__ = ("document", "ids", "names", "columns", "_rows", "_dirty")
+
+    def __init__(self, document: Dict):
+        self.document = document
+        names = _unwrap(document.get("playerNames"))
+        stats = _unwrap(document.get("dictionaryOfDictionaries"))
+
+        self.ids: List[str] = list(names)
+        self.names: List[Any] = list(names.values())
+        self._rows: Dict[str, int] = {player_id: row for row, player_id in enumerate(self.ids)}
+        self._dirty = set()
+
+        # Known stats first, then upgrades added by newer game versions
+        keys = list(STAT_KEYS)
+        keys += [key for key in stats if key.startswith(UPGRADE_PREFIX) and key not in keys]
+        self.columns: Dict[str, List[Any]] = {}
+        for key in keys:
+            source = stats.get(key)
+            if isinstance(source, dict):
+                get = source.get
+                self.columns[key] = [get(player_id, MISSING) for player_id in self.ids]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    @property
+    def dirty(self) -> bool:
+        """Whether some edit has not been flushed to the document yet"""
+        return bool(self._dirty)
+
+    def has_column(self, key: str) -> bool:
+        """Whether the save has the stat dictionary ``key``"""
+        return key in self.columns
+
+    def row(self, player_id: str) -> int:
+        """Row index of ``player_id`` (KeyError when unknown)"""
+        return self._rows[player_id]
+
+    def _add_row(self, player_id: str) -> int:
+        row = len(self.ids)
+        self.ids.append(player_id)
+        self.names.append(None)
+        self._rows[player_id] = row
+        for column in self.columns.values():
+            column.append(MISSING)
+        return row
+
+    # Reads
+
+    def get(self, player_id: str, key: str, default: Any = None) -> Any:
+        """Value of stat ``key`` for ``player_id``, ``default`` when absent"""
+        row = self._rows.get(player_id)
+        column = self.columns.get(key)
+        if row is None or column is None:
+            return default
+        value = column[row]
+        return default if value is MISSING else value
+
+    def column(self, key: str, default: Any = None) -> List[Any]:
+        """Copy of the values of stat ``key`` in row order"""
+        column = self.columns.get(key)
+        if column is None:
+            return [default] * len(self.ids)
+        return [default if value is MISSING else value for value in column]
+
+    def stats(self, player_id: str) -> Dict[str, Any]:
+        """Stat dictionary name -> value for the stats ``player_id`` has"""
+        row = self._rows.get(player_id)
+        if row is None:
+            return {}
+        return {key: column[row] for key, column in self.columns.items() if column[row] is not MISSING}
+
+    def player(self, player_id: str) -> Dict[str, Any]:
+        """
+        One player in the format of ``SaveManager.get_player_data``
+
+        Upgrades the save does not have for this player are left out.
+        """
+        row = self._rows[player_id]
+        upgrades = {}
+        for field, key in UPGRADE_KEYS.items():
+            column = self.columns.get(key)
+            if column is not None and column[row] is not MISSING:
+                upgrades[field] = column[row]
+        return {
+            "id": player_id,
+            "name": self.names[row],
+            "health": self.get(player_id, HEALTH_KEY),
+            "upgrades": upgrades,
+        }
+
+    def players(self) -> List[Dict[str, Any]]:
+        """Every player, see ``player``"""
+        return [self.player(player_id) for player_id in self.ids]
+
+    # Writes
+
+    def set(self, player_id: str, key: str, value: Any):
+        """
+        Set stat ``key`` of ``player_id``
+
+        Unknown players and stats get a new row or column; the document is
+        only touched by ``flush``. Setting the value a cell already has is not
+        an edit.
+        """
+        row = self._rows.get(player_id)
+        if row is None:
+            row = self._add_row(player_id)
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = [MISSING] * len(self.ids)
+        if unchanged(column[row], value):
+            return
+        column[row] = value
+        self._dirty.add((key, row))
+
+    def set_rows(self, key: str, rows: Iterable[int], value: Any) -> List[Tuple[int, Any]]:
+        """
+        Set stat ``key`` to ``value`` for the players at ``rows``
+
+        Returns:
+            List[Tuple[int, Any]]: Row and previous value (``MISSING`` when
+            absent) of every cell that changed
+        """
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = [MISSING] * len(self.ids)
+        changed = []
+        for row in rows:
+            previous = column[row]
+            if not unchanged(previous, value):
+                column[row] = value
+                self._dirty.add((key, row))
+                changed.append((row, previous))
+        return changed
+
+    def set_column(self, key: str, value: Any) -> List[Tuple[int, Any]]:
+        """Set stat ``key`` to ``value`` for every player, see ``set_rows``"""
+        return self.set_rows(key, range(len(self.ids)), value)
+
+    def flush(self) -> int:
+        """
+        Write the edited cells back into the document
+
+        Returns:
+            int: Number of cells written
+        """
+        if not self._dirty:
+            return 0
+        wrapper = self.document.setdefault("dictionaryOfDictionaries", {"value": {}})
+        stats = wrapper.setdefault("value", {})
+        with group(self.document):
+            for key, row in sorted(self._dirty, key=lambda cell: cell[1]):
+                player_id = self.ids[row]
+                values = stats.get(key)
+                if values is None:
+                    values = stats[key] = {}
+                    record(self.document, ("dictionaryOfDictionaries", "value", key), ABSENT, values)
+                value = self.columns[key][row]
+                record(self.document, ("dictionaryOfDictionaries", "value", key, player_id),
+                       values.get(player_id, ABSENT), value)
+                values[player_id] = value
+                mark_dirty(self.document, "dictionaryOfDictionaries", "value", key, player_id)
+        written = len(self._dirty)
+        self._dirty.clear()
+        return written
@@ -0,0 +1,178 @@
+"""Grandfather-father-son retention of backups
+
+Every save is judged on its own, so a save backed up every few minutes
+never pushes out the backups of the others. Within one save, going back in
+time from the newest backup:
+
+- the newest ``keep_last`` backups and everything younger than ``keep_all``
+  are kept;
+- up to ``hourly`` old, the newest backup of each hour is kept;
+- up to ``daily`` old, the newest backup of each day;
+- older than that, the newest backup of each ISO week (None keeps every
+  week, a duration drops the weeks past it).
+
+``plan_retention`` sorts the backups once and walks each save a single time,
+so deciding costs O(n log n) for the whole catalog. The plan can be reported
+as is (dry run) or handed to ``BackupStore.remove``, which deletes its backups
+in one batch and then the blobs no remaining backup needs, delta bases
+included.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+KEEP_LAST = "last"
+KEEP_ALL = "recent"
+HOURLY = "hourly"
+DAILY = "daily"
+WEEKLY = "weekly"
+
+
+class RetentionPolicy:
+    """
+    Age limits of the tiers, measured from the time of the plan
+
+    Args:
+        keep_last: Newest backups of each save always kept
+        keep_all: Age under which every backup is kept
+        hourly: Age under which one backup per hour is kept
+        daily: Age under which one backup per day is kept
+        weekly: Age under which one backup per week is kept, None for no limit
+    """
+
+    def __init__(self, keep_last: int = 1, keep_all: timedelta = timedelta(hours=1),
+                 hourly: timedelta = timedelta(days=1), daily: timedelta = timedelta(days=30),
+                 weekly: Optional[timedelta] = None):
+        self.keep_last = max(0, keep_last)
+        self.keep_all = keep_all
+        self.hourly = hourly
+        self.daily = daily
+        self.weekly = weekly
+
+    def __repr__(self):
+        return (f"RetentionPolicy(last={self.keep_last}, all<{self.keep_all}, hourly<{self.hourly}, "
+                f"daily<{self.daily}, weekly<{self.weekly or 'forever'})")
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "RetentionPolicy":
+        """
+        Policy of the backup settings
+
+        ``backup_count`` is the number of newest backups kept per save; the
+        optional ``retention`` object holds ``keep_all_hours``,
+        ``hourly_days``, ``daily_days`` and ``weekly_weeks`` (None or missing
+        keeps every week).
+        """
+        retention = settings.get("retention") or {}
+        weekly = retention.get("weekly_weeks")
+        return cls(
+            keep_last=settings.get("backup_count", 5),
+            keep_all=timedelta(hours=retention.get("keep_all_hours", 1)),
+            hourly=timedelta(days=retention.get("hourly_days", 1)),
+            daily=timedelta(days=retention.get("daily_days", 30)),
+            weekly=timedelta(weeks=weekly) if weekly is not None else None,
+        )
+
+    def bucket(self, created: datetime, age: timedelta) -> Optional[Hashable]:
+        """Period a backup of this age competes in; None when it is past every tier"""
+        if age < self.hourly:
+            return HOURLY, created.date(), created.hour
+        if age < self.daily:
+            return DAILY, created.date()
+        if self.weekly is None or age < self.weekly:
+            return (WEEKLY,) + tuple(created.isocalendar()[:2])
+        return None
+
+
+class RetentionPlan:
+    """
+    Backups kept and pruned by a policy
+
+    Attributes:
+        keep: (backup, reason) pairs, the reason being ``KEEP_LAST``, ``KEEP_ALL`` or the tier
+        prune: Backups to delete, oldest last within each save
+    """
+
+    __slots__ = ("keep", "prune", "now")
+
+    def __init__(self, keep: List[tuple], prune: List[Any], now: datetime):
+        self.keep = keep
+        self.prune = prune
+        self.now = now
+
+    def __repr__(self):
+        return f"RetentionPlan({len(self.keep)} kept, {len(self.prune)} pruned)"
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts per save and the bytes of the pruned backups (before deduplication)"""
+        saves: Dict[str, Dict[str, int]] = {}
+        for backup, _ in self.keep:
+            saves.setdefault(_group(backup), {"kept": 0, "pruned": 0})["kept"] += 1
+        for backup in self.prune:
+            saves.setdefault(_group(backup), {"kept": 0, "pruned": 0})["pruned"] += 1
+        return {
+            "kept": len(self.keep),
+            "pruned": len(self.prune),
+            "pruned_bytes": sum(backup.size for backup in self.prune),
+            "saves": saves,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly report, e.g. for a dry run"""
+        return {
+            "now": self.now.isoformat(timespec="seconds"),
+            "summary": self.summary(),
+            "keep": [{"id": backup.id, "created": backup.created.isoformat(timespec="seconds"), "reason": reason}
+                     for backup, reason in self.keep],
+            "prune": [{"id": backup.id, "created": backup.created.isoformat(timespec="seconds")}
+                      for backup in self.prune],
+        }
+
+
+def _group(backup: Any) -> str:
+    # Plain copies from older versions only know their save slot
+    return backup.source or backup.save
+
+
+def plan_retention(backups: Iterable[Any], policy: RetentionPolicy,
+                   now: Optional[datetime] = None) -> RetentionPlan:
+    """
+    Split backups into kept and pruned ones
+
+    Args:
+        backups: Backups with ``source``, ``save``, ``created`` and ``size``
+            (``backup_store.Snapshot``), in any order
+        policy: Tiers to apply to each save
+        now: Time the ages are measured from, now by default
+
+    Returns:
+        RetentionPlan: Nothing is deleted
+    """
+    now = now or datetime.now()
+    keep: List[tuple] = []
+    prune: List[Any] = []
+    # Newest first; a stable sort keeps the order of equal times
+    ordered = sorted(backups, key=lambda backup: backup.created, reverse=True)
+    seen: Dict[str, int] = {}
+    buckets = set()
+    for backup in ordered:
+        group = _group(backup)
+        position = seen.get(group, 0)
+        seen[group] = position + 1
+        age = now - backup.created
+        bucket = policy.bucket(backup.created, age)
+        if position < policy.keep_last:
+            reason = KEEP_LAST
+        elif age < policy.keep_all:
+            reason = KEEP_ALL
+        elif bucket is not None and (group, bucket) not in buckets:
+            # Newest backup of its period
+            reason = bucket[0]
+        else:
+            prune.append(backup)
+            continue
+        if bucket is not None:
+            # A backup kept for any reason stands for its period
+            buckets.add((group, bucket))
+        keep.append((backup, reason))
+    return RetentionPlan(keep, prune, now)
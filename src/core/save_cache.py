@@ -0,0 +1,233 @@
+"""Persistent cache of decoded saves
+
+Parsed documents are stored with ``marshal`` under ``~/.cache/seregonwar/saves``
+so reopening an unchanged save skips decryption, gunzip and JSON parsing.
+
+An entry is keyed by the absolute path of the save and remembers its
+(size, mtime_ns, inode) fingerprint plus a BLAKE2b hash of the encrypted
+content. A lookup is a hit only when both still match; any other state drops
+the entry. The directory is capped in size and evicted least recently used
+first (hits refresh the mtime of their entry file).
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = Path.home() / ".cache" / "seregonwar"
+DEFAULT_CACHE_DIR = CACHE_ROOT / "saves"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Bump when the entry layout changes: older entries are then ignored
+FORMAT_VERSION = 1
+ENTRY_SUFFIX = ".bin"
+
+Fingerprint = Tuple[int, int, int]
+
+
+def file_fingerprint(path: Union[str, Path]) -> Fingerprint:
+    """(size, mtime_ns, inode) of ``path``"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def content_hash(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> bytes:
+    """BLAKE2b digest of the raw (still encrypted) file content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class SaveCache:
+    """
+    Disk cache of parsed saves with fingerprint validation and LRU eviction
+
+    Args:
+        directory: Where entries are stored, created on first write
+        max_bytes: Total size cap of the entry files
+    """
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: Union[str, Path]) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _entry_path(self, key: str) -> Path:
+        name = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return self.directory / (name + ENTRY_SUFFIX)
+
+    def _discard(self, entry: Path):
+        try:
+            entry.unlink()
+        except OSError:
+            pass
+
+    def get(self, path: Union[str, Path]) -> Optional[Any]:
+        """
+        Return the cached document of ``path`` if the file did not change
+
+        Args:
+            path: Save file path
+
+        Returns:
+            Optional[Any]: A fresh copy of the document, or None on a miss
+        """
+        hit = self._lookup(path)
+        return hit[0] if hit is not None else None
+
+    def _lookup(self, path: Union[str, Path]) -> Optional[Tuple[Any, Fingerprint, bytes]]:
+        """Cached document of ``path`` with the fingerprint and hash it was decoded from"""
+        if not self.enabled:
+            return None
+        key = self._key(path)
+        entry = self._entry_path(key)
+        try:
+            # marshal.load on a file object reads in tiny pieces; loads is far faster
+            with open(entry, 'rb') as f:
+                version, cached_key, fingerprint, digest, data = marshal.loads(f.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug(f"Discarding unreadable cache entry {entry}: {e}")
+            self._discard(entry)
+            self.misses += 1
+            return None
+
+        try:
+            valid = (version == FORMAT_VERSION and cached_key == key
+                     and tuple(fingerprint) == file_fingerprint(path)
+                     and digest == content_hash(path))
+        except OSError:
+            valid = False
+        if not valid:
+            self._discard(entry)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        self.hits += 1
+        return data, tuple(fingerprint), digest
+
+    def put(self, path: Union[str, Path], data: Any, fingerprint: Optional[Fingerprint] = None,
+            digest: Optional[bytes] = None):
+        """
+        Store the parsed document of ``path``
+
+        Failures (unwritable directory, values marshal cannot encode) are
+        logged and otherwise ignored: the cache is never required.
+
+        Args:
+            path: Save file path
+            data: Document decoded from ``path``
+            fingerprint, digest: State of the file the document was decoded
+                from, taken before reading it; the file as it is on disk right
+                now when omitted
+        """
+        if not self.enabled:
+            return
+        key = self._key(path)
+        entry = self._entry_path(key)
+        temp = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            if fingerprint is None or digest is None:
+                fingerprint, digest = file_fingerprint(path), content_hash(path)
+            payload = marshal.dumps((FORMAT_VERSION, key, fingerprint, digest, data))
+            if len(payload) > self.max_bytes:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(temp, 'wb') as f:
+                f.write(payload)
+            os.replace(temp, entry)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Unable to cache {path}: {e}")
+            self._discard(temp)
+            return
+        self._evict()
+
+    def load(self, path: Union[str, Path], loader: Callable[[Union[str, Path]], Any]) -> Any:
+        """Return the cached document of ``path``, calling ``loader`` and caching on a miss"""
+        return self.open(path, loader)[0]
+
+    def open(self, path: Union[str, Path],
+             loader: Callable[[Union[str, Path]], Any]) -> Tuple[Any, Fingerprint, bytes]:
+        """
+        Same as ``load``, also returning the state of the file the document comes from
+
+        Returns:
+            tuple: (document, fingerprint, digest), the file state taken before
+            decoding it, e.g. for ``SaveOrigin``
+        """
+        hit = self._lookup(path)
+        if hit is not None:
+            return hit
+        # Before decoding: a file rewritten meanwhile then misses instead of
+        # caching the old document under the new state
+        fingerprint, digest = file_fingerprint(path), content_hash(path)
+        data = loader(path)
+        self.put(path, data, fingerprint, digest)
+        return data, fingerprint, digest
+
+    def invalidate(self, path: Union[str, Path]):
+        """Drop the entry of ``path``"""
+        self._discard(self._entry_path(self._key(path)))
+
+    def clear(self):
+        """Drop every entry"""
+        for entry, _, _ in self._entries():
+            self._discard(entry)
+
+    def _entries(self):
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            return []
+        entries = []
+        for item in scan:
+            if not item.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                st = item.stat()
+            except OSError:
+                continue
+            entries.append((Path(item.path), st.st_size, st.st_mtime_ns))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            # Oldest mtime first: hits refresh it, so this is LRU order
+            for entry, size, _ in sorted(entries, key=lambda e: e[2]):
+                self._discard(entry)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def size(self) -> int:
+        """Bytes currently used by the entries"""
+        return sum(size for _, size, _ in self._entries())
+
+
+# Shared by both save managers
+save_cache = SaveCache()
@@ -1,27 +1,97 @@
 import json
-import requests
-from pathlib import Path
-from datetime import datetime
-from xml.etree import ElementTree
-from typing import Dict, List, Optional, Tuple
-from .decrypt import decrypt_es3
-from .encrypt import encrypt_es3
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from .es3_codec import default_codec
+from .save_cache import save_cache
+from .player_table import HEALTH_KEY, UPGRADE_KEYS, PlayerTable
+from .save_path import CURRENCY, LEVEL, LIVES, PLAYER_NAMES, TEAM_NAME, WORLD_FIELDS, compile_path
+from .save_origin import COPIED, UNCHANGED, SaveOrigin
+from .edit_journal import EditJournal, journal, journal_of
+from .tracked_document import mark_dirty, track
 from .logger import logger
 
+if TYPE_CHECKING:
+    # Solo per le annotazioni: i moduli vengono importati dai metodi che li usano
+    from .batch_edit import ChangeSet
+    from .diff import Difference
+    from .merge import MergePlan
+    from .schema import Violation
+
 class SaveManager:
 
-        
-    
+    def __init__(self):
+        self._json_data = None
+        self._player_table = None
+        self._origin = None
+        self._size = None
+
+    def _document(self):
+        # Le modifiche ai giocatori restano nella tabella finché qualcuno non legge il documento
+        if self._player_table is not None and self._player_table.dirty:
+            self._player_table.flush()
+        return self._json_data
+
+    @property
+    def json_data(self):
+        # Chi riceve il documento può modificarlo senza dirlo: i frammenti JSON
+        # in cache non sono più affidabili. Per modifiche mirate usare set_value.
+        document = self._document()
+        if document:
+            mark_dirty(document)
+        return document
+
+    @json_data.setter
+    def json_data(self, data):
+        self._json_data = data
+        self._player_table = None
+        self._origin = None
+        self._size = None
+        if data:
+            # Da qui in poi le modifiche al documento si possono annullare
+            journal(data)
+
+    @property
+    def player_table(self) -> PlayerTable:
+        """Vista a colonne delle statistiche dei giocatori, costruita una volta per documento."""
+        if self._player_table is None:
+            self._player_table = PlayerTable(self._json_data or {})
+        return self._player_table
+
+    @property
+    def history(self) -> EditJournal:
+        """Cronologia annulla/ripeti del documento corrente."""
+        return journal(self._document())
+
+    def undo(self) -> bool:
+        """Annulla l'ultima modifica; False se non c'è nulla da annullare."""
+        return self._replay("undo")
+
+    def redo(self) -> bool:
+        """Ripete l'ultima modifica annullata; False se non c'è nulla da ripetere."""
+        return self._replay("redo")
+
+    def _replay(self, action: str) -> bool:
+        # Le modifiche ancora nella tabella entrano nella cronologia prima di annullare
+        document = self._document()
+        if not document:
+            return False
+        step = getattr(journal(document), action)()
+        if step is None:
+            return False
+        # La tabella dei giocatori non vede le modifiche fatte sul documento
+        self._player_table = None
+        return True
 
     def open_file(self, file_path: str) -> Tuple[bool, str]:
         logger.info(f"Avvio caricamento file: {file_path}")
         """Apre e decodifica un file di salvataggio."""
         try:
-            decrypted_data = decrypt_es3(
-                file_path,
-                "Why would you want to cheat?... :o It's no fun. :') :'D"
-            )
-            self.json_data = json.loads(decrypted_data)
+            # Riusa il documento in cache se il file non è cambiato, altrimenti
+            # decifra, decomprime e interpreta il JSON in un unico passaggio
+            document, fingerprint, digest = save_cache.open(file_path, default_codec.load)
+            self.json_data = document
+            # Ricorda il file di origine, com'era prima di decodificarlo: se nulla
+            # cambia, salvare non riscrive niente
+            self._origin = SaveOrigin(file_path, document, fingerprint, digest)
             logger.info(f"File caricato e decifrato correttamente: {file_path}")
             return True, "File aperto con successo"
         except Exception as e:
@@ -31,17 +101,23 @@ class SaveManager:
     def save_file(self, file_path: str) -> Tuple[bool, str]:
         logger.info(f"Avvio salvataggio file: {file_path}")
         """Salva e codifica i dati nel file di salvataggio."""
-        if not self.json_data:
+        if not self._document():
             logger.error("Nessun dato da salvare.")
             return False, "Nessun dato da salvare"
             
         try:
-            encrypted_data = encrypt_es3(
-                json.dumps(self.json_data, indent=4).encode('utf-8'),
-                "Why would you want to cheat?... :o It's no fun. :') :'D"
-            )
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_data)
+            document = self._document()
+            reused = self._origin.reuse(file_path) if self._origin is not None else None
+            if reused == UNCHANGED:
+                logger.info(f"Nessuna modifica, file lasciato invariato: {file_path}")
+                return True, "Nessuna modifica da salvare"
+            if reused != COPIED:
+                # Serializza solo le parti modificate dall'ultimo salvataggio e cripta i frammenti man mano
+                default_codec.write_chunks(track(document).iter_chunks(), file_path)
+            # La voce in cache descrive il file di prima; il documento la riscrive
+            # close(cache=True), senza rileggere il file a ogni salvataggio
+            save_cache.invalidate(file_path)
+            self._origin = SaveOrigin(file_path, document)
             logger.info(f"File salvato correttamente: {file_path}")
             return True, "File salvato con successo"
         except Exception as e:
@@ -51,75 +127,71 @@ class SaveManager:
    
     def get_player_data(self) -> List[Dict]:
         """Ottiene i dati dei giocatori dal salvataggio."""
-        players = []
-        if not self.json_data:
-            return players
-            
-        for player_id, player_name in self.json_data["playerNames"]["value"].items():
-            player_health = self.json_data["dictionaryOfDictionaries"]["value"]["playerHealth"][player_id]
-            players.append({
-                "id": player_id,
-                "name": player_name,
-                "health": player_health,
-                "upgrades": {
-                    "health": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeHealth"][player_id],
-                    "stamina": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeStamina"][player_id],
-                    "extra_jump": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeExtraJump"][player_id],
-                    "launch": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeLaunch"][player_id],
-                    "map_player_count": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeMapPlayerCount"][player_id],
-                    "speed": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeSpeed"][player_id],
-                    "strength": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeStrength"][player_id],
-                    "range": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeRange"][player_id],
-                    "throw": self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeThrow"][player_id]
-                }
-            })
-        return players
+        if not self._json_data:
+            return []
+        return self.player_table.players()
 
     def get_world_data(self) -> Dict:
         """Ottiene i dati del mondo dal salvataggio."""
-        if not self.json_data:
+        data = self._document()
+        if not data:
             return {}
             
-        return {
-            "level": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["level"],
-            "currency": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["currency"],
-            "lives": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["lives"],
-            "charging_station": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["chargingStationCharge"],
-            "total_haul": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["totalHaul"],
-            "team_name": self.json_data["teamName"]["value"]
-        }
+        return {field: path.get(data) for field, path in WORLD_FIELDS.items()}
 
     def update_player_data(self, player_id: str, health: int, upgrades: Dict) -> None:
         """Aggiorna i dati di un giocatore."""
-        if not self.json_data:
+        if not self._json_data:
             return
             
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerHealth"][player_id] = health
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeHealth"][player_id] = upgrades["health"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeStamina"][player_id] = upgrades["stamina"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeExtraJump"][player_id] = upgrades["extra_jump"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeLaunch"][player_id] = upgrades["launch"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeMapPlayerCount"][player_id] = upgrades["map_player_count"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeSpeed"][player_id] = upgrades["speed"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeStrength"][player_id] = upgrades["strength"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeRange"][player_id] = upgrades["range"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["playerUpgradeThrow"][player_id] = upgrades["throw"]
+        table = self.player_table
+        table.set(player_id, HEALTH_KEY, health)
+        for field, value in upgrades.items():
+            table.set(player_id, UPGRADE_KEYS[field], value)
+
+    def apply_batch(self, operations: Iterable[Tuple[str, str, Any]]) -> "ChangeSet":
+        """Valida e applica in un solo passaggio una serie di modifiche (giocatore, campo, valore).
+        
+        Il giocatore può essere uno Steam ID, un nome o "*" per tutti. Se anche
+        una sola operazione non è valida solleva BatchError e non cambia nulla.
+        """
+        from .batch_edit import BatchError, apply_batch
+        if not self._document():
+            raise BatchError(["Nessun file caricato"])
+        return apply_batch(self.player_table, operations)
 
     def update_world_data(self, data: Dict) -> None:
         """Aggiorna i dati del mondo."""
-        if not self.json_data:
+        document = self._document()
+        if not document:
             return
             
-        self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["level"] = data["level"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["currency"] = data["currency"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["lives"] = data["lives"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["chargingStationCharge"] = data["charging_station"]
-        self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["totalHaul"] = data["total_haul"]
-        self.json_data["teamName"]["value"] = data["team_name"]
+        for field, path in WORLD_FIELDS.items():
+            path.set(document, data[field], create=True)
 
     def get_raw_json(self) -> str:
         """Ottiene il JSON grezzo del salvataggio."""
-        return json.dumps(self.json_data, indent=4) if self.json_data else ""
+        document = self._document()
+        return track(document).dumps() if document else ""
+
+    def get_value(self, path: str, default=None):
+        """Legge un campo dal percorso puntato (es. "teamName.value")."""
+        document = self._document()
+        if not document:
+            return default
+        return compile_path(path).get(document, default)
+
+    def set_value(self, path: str, value) -> bool:
+        """Scrive un campo dal percorso puntato; False se il contenitore non esiste."""
+        document = self._document()
+        if not document:
+            return False
+        return compile_path(path).set(document, value)
+
+    def mark_dirty(self, *keys) -> None:
+        """Segnala una modifica fatta direttamente sul documento (tutto se senza chiavi)."""
+        if self._json_data:
+            mark_dirty(self._json_data, *keys)
 
     def update_from_raw_json(self, json_str: str) -> Tuple[bool, str]:
         """Aggiorna i dati dal JSON grezzo."""
@@ -131,64 +203,125 @@ class SaveManager:
             
     def is_file_loaded(self) -> bool:
         """Verifica se un file è stato caricato."""
-        return bool(self.json_data)
+        return bool(self._document())
         
+    def is_modified(self) -> bool:
+        """True se il documento ha modifiche non salvate."""
+        document = self._document()
+        if not document:
+            return False
+        return self._origin is None or self._origin.modified
+
+    def memory_usage(self) -> int:
+        """Memoria stimata del documento e della sua cronologia, in byte."""
+        if not self._json_data:
+            return 0
+        if self._size is None:
+            from .workspace import estimated_size
+            self._size = estimated_size(self._json_data)
+        history = journal_of(self._json_data)
+        return self._size + (history.memory_usage() if history is not None else 0)
+
+    def close(self, cache: bool = False) -> None:
+        """
+        Chiude il documento e libera frammenti JSON, cronologia e indici
+
+        Args:
+            cache: Se il documento non è modificato, lo scrive prima nella cache
+                dei salvataggi decodificati per riaprirlo senza decifrarlo
+        """
+        document = self._json_data
+        if document:
+            # Solo se il file contiene ancora esattamente questo documento
+            from .workspace import release
+            unchanged_file = cache and not self.is_modified() and self._origin.source_unchanged()
+            if unchanged_file:
+                # Chiave della cache: i byte da cui il documento è stato decodificato
+                release(document, self._origin.path, self._origin.fingerprint, self._origin.digest)
+            else:
+                release(document)
+        self.json_data = None
+
     def get_file_info(self) -> Dict:
         """Ottiene informazioni sul file caricato."""
-        if not self.json_data:
+        data = self._document()
+        if not data:
             return {}
             
         return {
-            "team_name": self.json_data["teamName"]["value"],
-            "player_count": len(self.json_data["playerNames"]["value"]),
-            "level": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["level"],
-            "currency": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["currency"],
-            "lives": self.json_data["dictionaryOfDictionaries"]["value"]["runStats"]["lives"]
+            "team_name": TEAM_NAME.get(data),
+            "player_count": len(PLAYER_NAMES.get(data, {})),
+            "level": LEVEL.get(data),
+            "currency": CURRENCY.get(data),
+            "lives": LIVES.get(data)
         }
         
+    def validate(self) -> List["Violation"]:
+        """Controlla tutto il documento rispetto allo schema del salvataggio e restituisce ogni violazione."""
+        from .schema import Violation, validate
+        document = self._document()
+        if not document:
+            return [Violation((), "Nessun file caricato")]
+        return validate(document)
+
+    def diff(self, base_path: str) -> List["Difference"]:
+        """Differenze tra il salvataggio ``base_path`` (es. un backup) e il documento corrente."""
+        from .diff import diff_files
+        document = self._document()
+        if not document:
+            raise ValueError("Nessun file caricato")
+        return diff_files(base_path, document)
+
+    def merge(self, base_path: str, theirs_path: str, prefer: Optional[str] = None) -> "MergePlan":
+        """
+        Unisce nel documento corrente le modifiche di un'altra copia dello stesso salvataggio
+
+        Args:
+            base_path: Salvataggio da cui sono partite entrambe le copie (es. un backup)
+            theirs_path: Copia modificata in parallelo
+            prefer: "theirs" per risolvere i conflitti con i valori dell'altra copia;
+                None o "ours" mantiene i valori correnti
+
+        Returns:
+            MergePlan: Modifiche unite e conflitti, per percorso
+        """
+        document = self._document()
+        if not document:
+            raise ValueError("Nessun file caricato")
+        from .diff import index_file, index_of
+        from .merge import apply_merge, plan_merge
+        base, theirs = index_file(base_path), index_file(theirs_path)
+        plan = plan_merge(base.document, document, theirs.document, base, index_of(document), theirs)
+        if apply_merge(document, plan, prefer):
+            # La tabella dei giocatori non vede le modifiche fatte sul documento
+            self._player_table = None
+        return plan
+
     def validate_player_data(self, player_id: str, health: int, upgrades: Dict) -> Tuple[bool, str]:
-        """Valida i dati di un giocatore prima dell'aggiornamento."""
-        if not self.json_data:
+        """Valida i dati di un giocatore prima dell'aggiornamento, riportando tutti gli errori."""
+        from .schema import HEALTH, UPGRADE
+        if not self._document():
             return False, "Nessun file caricato"
             
-        if player_id not in self.json_data["playerNames"]["value"]:
-            return False, f"ID giocatore non valido: {player_id}"
-            
-        if not isinstance(health, int) or health < 0 or health > 200:
-            return False, "La salute deve essere un numero intero tra 0 e 200"
-            
+        errors = []
+        if player_id not in self.player_table:
+            errors.append(f"ID giocatore non valido: {player_id}")
+        violations = HEALTH.validate(health, ("health",))
         for key, value in upgrades.items():
-            if not isinstance(value, int) or value < 0:
-                return False, f"L'upgrade {key} deve essere un numero intero non negativo"
-                
+            violations += UPGRADE.validate(value, ("upgrades", key))
+        errors += map(str, violations)
+        
+        if errors:
+            return False, "; ".join(errors)
         return True, "Dati validi"
         
     def validate_world_data(self, data: Dict) -> Tuple[bool, str]:
-        """Valida i dati del mondo prima dell'aggiornamento."""
-        if not self.json_data:
+        """Valida i dati del mondo prima dell'aggiornamento, riportando tutti gli errori."""
+        from .schema import WORLD_DATA
+        if not self._document():
             return False, "Nessun file caricato"
             
-        required_fields = ["level", "currency", "lives", "charging_station", "total_haul", "team_name"]
-        for field in required_fields:
-            if field not in data:
-                return False, f"Campo mancante: {field}"
-                
-        if not isinstance(data["level"], int) or data["level"] < 1:
-            return False, "Il livello deve essere un numero intero positivo"
-            
-        if not isinstance(data["currency"], int) or data["currency"] < 0:
-            return False, "La valuta deve essere un numero intero non negativo"
-            
-        if not isinstance(data["lives"], int) or data["lives"] < 0:
-            return False, "Le vite devono essere un numero intero non negativo"
-            
-        if not isinstance(data["charging_station"], int) or data["charging_station"] < 0:
-            return False, "La carica della stazione deve essere un numero intero non negativo"
-            
-        if not isinstance(data["total_haul"], int) or data["total_haul"] < 0:
-            return False, "Il totale del carico deve essere un numero intero non negativo"
-            
-        if not isinstance(data["team_name"], str) or not data["team_name"]:
-            return False, "Il nome della squadra non può essere vuoto"
-            
-        return True, "Dati validi" 
\ No newline at end of file
+        violations = WORLD_DATA.validate(data)
+        if violations:
+            return False, "; ".join(map(str, violations))
+        return True, "Dati validi"
@@ -0,0 +1,89 @@
+"""Skip saves that would not change anything
+
+Saving re-serialises and re-encrypts the document with a fresh IV, so even
+an untouched save comes out with different bytes. ``SaveOrigin`` remembers
+which file a document was read from (fingerprint and BLAKE2b hash of its
+ciphertext) and the document revision at that point (see
+``tracked_document``). As long as no edit was reported since, saving is a
+no-op on the same file or a plain byte copy to another one.
+"""
+
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .save_cache import Fingerprint, content_hash, file_fingerprint
+from .tracked_document import track, tracked
+
+logger = logging.getLogger(__name__)
+
+UNCHANGED = "unchanged"
+COPIED = "copied"
+
+
+class SaveOrigin:
+    """
+    File a document was loaded from (or last saved to), as it was on disk
+
+    Args:
+        path: Save file path
+        document: Decoded content of ``path``
+        fingerprint, digest: State of ``path`` taken before decoding it (see
+            ``SaveCache.open``); read from the file now when omitted
+    """
+
+    def __init__(self, path: Union[str, Path], document: Any, fingerprint: Optional[Fingerprint] = None,
+                 digest: Optional[bytes] = None):
+        self.path = os.path.abspath(path)
+        self.document = document
+        if fingerprint is None or digest is None:
+            fingerprint, digest = file_fingerprint(self.path), content_hash(self.path)
+        self.fingerprint = fingerprint
+        self.digest = digest
+        self._tracker = track(document)
+        self._revision = self._tracker.revision
+
+    @property
+    def modified(self) -> bool:
+        """Whether an edit was reported since the document was read"""
+        # An evicted tracker no longer receives edits: assume the worst
+        return tracked(self.document) is not self._tracker or self._tracker.revision != self._revision
+
+    def source_unchanged(self) -> bool:
+        """Whether the file still holds the bytes the document was read from"""
+        try:
+            if file_fingerprint(self.path) == self.fingerprint:
+                return True
+            return content_hash(self.path) == self.digest
+        except OSError:
+            return False
+
+    def reuse(self, target: Union[str, Path]) -> Optional[str]:
+        """
+        Save by reusing the original file when the document was not edited
+
+        Args:
+            target: Destination path
+
+        Returns:
+            Optional[str]: ``UNCHANGED`` when ``target`` already holds the save,
+            ``COPIED`` after a byte copy, None when a real save is needed
+        """
+        if self.modified or not self.source_unchanged():
+            return None
+        target = os.path.abspath(target)
+        if os.path.normcase(target) == os.path.normcase(self.path):
+            return UNCHANGED
+        temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(self.path, temp)
+            os.replace(temp, target)
+        except OSError as e:
+            logger.debug(f"Byte copy of {self.path} failed, saving normally: {e}")
+            if os.path.exists(temp):
+                os.remove(temp)
+            return None
+        return COPIED
@@ -0,0 +1,197 @@
+"""Precompiled accessors for fields of a save
+
+``SavePath("dictionaryOfDictionaries.value.runStats.currency")`` splits the
+dotted path once and, on first use with a document, remembers the container
+holding the last key. Later ``get`` / ``set`` / ``exists`` calls on the same
+document are a single subscript instead of a walk down the tree.
+
+The cached container is dropped when the path is used with another document,
+after ``invalidate_paths()``, or by ``forget(document)`` once the document is
+closed (``workspace.release`` does it), so a closed save is never kept alive
+by a path. ``SavePath.set`` calls it by itself when it
+stores a dict or a list (which may replace a container other paths cached).
+Code that restructures a document in place without going through
+``SavePath``, like clearing and refilling it from an editor, must call it too.
+
+Writes through ``set`` are reported to the document tracker (see
+``tracked_document``), so they are re-serialised on the next save, and to the
+edit journal (see ``edit_journal``) so they can be undone.
+
+Numeric parts index lists; on dictionaries every part is a string key, since
+Steam IDs are numeric strings.
+"""
+
+import functools
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+from .edit_journal import ABSENT, group, record
+from .tracked_document import mark_dirty, unchanged
+
+_MISSING = object()
+_generation = 0
+# Every SavePath, for forget(); documents are dicts, which cannot be weakly referenced
+_paths = weakref.WeakSet()
+
+
+def invalidate_paths():
+    """Forget the containers cached by every ``SavePath``"""
+    global _generation
+    _generation += 1
+
+
+def forget(document: Any):
+    """Drop the references every ``SavePath`` holds to ``document`` (e.g. when it is closed)"""
+    for path in list(_paths):
+        if path._document is document:
+            path._document = path._parent = None
+
+
+def _child(node: Any, key: str) -> Any:
+    if isinstance(node, dict):
+        return node.get(key, _MISSING)
+    if isinstance(node, list):
+        try:
+            return node[int(key)]
+        except (ValueError, IndexError):
+            return _MISSING
+    return _MISSING
+
+
+class SavePath:
+    """
+    Compiled dotted path into a save document
+
+    Args:
+        path: Keys separated by dots, e.g. ``teamName.value``
+    """
+
+    __slots__ = ("path", "keys", "_document", "_parent", "_generation", "__weakref__")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.keys: Tuple[str, ...] = tuple(part for part in path.split(".") if part != "")
+        if not self.keys:
+            raise ValueError("Empty save path")
+        self._document = None
+        self._parent = None
+        self._generation = -1
+        _paths.add(self)
+
+    def __repr__(self):
+        return f"SavePath({self.path!r})"
+
+    @property
+    def key(self) -> str:
+        """Last key of the path"""
+        return self.keys[-1]
+
+    def parent(self, document: Any, create: bool = False) -> Optional[Any]:
+        """
+        Container holding the field in ``document``
+
+        Args:
+            document: Decoded save
+            create: Create the missing dictionaries along the way
+
+        Returns:
+            Optional[Any]: The dict or list, None when the structure is missing
+        """
+        if self._document is document and self._generation == _generation:
+            return self._parent
+        node = document
+        for depth, key in enumerate(self.keys[:-1], 1):
+            child = _child(node, key)
+            if child is _MISSING:
+                if not (create and isinstance(node, dict)):
+                    return None
+                child = node[key] = {}
+                record(document, self.keys[:depth], ABSENT, child)
+            node = child
+        if not isinstance(node, (dict, list)):
+            return None
+        self._document, self._parent, self._generation = document, node, _generation
+        return node
+
+    def get(self, document: Any, default: Any = None) -> Any:
+        """Value of the field, ``default`` when the field or its parents are missing"""
+        parent = self.parent(document)
+        if parent is None:
+            return default
+        value = _child(parent, self.keys[-1])
+        return default if value is _MISSING else value
+
+    def exists(self, document: Any) -> bool:
+        """Whether the field is present in ``document``"""
+        parent = self.parent(document)
+        return parent is not None and _child(parent, self.keys[-1]) is not _MISSING
+
+    def set(self, document: Any, value: Any, create: bool = False) -> bool:
+        """
+        Store ``value`` in the field
+
+        Storing the value the field already has is not reported as an edit.
+
+        Args:
+            document: Decoded save
+            value: New value
+            create: Create the missing parent dictionaries
+
+        Returns:
+            bool: False when the parent is missing (and not created) or the list index is out of range
+        """
+        if create:
+            # Parents created on the way are undone together with the value
+            with group(document):
+                return self._set(document, value, True)
+        return self._set(document, value, False)
+
+    def _set(self, document: Any, value: Any, create: bool) -> bool:
+        parent = self.parent(document, create)
+        if parent is None:
+            return False
+        key = self.keys[-1]
+        previous = _child(parent, key)
+        if unchanged(previous, value):
+            # Nothing to write: the document stays clean
+            return True
+        if isinstance(parent, list):
+            try:
+                parent[int(key)] = value
+            except (ValueError, IndexError):
+                return False
+        else:
+            parent[key] = value
+        mark_dirty(document, *self.keys)
+        record(document, self.keys, ABSENT if previous is _MISSING else previous, value)
+        if isinstance(value, (dict, list)):
+            invalidate_paths()
+        return True
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_path(path: str) -> SavePath:
+    """Shared ``SavePath`` for ``path``: user-supplied paths are compiled once per process"""
+    return SavePath(path)
+
+
+# Fields shared by the save managers, the tabs and the command line
+RUN_STATS = SavePath("dictionaryOfDictionaries.value.runStats")
+LEVEL = SavePath("dictionaryOfDictionaries.value.runStats.level")
+CURRENCY = SavePath("dictionaryOfDictionaries.value.runStats.currency")
+LIVES = SavePath("dictionaryOfDictionaries.value.runStats.lives")
+CHARGING_STATION = SavePath("dictionaryOfDictionaries.value.runStats.chargingStationCharge")
+TOTAL_HAUL = SavePath("dictionaryOfDictionaries.value.runStats.totalHaul")
+TEAM_NAME = SavePath("teamName.value")
+PLAYER_NAMES = SavePath("playerNames.value")
+PLAYER_HEALTH = SavePath("dictionaryOfDictionaries.value.playerHealth")
+
+# World field name used by the save managers -> path
+WORLD_FIELDS: Dict[str, SavePath] = {
+    "level": LEVEL,
+    "currency": CURRENCY,
+    "lives": LIVES,
+    "charging_station": CHARGING_STATION,
+    "total_haul": TOTAL_HAUL,
+    "team_name": TEAM_NAME,
+}
@@ -0,0 +1,354 @@
+"""Change-driven notifications for save files
+
+``SaveWatcher`` runs a single scheduler thread for any number of watched
+saves and calls back once per settled change:
+
+- on Linux the directories of the saves are watched with inotify (through
+  ``ctypes``, no extra dependency), so an idle save costs nothing;
+- elsewhere, or when inotify is unavailable, the saves are ``stat``-ed every
+  ``poll_interval`` seconds.
+
+Either way an event only marks a save as possibly changed. Its fingerprint
+(size, mtime, inode, see ``save_cache``) is read again and the callback runs
+once the fingerprint has stayed the same for ``debounce`` seconds, and only if
+it differs from the one of the last callback: a burst of writes from the game
+gives one call. Touching the file without writing changes its mtime, so it
+gives a call too; ``BackupStore.add`` then finds the same ciphertext hash and
+keeps the latest backup instead of adding one.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from .save_cache import Fingerprint, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify(7)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+def _fingerprint(path: str) -> Optional[Fingerprint]:
+    try:
+        return file_fingerprint(path)
+    except OSError:
+        return None
+
+
+class _Inotify:
+    """Directory watches on an inotify descriptor, woken up through a pipe"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        self._directories: Dict[int, str] = {}
+        self._watches: Dict[str, int] = {}
+
+    def add(self, directory: str):
+        if directory in self._watches:
+            return
+        wd = self._add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._watches[directory] = wd
+        self._directories[wd] = directory
+
+    def remove(self, directory: str):
+        wd = self._watches.pop(directory, None)
+        if wd is not None:
+            self._directories.pop(wd, None)
+            self._rm_watch(self.fd, wd)
+
+    def wake(self):
+        try:
+            os.write(self._wake_write, b"\0")
+        except OSError:
+            pass
+
+    def wait(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        """
+        Files touched in the watched directories within ``timeout`` seconds
+
+        Returns:
+            Optional[Set[str]]: Paths of the touched files, None when events
+            were lost and every save must be checked
+        """
+        readable, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if self._wake_read in readable:
+            try:
+                while os.read(self._wake_read, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        if self.fd not in readable:
+            return set()
+        touched = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return touched
+            position = 0
+            while position < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, position)
+                position += _EVENT.size
+                name = data[position:position + length].rstrip(b"\0")
+                position += length
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                if mask & _IN_IGNORED:
+                    # Directory deleted or unmounted: the watch is gone
+                    directory = self._directories.pop(wd, None)
+                    if directory is not None:
+                        self._watches.pop(directory, None)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is not None and name:
+                    touched.add(os.path.join(directory, os.fsdecode(name)))
+
+    def close(self):
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class _Polling:
+    """No events: every save is checked each ``interval`` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._wakeup = threading.Event()
+
+    def add(self, directory: str):
+        pass
+
+    def remove(self, directory: str):
+        pass
+
+    def wake(self):
+        self._wakeup.set()
+
+    def wait(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        if timeout is None or timeout > self.interval:
+            timeout = self.interval
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return None
+
+    def close(self):
+        pass
+
+
+class _Watch:
+    __slots__ = ("path", "polled", "notified", "seen", "deadline", "last_call")
+
+    def __init__(self, path: str, polled: bool):
+        self.path = path
+        # Directory the backend could not watch: checked every poll interval
+        self.polled = polled
+        # Fingerprint at the last callback (or when watching started)
+        self.notified = _fingerprint(path)
+        self.seen = self.notified
+        self.deadline: Optional[float] = None
+        self.last_call: Optional[float] = None
+
+
+class SaveWatcher:
+    """
+    One thread calling ``callback(path)`` when a watched save has changed and settled
+
+    Args:
+        callback: Called on the scheduler thread with the absolute path of the save
+        debounce: Seconds the fingerprint must stay the same before the callback
+        min_interval: Minimum seconds between two callbacks for the same save;
+            a change arriving sooner is reported when the interval has elapsed
+        poll_interval: Seconds between two checks when inotify is not available
+        use_inotify: False to always poll (e.g. for network file systems)
+    """
+
+    def __init__(self, callback: Callable[[str], None], debounce: float = DEFAULT_DEBOUNCE,
+                 min_interval: float = 0.0, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_inotify: bool = True):
+        self.callback = callback
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._watches: Dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._backend = None
+        # Thread of the current backend; a thread no longer here closes its backend and exits
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def backend(self) -> str:
+        """``"inotify"``, ``"polling"``, or ``"stopped"`` before the first watch"""
+        if self._backend is None:
+            return "stopped"
+        return "inotify" if isinstance(self._backend, _Inotify) else "polling"
+
+    @property
+    def watching(self) -> List[str]:
+        with self._lock:
+            return list(self._watches)
+
+    def _create_backend(self):
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                return _Inotify()
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify unavailable, polling saves instead: {e}")
+        return _Polling(self.poll_interval)
+
+    def watch(self, path: Union[str, Path]):
+        """Start watching a save (again a no-op when already watched); starts the thread"""
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._watches:
+                return
+            if self._backend is None:
+                self._backend = self._create_backend()
+            polled = False
+            try:
+                self._backend.add(os.path.dirname(key))
+            except OSError as e:
+                logger.warning(f"Unable to watch {os.path.dirname(key)}, polling it instead: {e}")
+                polled = True
+            self._watches[key] = _Watch(key, polled)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._backend,), name="SaveWatcher",
+                                                daemon=True)
+                self._thread.start()
+            else:
+                self._backend.wake()
+
+    def unwatch(self, path: Union[str, Path]) -> bool:
+        """
+        Stop watching a save; the thread stops with the last one
+
+        Returns:
+            bool: False when the save was not watched
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            if self._watches.pop(key, None) is None:
+                return False
+            directory = os.path.dirname(key)
+            if not any(os.path.dirname(other) == directory for other in self._watches):
+                self._backend.remove(directory)
+            if self._watches:
+                return True
+        self.stop()
+        return True
+
+    def stop(self, timeout: float = 2.0):
+        """
+        Forget every save and stop the thread
+
+        The thread closes the backend once it has exited its loop, so a callback
+        still running after ``timeout`` never sees its backend closed under it;
+        a later ``watch`` starts over with a new thread and backend.
+        """
+        with self._lock:
+            self._watches.clear()
+            thread, backend = self._thread, self._backend
+            self._thread = self._backend = None
+            if backend is not None:
+                if thread is None:
+                    backend.close()
+                else:
+                    backend.wake()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Save watcher thread still busy in a callback, it stops after it")
+
+    def _run(self, backend):
+        current = threading.current_thread()
+        pending: Optional[Set[str]] = None
+        try:
+            while True:
+                with self._lock:
+                    if self._thread is not current:
+                        return
+                    due = self._check(pending)
+                    deadlines = [watch.deadline for watch in self._watches.values() if watch.deadline is not None]
+                    polled = {watch.path for watch in self._watches.values() if watch.polled}
+                for path in due:
+                    try:
+                        self.callback(path)
+                    except Exception as e:
+                        logger.error(f"Save watcher callback failed for {path}: {e}")
+                if self._thread is not current:
+                    return
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                if polled and (timeout is None or timeout > self.poll_interval):
+                    timeout = self.poll_interval
+                pending = backend.wait(timeout)
+                if pending is not None:
+                    pending |= polled
+        finally:
+            # Under the lock: stop() only wakes a backend its thread has not closed yet
+            with self._lock:
+                backend.close()
+
+    def _check(self, touched: Optional[Set[str]]) -> List[str]:
+        """Update the saves touched (all when None) and return those due for a callback"""
+        now = time.monotonic()
+        due = []
+        for watch in self._watches.values():
+            if touched is None or watch.path in touched or watch.deadline is not None:
+                fingerprint = _fingerprint(watch.path)
+                if fingerprint != watch.seen:
+                    # Still being written: wait for it to settle
+                    watch.seen = fingerprint
+                    watch.deadline = now + self.debounce
+            if watch.deadline is None:
+                continue
+            if watch.seen is None or watch.seen == watch.notified:
+                # Deleted, or back to the state already reported
+                watch.deadline = None
+                continue
+            deadline = watch.deadline
+            if watch.last_call is not None:
+                deadline = max(deadline, watch.last_call + self.min_interval)
+            if now < deadline:
+                watch.deadline = deadline
+                continue
+            watch.deadline = None
+            watch.notified = watch.seen
+            watch.last_call = now
+            due.append(watch.path)
+        return due
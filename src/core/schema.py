@@ -0,0 +1,313 @@
+"""Declarative schema of the save layout and its compiled validator
+
+The known parts of a save are described with a few node types (``Int``,
+``Number``, ``Str``, ``Map``, ``Object``, ``Wrapped``, ``AnyOf``). Each node is
+compiled once into a checker closure; ``validate(document)`` walks the known
+parts of the document in a single traversal and returns every
+``Violation`` with its path, instead of stopping at the first problem.
+
+Only what the schema describes is visited: unknown keys are ignored, so tables
+the editor knows nothing about cost nothing. Maps of scalars are checked with
+a plain predicate per value and a path is only built for the values that fail,
+which keeps a full validation cheap enough to run on every keystroke of the
+raw JSON editor or over whole backup directories.
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Path = Tuple[str, ...]
+Check = Callable[[Any, Path, List["Violation"]], None]
+
+_MISSING = object()
+
+
+class Violation:
+    """A value that does not match the schema"""
+
+    __slots__ = ("path", "message")
+
+    def __init__(self, path: Path, message: str):
+        self.path = path
+        self.message = message
+
+    @property
+    def dotted(self) -> str:
+        """Path as dotted keys, like ``SavePath``"""
+        return ".".join(map(str, self.path))
+
+    def __str__(self):
+        return f"{self.dotted or '<document>'}: {self.message}"
+
+    def __repr__(self):
+        return f"Violation({str(self)!r})"
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"path": self.dotted, "message": self.message}
+
+
+class Node:
+    """Schema node; ``compile`` returns a ``check(value, path, report)`` closure"""
+
+    _check: Optional[Check] = None
+
+    def compile(self) -> Check:
+        raise NotImplementedError
+
+    def validate(self, value: Any, path: Path = ()) -> List[Violation]:
+        """Violations of ``value``, compiling the node on first use"""
+        if self._check is None:
+            self._check = self.compile()
+        report: List[Violation] = []
+        self._check(value, path, report)
+        return report
+
+
+class Scalar(Node):
+    """Node checked by a single predicate"""
+
+    def accepts(self) -> Callable[[Any], bool]:
+        """Predicate of the values that match"""
+        raise NotImplementedError
+
+    def problem(self, value: Any) -> str:
+        raise NotImplementedError
+
+    def compile(self) -> Check:
+        accepts, problem = self.accepts(), self.problem
+
+        def check(value, path, report):
+            if not accepts(value):
+                report.append(Violation(path, problem(value)))
+        return check
+
+
+class Number(Scalar):
+    """Integer or float within ``[minimum, maximum]``"""
+
+    types: Tuple[type, ...] = (int, float)
+    kind = "a number"
+
+    def __init__(self, minimum: Optional[float] = None, maximum: Optional[float] = None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def accepts(self) -> Callable[[Any], bool]:
+        types = self.types
+        low = float("-inf") if self.minimum is None else self.minimum
+        high = float("inf") if self.maximum is None else self.maximum
+        # bool is an int subclass: compare exact types
+        return lambda value: type(value) in types and low <= value <= high
+
+    def problem(self, value: Any) -> str:
+        if type(value) not in self.types:
+            return f"must be {self.kind}, got {type(value).__name__} {value!r}"
+        if self.minimum is not None and value < self.minimum:
+            return f"must be at least {self.minimum}, got {value}"
+        return f"must be at most {self.maximum}, got {value}"
+
+
+class Int(Number):
+    """Integer within ``[minimum, maximum]``"""
+
+    types = (int,)
+    kind = "an integer"
+
+
+class Str(Scalar):
+    """String, optionally required to be non-empty"""
+
+    def __init__(self, non_empty: bool = False):
+        self.non_empty = non_empty
+
+    def accepts(self) -> Callable[[Any], bool]:
+        if self.non_empty:
+            return lambda value: type(value) is str and value != ""
+        return lambda value: type(value) is str
+
+    def problem(self, value: Any) -> str:
+        if type(value) is not str:
+            return f"must be a string, got {type(value).__name__} {value!r}"
+        return "must not be empty"
+
+
+class AnyOf(Node):
+    """Value matching at least one of ``options``"""
+
+    def __init__(self, *options: Node):
+        self.options = options
+
+    def compile(self) -> Check:
+        checks = [option.compile() for option in self.options]
+
+        def check(value, path, report):
+            best = None
+            for option in checks:
+                attempt: List[Violation] = []
+                option(value, path, attempt)
+                if not attempt:
+                    return
+                # An option failing inside the value matched its shape: its violations say more
+                if best is None or (best[0].path == path and attempt[0].path != path):
+                    best = attempt
+            report.extend(best)
+        return check
+
+
+class Map(Node):
+    """Object with arbitrary keys (Steam IDs, item names...) whose values all match ``values``"""
+
+    def __init__(self, values: Node):
+        self.values = values
+
+    def compile(self) -> Check:
+        if isinstance(self.values, Scalar):
+            accepts, problem = self.values.accepts(), self.values.problem
+
+            def check(value, path, report):
+                if type(value) is not dict:
+                    report.append(Violation(path, f"must be an object, got {type(value).__name__}"))
+                    return
+                for key, item in value.items():
+                    if not accepts(item):
+                        report.append(Violation(path + (key,), problem(item)))
+            return check
+
+        check_value = self.values.compile()
+
+        def check(value, path, report):
+            if type(value) is not dict:
+                report.append(Violation(path, f"must be an object, got {type(value).__name__}"))
+                return
+            for key, item in value.items():
+                check_value(item, path + (key,), report)
+        return check
+
+
+class Object(Node):
+    """
+    Object with known keys
+
+    Args:
+        fields: Key -> node of the keys the schema knows
+        required: Keys that must be present
+        patterns: (regular expression, node) for the other keys; the first
+            pattern found in the key applies, keys matching none are ignored
+    """
+
+    def __init__(self, fields: Dict[str, Node], required: Iterable[str] = (),
+                 patterns: Sequence[Tuple[str, Node]] = ()):
+        self.fields = fields
+        self.required = tuple(required)
+        self.patterns = tuple(patterns)
+
+    def compile(self) -> Check:
+        fields = [(key, node.compile()) for key, node in self.fields.items()]
+        known = frozenset(self.fields)
+        required = self.required
+        patterns = [(re.compile(pattern).search, node.compile()) for pattern, node in self.patterns]
+
+        def check(value, path, report):
+            if type(value) is not dict:
+                report.append(Violation(path, f"must be an object, got {type(value).__name__}"))
+                return
+            for key in required:
+                if key not in value:
+                    report.append(Violation(path + (key,), "missing"))
+            for key, check_field in fields:
+                item = value.get(key, _MISSING)
+                if item is not _MISSING:
+                    check_field(item, path + (key,), report)
+            if patterns:
+                for key, item in value.items():
+                    if key in known:
+                        continue
+                    for search, check_pattern in patterns:
+                        if search(key):
+                            check_pattern(item, path + (key,), report)
+                            break
+        return check
+
+
+class Wrapped(Node):
+    """ES3 wrapper ``{"__type": ..., "value": ...}`` around ``inner``"""
+
+    def __init__(self, inner: Node):
+        self.inner = inner
+
+    def compile(self) -> Check:
+        check_inner = self.inner.compile()
+
+        def check(value, path, report):
+            if type(value) is not dict or "value" not in value:
+                report.append(Violation(path, "must be an ES3 wrapper with a \"value\" key"))
+                return
+            check_inner(value["value"], path + ("value",), report)
+        return check
+
+
+class Validator:
+    """``schema`` compiled once, callable on documents"""
+
+    def __init__(self, schema: Node):
+        self.schema = schema
+        self._check = schema.compile()
+
+    def __call__(self, document: Any) -> List[Violation]:
+        report: List[Violation] = []
+        self._check(document, (), report)
+        return report
+
+
+# Values shared by the save schema and the validation of edits
+MAX_HEALTH = 200
+HEALTH = Int(0, MAX_HEALTH)
+UPGRADE = Int(0)
+COUNT = Int(0)
+LEVEL = Int(1)
+TEAM_NAME = Str(non_empty=True)
+
+RUN_STATS = Object({
+    "level": LEVEL,
+    "currency": COUNT,
+    "lives": COUNT,
+    "chargingStationCharge": COUNT,
+    "totalHaul": COUNT,
+}, required=("level", "currency", "lives"))
+
+# Inventory-like tables: item name -> count, or an item object as the inventory tab writes it
+INVENTORY_ITEM = AnyOf(COUNT, Object({"quantity": COUNT, "count": COUNT, "name": Str(), "description": Str()}))
+
+SAVE_SCHEMA = Object({
+    "dictionaryOfDictionaries": Wrapped(Object(
+        {
+            "runStats": RUN_STATS,
+            "playerHealth": Map(HEALTH),
+        },
+        required=("runStats",),
+        patterns=(
+            (r"^playerUpgrade", Map(UPGRADE)),
+            (r"(?i)item|inventory", Map(INVENTORY_ITEM)),
+        ),
+    )),
+    "playerNames": Wrapped(Map(Str())),
+    "teamName": Wrapped(TEAM_NAME),
+    "timePlayed": Wrapped(Number(0)),
+}, required=("dictionaryOfDictionaries",))
+
+# Fields of SaveManager.get_world_data
+WORLD_DATA = Object({
+    "level": LEVEL,
+    "currency": COUNT,
+    "lives": COUNT,
+    "charging_station": COUNT,
+    "total_haul": COUNT,
+    "team_name": TEAM_NAME,
+}, required=("level", "currency", "lives", "charging_station", "total_haul", "team_name"))
+
+save_validator = Validator(SAVE_SCHEMA)
+
+
+def validate(document: Any) -> List[Violation]:
+    """Every violation of the save schema in ``document``"""
+    return save_validator(document)
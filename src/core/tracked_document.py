@@ -0,0 +1,192 @@
+"""Incremental JSON serialisation of a save document
+
+``TrackedDocument`` produces exactly ``json.dumps(document, indent=4)`` while
+keeping the encoded text of every subtree down to ``depth`` levels (enough to
+reach ``dictionaryOfDictionaries.value.<stat>.<entry>``); objects whose values
+are all scalars are kept as a single fragment. Mutations are reported with
+``mark_dirty(path)``: only the marked subtrees and their ancestors are encoded
+again, every other fragment is reused as is. After a small edit, serialising
+costs time proportional to the edit plus one final join, instead of
+re-encoding the whole save.
+
+Trackers are shared through ``track(document)``, so code that only holds the
+document (the tabs, ``SavePath``, ``PlayerTable``) can report its edits with
+the module-level ``mark_dirty(document, *keys)``; it does nothing for
+documents nobody tracks. Edits that are not reported leave stale fragments:
+when unsure, mark the whole document (``mark_dirty(document)``).
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_DEPTH = 4
+# Documents whose fragments are kept at the same time (saves open in the workspace, editor copy...)
+MAX_TRACKED = 12
+
+
+class _Fragment:
+    """Encoded chunks of one subtree and the fragments of its children"""
+
+    __slots__ = ("chunks", "children")
+
+    def __init__(self):
+        self.chunks: Optional[List[bytes]] = None
+        self.children: Dict[str, "_Fragment"] = {}
+
+
+def _is_branch(value: Any) -> bool:
+    """
+    Objects holding other containers get per-child fragments; objects of
+    scalars (like a stat keyed by Steam ID) are cheaper to encode in one go
+    """
+    if type(value) is not dict or not value:
+        return False
+    branch = False
+    for key, child in value.items():
+        if type(key) is not str:
+            return False
+        if not branch and isinstance(child, (dict, list)):
+            branch = True
+    return branch
+
+
+class TrackedDocument:
+    """
+    Save document with cached per-subtree JSON fragments
+
+    Args:
+        document: Decoded save, mutated in place by its owners
+        indent: Indentation, as for ``json.dumps``
+        depth: Levels of nested objects cached separately; deeper values are
+            encoded as a whole
+    """
+
+    def __init__(self, document: Any, indent: int = 4, depth: int = DEFAULT_DEPTH):
+        self.document = document
+        self.indent = indent
+        self.depth = depth
+        self._root = _Fragment()
+        self._newlines = [b"\n" + b" " * (indent * level) for level in range(depth + 1)]
+        self.encoded = 0
+        self.reused = 0
+        # Bumped by every mark_dirty: equal revisions mean the document was not touched
+        self.revision = 0
+
+    @property
+    def dirty(self) -> bool:
+        """Whether something changed since the last serialisation"""
+        return self._root.chunks is None
+
+    def mark_dirty(self, *keys: Any):
+        """
+        Report a mutation of the value at ``keys`` (the whole document when empty)
+
+        The value itself and every container above it are encoded again on the
+        next serialisation; its siblings keep their fragments.
+        """
+        self.revision += 1
+        node = self._root
+        node.chunks = None
+        for key in keys[:self.depth]:
+            node = node.children.get(key if isinstance(key, str) else str(key))
+            if node is None:
+                return
+            node.chunks = None
+        node.children = {}
+
+    def _render(self, value: Any, node: _Fragment, level: int) -> List[bytes]:
+        if node.chunks is not None:
+            self.reused += 1
+            return node.chunks
+        self.encoded += 1
+        if level < self.depth and _is_branch(value):
+            inner = self._newlines[level + 1]
+            previous = node.children
+            children = {}
+            chunks = [b"{"]
+            separator = inner
+            for key, child_value in value.items():
+                child = previous.get(key)
+                if child is None:
+                    child = _Fragment()
+                children[key] = child
+                chunks.append(separator + json.dumps(key).encode('ascii') + b": ")
+                chunks.extend(self._render(child_value, child, level + 1))
+                separator = b"," + inner
+            chunks.append(self._newlines[level] + b"}")
+            node.children = children
+        else:
+            text = json.dumps(value, indent=self.indent)
+            if level and "\n" in text:
+                # JSON strings never contain a raw newline, so this only re-indents
+                text = text.replace("\n", self._newlines[level].decode('ascii'))
+            chunks = [text.encode('ascii')]
+            node.children = {}
+        node.chunks = chunks
+        return chunks
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """
+        The bytes of ``encode`` as the cached fragments, without joining them
+
+        Meant for streaming writers (``ES3Codec.write_chunks``): saving never
+        holds a second copy of the whole text.
+        """
+        return iter(self._render(self.document, self._root, 0))
+
+    def encode(self) -> bytes:
+        """UTF-8 JSON of the document, identical to ``json.dumps(document, indent=indent)``"""
+        return b"".join(self._render(self.document, self._root, 0))
+
+    def dumps(self) -> str:
+        """Same as ``encode`` as a string"""
+        return self.encode().decode('ascii')
+
+
+def unchanged(old: Any, new: Any) -> bool:
+    """
+    Whether storing ``new`` over ``old`` leaves the document as it was
+
+    Only scalars of the same type are compared: containers may have been
+    mutated in place by the caller, so storing one always counts as an edit.
+    """
+    return type(old) is type(new) and not isinstance(new, (dict, list)) and old == new
+
+
+_tracked: "OrderedDict[int, TrackedDocument]" = OrderedDict()
+
+
+def track(document: Any) -> TrackedDocument:
+    """Shared tracker of ``document``, created on first use"""
+    tracker = tracked(document)
+    if tracker is None:
+        tracker = TrackedDocument(document)
+        _tracked[id(document)] = tracker
+        while len(_tracked) > MAX_TRACKED:
+            _tracked.popitem(last=False)
+    else:
+        _tracked.move_to_end(id(document))
+    return tracker
+
+
+def tracked(document: Any) -> Optional[TrackedDocument]:
+    """Tracker of ``document`` if somebody tracks it"""
+    tracker = _tracked.get(id(document))
+    # id() values are reused once a document is freed: check it is the same object
+    if tracker is not None and tracker.document is document:
+        return tracker
+    return None
+
+
+def untrack(document: Any):
+    """Drop the fragments of ``document``"""
+    if tracked(document) is not None:
+        del _tracked[id(document)]
+
+
+def mark_dirty(document: Any, *keys: Any):
+    """Report a mutation to the tracker of ``document``, if any"""
+    tracker = tracked(document)
+    if tracker is not None:
+        tracker.mark_dirty(*keys)
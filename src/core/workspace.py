@@ -0,0 +1,225 @@
+"""Several saves open at once
+
+``Workspace`` keeps one save manager per open save, each with its own
+document, player table, origin and edit journal, so opening a second save
+never touches the first. Managers are created by a factory (the headless
+``core.save_manager.SaveManager`` or the interface one in
+``utils.save_manager``) and only need ``open_file``, ``is_modified``,
+``memory_usage`` and ``close``.
+
+Decoded documents are kept within a memory budget and a number of resident
+saves. Past either, the least recently used saves without unsaved edits are
+evicted: their document is written to the decoded-save cache (see
+``save_cache``) and dropped from memory together with its JSON fragments, edit
+history and diff index. Activating an evicted save reopens it from the cache,
+without decrypting it again; activating a resident one costs nothing. Saves
+with unsaved edits are never evicted.
+"""
+
+import logging
+import marshal
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .diff import forget
+from .edit_journal import drop_journal
+from .save_cache import Fingerprint, save_cache
+from .save_path import forget as forget_paths
+from .tracked_document import MAX_TRACKED, untrack
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Below the tracker and journal registries, which would otherwise drop the history of open saves
+DEFAULT_MAX_RESIDENT = MAX_TRACKED - 4
+
+# Decoded documents take about 11 times their marshal size (dict, str and int objects)
+_OBJECT_OVERHEAD = 11
+
+
+def estimated_size(document: Any) -> int:
+    """Estimated bytes held by a decoded document, in a single C call"""
+    try:
+        return len(marshal.dumps(document)) * _OBJECT_OVERHEAD
+    except ValueError:
+        return 0
+
+
+def release(document: Any, path: Optional[Union[str, Path]] = None, fingerprint: Optional[Fingerprint] = None,
+            digest: Optional[bytes] = None):
+    """
+    Forget the JSON fragments, edit history, diff index and cached paths of a closed document
+
+    Args:
+        document: Document nobody edits any more
+        path: File the document holds unchanged, stored in the decoded-save
+            cache first so that reopening it does not decrypt again
+        fingerprint, digest: State of ``path`` the document was decoded from
+            (``SaveOrigin``), so the entry is keyed to those bytes
+    """
+    if path is not None:
+        save_cache.put(path, document, fingerprint, digest)
+    untrack(document)
+    drop_journal(document)
+    forget(document)
+    forget_paths(document)
+
+
+class Workspace:
+    """
+    Managers of the open saves, most recently used last
+
+    Args:
+        factory: Creates an empty save manager
+        max_bytes: Estimated memory of the resident documents and their history
+        max_resident: Documents kept decoded at the same time
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_resident: int = DEFAULT_MAX_RESIDENT):
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.max_resident = max_resident
+        # Path -> manager, None while evicted
+        self._managers: "OrderedDict[str, Optional[Any]]" = OrderedDict()
+        self._active: Optional[str] = None
+        self.evictions = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _key(path: Union[str, Path]) -> str:
+        return os.path.abspath(path)
+
+    def __contains__(self, path: Union[str, Path]) -> bool:
+        return self._key(path) in self._managers
+
+    def __len__(self) -> int:
+        return len(self._managers)
+
+    @property
+    def paths(self) -> List[str]:
+        """Open saves, least recently used first"""
+        return list(self._managers)
+
+    @property
+    def active_path(self) -> Optional[str]:
+        return self._active
+
+    @property
+    def active(self) -> Optional[Any]:
+        """Manager of the active save"""
+        return self._managers.get(self._active) if self._active is not None else None
+
+    def is_resident(self, path: Union[str, Path]) -> bool:
+        return self._managers.get(self._key(path)) is not None
+
+    def open(self, path: Union[str, Path]) -> Tuple[bool, str]:
+        """
+        Open a save in its own manager and make it active (just activate it when already open)
+
+        Returns:
+            Tuple[bool, str]: Result and message of the manager's ``open_file``
+        """
+        key = self._key(path)
+        if key in self._managers:
+            return self.activate(key)
+        manager = self.factory()
+        success, message = manager.open_file(key)
+        if not success:
+            return success, message
+        self._managers[key] = manager
+        self._active = key
+        self._evict()
+        return success, message
+
+    def activate(self, path: Union[str, Path]) -> Tuple[bool, str]:
+        """
+        Make an open save active, reopening it from the decoded-save cache if it was evicted
+
+        Returns:
+            Tuple[bool, str]: False when the save is not open or cannot be reopened
+        """
+        key = self._key(path)
+        if key not in self._managers:
+            return False, f"Not open: {key}"
+        message = f"Active: {key}"
+        if self._managers[key] is None:
+            manager = self.factory()
+            success, message = manager.open_file(key)
+            if not success:
+                return success, message
+            self._managers[key] = manager
+            self.reloads += 1
+        self._managers.move_to_end(key)
+        self._active = key
+        self._evict()
+        return True, message
+
+    def rename(self, old_path: Union[str, Path], new_path: Union[str, Path]):
+        """Follow a save written to another file ("save as")"""
+        old, new = self._key(old_path), self._key(new_path)
+        if old == new or old not in self._managers:
+            return
+        if new in self._managers:
+            self.close(new)
+        self._managers[new] = self._managers.pop(old)
+        if self._active == old:
+            self._active = new
+
+    def close(self, path: Union[str, Path]) -> bool:
+        """
+        Close a save, discarding its unsaved edits; the most recently used one becomes active
+
+        Returns:
+            bool: False when the save was not open
+        """
+        key = self._key(path)
+        if key not in self._managers:
+            return False
+        manager = self._managers.pop(key)
+        if manager is not None:
+            manager.close()
+        if self._active == key:
+            self._active = None
+            if self._managers:
+                self.activate(next(reversed(self._managers)))
+        return True
+
+    def close_all(self):
+        for key in list(self._managers):
+            self.close(key)
+
+    def memory_usage(self) -> int:
+        """Estimated bytes of the resident documents and their history"""
+        return sum(manager.memory_usage() for manager in self._managers.values() if manager is not None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": len(self._managers),
+            "resident": sum(manager is not None for manager in self._managers.values()),
+            "bytes": self.memory_usage(),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
+
+    def _evict(self):
+        resident = [(key, manager) for key, manager in self._managers.items() if manager is not None]
+        usage = {key: manager.memory_usage() for key, manager in resident}
+        total = sum(usage.values())
+        count = len(resident)
+        for key, manager in resident:
+            if total <= self.max_bytes and count <= self.max_resident:
+                return
+            if key == self._active or manager.is_modified():
+                continue
+            manager.close(cache=True)
+            self._managers[key] = None
+            total -= usage[key]
+            count -= 1
+            self.evictions += 1
+            logger.debug(f"Evicted {key} from the workspace ({usage[key]} bytes)")
+        if total > self.max_bytes or count > self.max_resident:
+            logger.debug(f"Workspace over budget: {count} documents, {total} bytes with unsaved edits")
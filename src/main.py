@@ -12,12 +12,14 @@ from PyQt6.QtGui import QIcon
 from ui.main_window import MainWindow
 from ui.styles import apply_style
 from core import language_manager
+from core.error_handler import setup_error_logging
 from utils.logging_config import setup_logging
 
 def main():
     """Funzione principale per l'avvio dell'applicazione"""
     # Configura il logger
     setup_logging()
+    setup_error_logging()
     
     # Configura la variabile d'ambiente per il percorso dell'applicazione
     os.environ["REPO_SAVE_EDITOR_ROOT"] = str(Path(__file__).parent.absolute())
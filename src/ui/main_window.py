@@ -16,14 +16,16 @@ from PyQt6.QtWidgets import (
     QStatusBar
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QSize
-from PyQt6.QtGui import QIcon, QPixmap, QImage, QPainter, QPen, QColor, QSyntaxHighlighter, QTextCharFormat, QFont, QAction
+from PyQt6.QtGui import QIcon, QPixmap, QImage, QPainter, QPen, QColor, QSyntaxHighlighter, QTextCharFormat, QFont, QAction, QKeySequence
 from pathlib import Path
 
 from ui.styles import apply_style
 from ui.components.modern_widgets import ModernButton, ModernLineEdit, ModernLabel
 from ui.tabs import PlayerTab, InventoryTab, AdvancedTab, SettingsTab
 from utils.save_manager import SaveManager
+from core.workspace import Workspace
 from core import language_manager, tr
+from core.error_handler import setup_error_logging
 
 # Configurazione del logger per questo modulo
 logger = logging.getLogger(__name__)
@@ -44,7 +46,8 @@ class MainWindow(QMainWindow):
         self.save_data = None
         self.save_path = None
         
-        # Manager for save operations
+        # Salvataggi aperti, ognuno con il proprio manager; save_manager è quello attivo
+        self.workspace = Workspace(SaveManager)
         self.save_manager = SaveManager()
         
         # Inizializza l'interfaccia utente
@@ -125,6 +128,10 @@ class MainWindow(QMainWindow):
         self.open_action.setText(tr("main_window.open_action", "Open"))
         self.save_action.setText(tr("main_window.save_action", "Save"))
         self.save_as_action.setText(tr("main_window.save_as_action", "Save As"))
+        self.close_action.setText(tr("main_window.close_action", "Close"))
+        self.document_selector.setToolTip(tr("main_window.open_documents", "Open saves"))
+        self.undo_action.setText(tr("main_window.undo_action", "Undo"))
+        self.redo_action.setText(tr("main_window.redo_action", "Redo"))
         self.about_action.setText(tr("main_window.about_action", "About"))
         
         # Aggiorna la barra di stato
@@ -152,9 +159,24 @@ class MainWindow(QMainWindow):
         self.save_as_action.triggered.connect(self.save_file_as)
         self.file_menu.addAction(self.save_as_action)
         
+        self.close_action = QAction(tr("main_window.close_action", "Close"), self)
+        self.close_action.setShortcut(QKeySequence.StandardKey.Close)
+        self.close_action.triggered.connect(self.close_document)
+        self.file_menu.addAction(self.close_action)
+        
         # Menu Edit
         self.edit_menu = menu_bar.addMenu(tr("main_window.edit_menu", "Edit"))
         
+        self.undo_action = QAction(tr("main_window.undo_action", "Undo"), self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(self.undo)
+        self.edit_menu.addAction(self.undo_action)
+        
+        self.redo_action = QAction(tr("main_window.redo_action", "Redo"), self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(self.redo)
+        self.edit_menu.addAction(self.redo_action)
+        
         # Menu Help
         self.help_menu = menu_bar.addMenu(tr("main_window.help_menu", "Help"))
         self.about_action = QAction(tr("main_window.about_action", "About"), self)
@@ -196,6 +218,14 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.save_as_action)
         toolbar.addSeparator()
         
+        # Salvataggi aperti: il cambio è immediato, senza decifrare di nuovo
+        self.document_selector = QComboBox()
+        self.document_selector.setMinimumWidth(220)
+        self.document_selector.setToolTip(tr("main_window.open_documents", "Open saves"))
+        self.document_selector.activated.connect(self.switch_document)
+        toolbar.addWidget(self.document_selector)
+        toolbar.addSeparator()
+        
         # Crea un'azione per mostrare il profilo utente
         root_dir = os.environ.get("REPO_SAVE_EDITOR_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         user_icon_path = os.path.join(root_dir, "assets", "icons", "user.png")
@@ -226,8 +256,9 @@ class MainWindow(QMainWindow):
                     file_path = file_paths[0]
                     logger.info(f"Richiesta apertura file: {file_path}")
                     
-                    self.save_manager = SaveManager()
-                    success, message = self.save_manager.open_file(file_path)
+                    # Ogni salvataggio ha il proprio manager: quelli già aperti restano intatti
+                    self.flush_tabs()
+                    success, message = self.workspace.open(file_path)
                     if not success:
                         logger.error(f"Errore apertura file da GUI: {message}")
                         QMessageBox.critical(
@@ -237,40 +268,8 @@ class MainWindow(QMainWindow):
                         )
                         return
                     
-                    # Ottieni i dati dal SaveManager
-                    save_data = self.save_manager.json_data
                     logger.info(f"File caricato in GUI: {file_path}")
-                    
-                    # Memorizza i dati
-                    self.save_data = save_data
-                    self.save_path = file_path
-                    
-                    # Aggiorna la barra di stato
-                    self.status_bar.showMessage(tr("main_window.file_loaded", f"File loaded: {file_path}"))
-                    
-                    # Aggiorna i dati nei tab
-                    self.player_tab.save_data = save_data
-                    self.inventory_tab.save_data = save_data
-                    self.advanced_tab.save_data = save_data
-                    
-                    # Popola la UI dai dati caricati
-                    try:
-                        logger.info("Aggiornamento tab giocatore")
-                        self.player_tab.refresh_ui_from_data()
-                    except Exception as e:
-                        logger.error(f"Errore aggiornamento tab giocatore: {str(e)}")
-                        
-                    try:
-                        logger.info("Aggiornamento tab inventario")
-                        self.inventory_tab.refresh_ui_from_data()
-                    except Exception as e:
-                        logger.error(f"Errore aggiornamento tab inventario: {str(e)}")
-                        
-                    try:
-                        logger.info("Aggiornamento tab avanzato")
-                        self.advanced_tab.refresh_ui_from_data()
-                    except Exception as e:
-                        logger.error(f"Errore aggiornamento tab avanzato: {str(e)}")
+                    self.show_active_document()
                     
                     # Notifica l'utente
                     QMessageBox.information(
@@ -292,6 +291,106 @@ class MainWindow(QMainWindow):
                 tr("main_window.open_error_message", f"Errore durante l'apertura: {str(e)}")
             )
         
+    def flush_tabs(self):
+        """Scrive nel documento attivo le modifiche ancora nei tab (tabella dei giocatori, JSON in sospeso)"""
+        if self.player_tab.player_table is not None:
+            self.player_tab.player_table.flush()
+        self.advanced_tab.flush_json_edit()
+            
+    def show_active_document(self):
+        """Mostra nei tab il salvataggio attivo del workspace"""
+        manager = self.workspace.active
+        if manager is None:
+            # Nessun salvataggio aperto
+            self.save_manager = SaveManager()
+            self.save_path = None
+            save_data = {}
+        else:
+            self.save_manager = manager
+            self.save_path = self.workspace.active_path
+            save_data = manager.json_data
+        self.save_data = save_data
+        
+        # Aggiorna la barra di stato
+        if self.save_path:
+            self.status_bar.showMessage(tr("main_window.file_loaded", f"File loaded: {self.save_path}"))
+        else:
+            self.status_bar.showMessage(tr("main_window.ready", "Ready"))
+        
+        # Aggiorna i dati nei tab
+        self.player_tab.save_data = save_data
+        self.inventory_tab.save_data = save_data
+        self.advanced_tab.save_data = save_data
+        
+        # Popola la UI dai dati caricati
+        try:
+            logger.info("Aggiornamento tab giocatore")
+            self.player_tab.refresh_ui_from_data()
+        except Exception as e:
+            logger.error(f"Errore aggiornamento tab giocatore: {str(e)}")
+            
+        try:
+            logger.info("Aggiornamento tab inventario")
+            self.inventory_tab.refresh_ui_from_data()
+        except Exception as e:
+            logger.error(f"Errore aggiornamento tab inventario: {str(e)}")
+            
+        try:
+            logger.info("Aggiornamento tab avanzato")
+            self.advanced_tab.refresh_ui_from_data()
+        except Exception as e:
+            logger.error(f"Errore aggiornamento tab avanzato: {str(e)}")
+            
+        self.update_document_selector()
+        
+    def update_document_selector(self):
+        """Elenca i salvataggi aperti, quello attivo selezionato"""
+        self.document_selector.blockSignals(True)
+        self.document_selector.clear()
+        for index, path in enumerate(self.workspace.paths):
+            self.document_selector.addItem(os.path.basename(path), path)
+            self.document_selector.setItemData(index, path, Qt.ItemDataRole.ToolTipRole)
+        index = self.document_selector.findData(self.workspace.active_path)
+        self.document_selector.setCurrentIndex(index)
+        self.document_selector.blockSignals(False)
+        
+    def switch_document(self, index):
+        """Rende attivo un altro salvataggio aperto"""
+        path = self.document_selector.itemData(index)
+        if not path or path == self.workspace.active_path:
+            return
+        self.flush_tabs()
+        success, message = self.workspace.activate(path)
+        if not success:
+            logger.error(f"Errore nel cambio di salvataggio: {message}")
+            QMessageBox.critical(
+                self,
+                tr("main_window.open_error", "Errore apertura file"),
+                tr("main_window.open_error_message", f"Errore durante l'apertura: {message}")
+            )
+            self.update_document_selector()
+            return
+        self.show_active_document()
+        
+    def close_document(self):
+        """Chiude il salvataggio attivo, chiedendo conferma se ha modifiche non salvate"""
+        path = self.workspace.active_path
+        if path is None:
+            return
+        self.flush_tabs()
+        if self.save_manager.is_modified():
+            reply = QMessageBox.question(
+                self,
+                tr("main_window.confirm_close", "Confirm Close"),
+                tr("main_window.confirm_close_message", "Close this save? Unsaved changes will be lost."),
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        self.workspace.close(path)
+        self.show_active_document()
+        
     def save_file(self):
         """Salva le modifiche nel file corrente"""
         if not self.save_path:
@@ -351,10 +450,18 @@ class MainWindow(QMainWindow):
                         file_path += '.es3'
                     
                     # Aggiorna il percorso corrente
+                    previous_path = self.save_path
                     self.save_path = file_path
                     
                     # Salva nel nuovo percorso
-                    return self.save_file()
+                    if not self.save_file():
+                        return False
+                    # Il salvataggio aperto ora corrisponde al nuovo file
+                    if previous_path:
+                        self.workspace.rename(previous_path, file_path)
+                        self.save_path = self.workspace.active_path
+                        self.update_document_selector()
+                    return True
                 else:
                     return False
             else:
@@ -370,6 +477,45 @@ class MainWindow(QMainWindow):
             )
             return False
         
+    def undo(self):
+        """Annulla l'ultima modifica al salvataggio"""
+        self._replay_history(self.save_manager.undo, tr("main_window.undone", "Undone"),
+                             tr("main_window.nothing_to_undo", "Nothing to undo"))
+        
+    def redo(self):
+        """Ripete l'ultima modifica annullata"""
+        self._replay_history(self.save_manager.redo, tr("main_window.redone", "Redone"),
+                             tr("main_window.nothing_to_redo", "Nothing to redo"))
+        
+    def _replay_history(self, action, done_message, empty_message):
+        if not self.save_data:
+            return
+        # Le modifiche ancora nei tab entrano nella cronologia prima di annullare
+        self.flush_tabs()
+        try:
+            step = action()
+        except Exception as e:
+            logger.error(f"Errore durante annulla/ripeti: {str(e)}")
+            return
+        if step is None:
+            self.status_bar.showMessage(empty_message)
+            return
+            
+        # Il documento è cambiato sul posto: ricarica i tab mantenendo il giocatore selezionato
+        player_id = self.player_tab.current_player_id
+        self.player_tab.refresh_ui_from_data()
+        index = self.player_tab.player_selector.findData(player_id)
+        if index >= 0:
+            self.player_tab.player_selector.setCurrentIndex(index)
+        self.inventory_tab.refresh_ui_from_data()
+        self.advanced_tab.refresh_ui_from_data()
+        
+        history = self.save_manager.get_history_stats()
+        self.status_bar.showMessage(
+            f"{done_message}: {len(step.changes)} - "
+            f"{tr('main_window.history_size', 'History')}: {history.get('bytes', 0) / 1024:.0f} KB"
+        )
+        
     def closeEvent(self, event):
         """Gestisce la chiusura dell'applicazione"""
         reply = QMessageBox.question(
@@ -411,6 +557,7 @@ class MainWindow(QMainWindow):
 
 def main():
     """Funzione principale per l'avvio dell'applicazione dalla nuova UI"""
+    setup_error_logging()
     app = QApplication(sys.argv)
     apply_style(app)
     window = MainWindow()
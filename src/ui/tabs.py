@@ -7,7 +7,7 @@ from PyQt6.QtWidgets import (
     QTableWidget, QTableWidgetItem, QHeaderView, QFormLayout,
     QGridLayout, QCheckBox, QFileDialog, QTextEdit, QSplitter
 )
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon, QPixmap, QImage, QPainter, QPen, QColor, QSyntaxHighlighter, QTextCharFormat, QFont
 from typing import Dict, Any
 import os
@@ -20,6 +20,11 @@ from pathlib import Path
 import logging
 
 from core.language_manager import tr, language_manager
+from core.player_table import PlayerTable
+from core.save_path import CURRENCY, LEVEL, invalidate_paths
+from core.tracked_document import mark_dirty, track, unchanged
+from core.edit_journal import ABSENT, group, record, snapshot
+from core.schema import validate
 
 class BaseTab(QWidget):
     """Tab base con funzionalità comuni"""
@@ -49,6 +54,7 @@ class PlayerTab(QWidget):
         super().__init__(parent)
         self.save_data = save_data
         self.player_data = {}
+        self.player_table = None
         self.players = {}
         self.current_player_id = None
         self.status_bar = None
@@ -257,10 +263,14 @@ class PlayerTab(QWidget):
         
         if ok and player_name:
             # Aggiungi il giocatore al salvataggio
-            if "playerNames" not in self.save_data:
-                self.save_data["playerNames"] = {}
-                
-            self.save_data["playerNames"][new_player_id] = player_name
+            with group(self.save_data):
+                if "playerNames" not in self.save_data:
+                    self.save_data["playerNames"] = {}
+                    record(self.save_data, ("playerNames",), ABSENT, self.save_data["playerNames"])
+                    
+                self.save_data["playerNames"][new_player_id] = player_name
+                record(self.save_data, ("playerNames", new_player_id), ABSENT, player_name)
+            mark_dirty(self.save_data, "playerNames")
             
             # Aggiungi il giocatore al selettore
             self.player_selector.addItem(player_name, new_player_id)
@@ -315,23 +325,8 @@ class PlayerTab(QWidget):
             
             # Estrai dati del giocatore dalla struttura dictionaryOfDictionaries
             if "dictionaryOfDictionaries" in self.save_data:
-                dict_data = self.save_data["dictionaryOfDictionaries"]
-                if isinstance(dict_data, dict) and "value" in dict_data:
-                    dict_data = dict_data["value"]
-                
-                # Strutture dati per ogni statistiche del giocatore
-                player_data_structures = [
-                    "playerHealth", "playerUpgradeHealth", "playerUpgradeStamina", 
-                    "playerUpgradeExtraJump", "playerUpgradeLaunch", "playerUpgradeMapPlayerCount",
-                    "playerUpgradeSpeed", "playerUpgradeStrength", "playerUpgradeRange", 
-                    "playerUpgradeThrow"
-                ]
-                
-                # Estrai i dati del giocatore da ogni struttura
-                player_stats = {}
-                for stat_key in player_data_structures:
-                    if stat_key in dict_data and player_id in dict_data[stat_key]:
-                        player_stats[stat_key] = dict_data[stat_key][player_id]
+                # Tutte le statistiche del giocatore in una sola lettura della riga
+                player_stats = self.get_player_table().stats(player_id)
                 
                 # Debug: mostra le statistiche trovate
                 print(f"Statistics found for player {player_id}: {list(player_stats.keys())}")
@@ -375,12 +370,12 @@ class PlayerTab(QWidget):
                     self.player_throw.setValue(self.extract_value(player_stats.get("playerUpgradeThrow"), 10))
                 
                 # Aggiorna il livello da runStats
-                if "runStats" in dict_data and "level" in dict_data["runStats"]:
-                    self.player_level.setValue(self.extract_value(dict_data["runStats"]["level"], 1))
+                if LEVEL.exists(self.save_data):
+                    self.player_level.setValue(self.extract_value(LEVEL.get(self.save_data), 1))
                     print(f"Player level set to: {self.player_level.value()}")
                 
-                if "runStats" in dict_data and "currency" in dict_data["runStats"]:
-                    self.player_money.setValue(self.extract_value(dict_data["runStats"]["currency"], 0))
+                if CURRENCY.exists(self.save_data):
+                    self.player_money.setValue(self.extract_value(CURRENCY.get(self.save_data), 0))
                     print(f"Money player set to: {self.player_money.value()}")
                 
                 # Memorizza i dati del giocatore per uso futuro
@@ -534,7 +529,16 @@ class PlayerTab(QWidget):
             self.avatar_label.setPixmap(QPixmap())
             self.avatar_label.setText("No Image")
         
+    def get_player_table(self):
+        """Restituisce la vista a colonne dei giocatori, ricostruita se il salvataggio è cambiato"""
+        if self.player_table is None or self.player_table.document is not self.save_data:
+            self.player_table = PlayerTable(self.save_data)
+        return self.player_table
+
     def _update_json_editor(self):
+        # Riporta nel JSON le modifiche ai giocatori prima di mostrarlo o salvarlo
+        if self.player_table is not None:
+            self.player_table.flush()
         mw = self.parent()
         if mw and hasattr(mw, 'advanced_tab'):
             mw.advanced_tab.update_json_from_ui()
@@ -542,115 +546,118 @@ class PlayerTab(QWidget):
     # --- Metodi di aggiornamento dati in tempo reale ---
     def on_player_name_changed(self, value):
         if self.save_data and self.current_player_id:
-            self.save_data["playerNames"][self.current_player_id] = value
+            names = self.save_data["playerNames"]
+            previous = names.get(self.current_player_id, ABSENT)
+            if unchanged(previous, value):
+                # Anche setText quando si seleziona un giocatore: non è una modifica
+                return
+            record(self.save_data, ("playerNames", self.current_player_id), previous, value)
+            names[self.current_player_id] = value
+            mark_dirty(self.save_data, "playerNames")
             from core.logger import logger
             logger.info(f"Nome giocatore aggiornato: {self.current_player_id} -> {value}")
             self._update_json_editor()
 
     def on_player_level_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "runStats" in d:
-                d["runStats"]["level"] = value
+            if LEVEL.set(self.save_data, value):
                 from core.logger import logger
                 logger.info(f"Livello aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_health_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerHealth" in d:
-                d["playerHealth"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerHealth"):
+                table.set(self.current_player_id, "playerHealth", value)
                 from core.logger import logger
                 logger.info(f"Salute aggiornata: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_money_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "runStats" in d:
-                d["runStats"]["currency"] = value
+            if CURRENCY.set(self.save_data, value):
                 from core.logger import logger
                 logger.info(f"Soldi aggiornati: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_strength_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeStrength" in d:
-                d["playerUpgradeStrength"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeStrength"):
+                table.set(self.current_player_id, "playerUpgradeStrength", value)
                 from core.logger import logger
                 logger.info(f"Forza aggiornata: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_agility_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeStamina" in d:
-                d["playerUpgradeStamina"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeStamina"):
+                table.set(self.current_player_id, "playerUpgradeStamina", value)
                 from core.logger import logger
                 logger.info(f"Agilità aggiornata: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_endurance_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeSpeed" in d:
-                d["playerUpgradeSpeed"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeSpeed"):
+                table.set(self.current_player_id, "playerUpgradeSpeed", value)
                 from core.logger import logger
                 logger.info(f"Resistenza aggiornata: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_extra_jump_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeExtraJump" in d:
-                d["playerUpgradeExtraJump"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeExtraJump"):
+                table.set(self.current_player_id, "playerUpgradeExtraJump", value)
                 from core.logger import logger
                 logger.info(f"Extra Jump aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_launch_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeLaunch" in d:
-                d["playerUpgradeLaunch"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeLaunch"):
+                table.set(self.current_player_id, "playerUpgradeLaunch", value)
                 from core.logger import logger
                 logger.info(f"Launch aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_map_count_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeMapPlayerCount" in d:
-                d["playerUpgradeMapPlayerCount"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeMapPlayerCount"):
+                table.set(self.current_player_id, "playerUpgradeMapPlayerCount", value)
                 from core.logger import logger
                 logger.info(f"Map Count aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_speed_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeSpeed" in d:
-                d["playerUpgradeSpeed"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeSpeed"):
+                table.set(self.current_player_id, "playerUpgradeSpeed", value)
                 from core.logger import logger
                 logger.info(f"Speed aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_range_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeRange" in d:
-                d["playerUpgradeRange"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeRange"):
+                table.set(self.current_player_id, "playerUpgradeRange", value)
                 from core.logger import logger
                 logger.info(f"Range aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
 
     def on_player_throw_changed(self, value):
         if self.save_data and self.current_player_id:
-            d = self.save_data.get("dictionaryOfDictionaries", {}).get("value", {})
-            if "playerUpgradeThrow" in d:
-                d["playerUpgradeThrow"][self.current_player_id] = value
+            table = self.get_player_table()
+            if table.has_column("playerUpgradeThrow"):
+                table.set(self.current_player_id, "playerUpgradeThrow", value)
                 from core.logger import logger
                 logger.info(f"Throw aggiornato: {self.current_player_id} -> {value}")
                 self._update_json_editor()
@@ -668,6 +675,8 @@ class PlayerTab(QWidget):
             # Pulisci il selector e i dati dei giocatori
             self.player_selector.clear()
             self.players = {}
+            # Il JSON può essere stato modificato sul posto: ricostruisci la tabella
+            self.player_table = PlayerTable(self.save_data)
             
             # Verifica la struttura dei dati
             if "playerNames" not in self.save_data:
@@ -1045,6 +1054,7 @@ class InventoryTab(QWidget):
                     
                 inventory_key = "playerInventory"
                 self.save_data["dictionaryOfDictionaries"]["value"][inventory_key] = {}
+            mark_dirty(self.save_data, "dictionaryOfDictionaries", "value", inventory_key)
                 
             self.inventory_data[item_id] = {
                 "name": item_id,
@@ -1081,7 +1091,7 @@ class InventoryTab(QWidget):
             self.inventory_data[item_id]["name"] = self.item_name_edit.text()
             self.inventory_data[item_id]["quantity"] = self.item_quantity_spin.value()
             self.inventory_data[item_id]["description"] = self.item_description_edit.text()
-            self._update_json_editor()
+            self.update_json_from_ui()
         
         QMessageBox.information(
             self,
@@ -1160,46 +1170,57 @@ class InventoryTab(QWidget):
             # Verifica che i dati abbiano la struttura attesa
             if "dictionaryOfDictionaries" not in self.save_data:
                 self.save_data["dictionaryOfDictionaries"] = {"value": {}}
+                mark_dirty(self.save_data, "dictionaryOfDictionaries")
             elif "value" not in self.save_data["dictionaryOfDictionaries"]:
                 self.save_data["dictionaryOfDictionaries"]["value"] = {}
+                mark_dirty(self.save_data, "dictionaryOfDictionaries")
                 
             dict_of_dicts = self.save_data["dictionaryOfDictionaries"]["value"]
             
             # Aggiorna i dati degli oggetti nel JSON
-            for item_id, item_data in self.inventory_data.items():
-                key = item_data["key"]
+            # Tutti gli oggetti modificati si annullano in un solo passo
+            with group(self.save_data):
+                for item_id, item_data in self.inventory_data.items():
+                    key = item_data["key"]
+                    mark_dirty(self.save_data, "dictionaryOfDictionaries", "value", key, item_id)
                 
-                # Assicurati che la chiave dell'inventario esista
-                if key not in dict_of_dicts:
-                    dict_of_dicts[key] = {}
+                    # Assicurati che la chiave dell'inventario esista
+                    if key not in dict_of_dicts:
+                        dict_of_dicts[key] = {}
+                        record(self.save_data, ("dictionaryOfDictionaries", "value", key), ABSENT, dict_of_dicts[key])
+                
+                    # Gli oggetti vengono modificati sul posto: la cronologia ne tiene una copia
+                    before = snapshot(dict_of_dicts[key].get(item_id, ABSENT))
                     
-                # Imposta o aggiorna l'oggetto con le modifiche
-                if isinstance(dict_of_dicts[key].get(item_id), dict):
-                    # Se l'oggetto esisteva già come dizionario, aggiorna i campi
-                    if "name" in dict_of_dicts[key][item_id]:
-                        dict_of_dicts[key][item_id]["name"] = item_data["name"]
-                    elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
-                        if "name" in dict_of_dicts[key][item_id]["value"]:
-                            dict_of_dicts[key][item_id]["value"]["name"] = item_data["name"]
+                    # Imposta o aggiorna l'oggetto con le modifiche
+                    if isinstance(dict_of_dicts[key].get(item_id), dict):
+                        # Se l'oggetto esisteva già come dizionario, aggiorna i campi
+                        if "name" in dict_of_dicts[key][item_id]:
+                            dict_of_dicts[key][item_id]["name"] = item_data["name"]
+                        elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
+                            if "name" in dict_of_dicts[key][item_id]["value"]:
+                                dict_of_dicts[key][item_id]["value"]["name"] = item_data["name"]
                             
-                    if "quantity" in dict_of_dicts[key][item_id]:
-                        dict_of_dicts[key][item_id]["quantity"] = item_data["quantity"]
-                    elif "count" in dict_of_dicts[key][item_id]:
-                        dict_of_dicts[key][item_id]["count"] = item_data["quantity"]
-                    elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
-                        if "quantity" in dict_of_dicts[key][item_id]["value"]:
-                            dict_of_dicts[key][item_id]["value"]["quantity"] = item_data["quantity"]
-                        elif "count" in dict_of_dicts[key][item_id]["value"]:
-                            dict_of_dicts[key][item_id]["value"]["count"] = item_data["quantity"]
+                        if "quantity" in dict_of_dicts[key][item_id]:
+                            dict_of_dicts[key][item_id]["quantity"] = item_data["quantity"]
+                        elif "count" in dict_of_dicts[key][item_id]:
+                            dict_of_dicts[key][item_id]["count"] = item_data["quantity"]
+                        elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
+                            if "quantity" in dict_of_dicts[key][item_id]["value"]:
+                                dict_of_dicts[key][item_id]["value"]["quantity"] = item_data["quantity"]
+                            elif "count" in dict_of_dicts[key][item_id]["value"]:
+                                dict_of_dicts[key][item_id]["value"]["count"] = item_data["quantity"]
                             
-                    if "description" in dict_of_dicts[key][item_id]:
-                        dict_of_dicts[key][item_id]["description"] = item_data["description"]
-                    elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
-                        if "description" in dict_of_dicts[key][item_id]["value"]:
-                            dict_of_dicts[key][item_id]["value"]["description"] = item_data["description"]
-                else:
-                    # Se l'oggetto non esisteva, crealo come nuova voce diretta
-                    dict_of_dicts[key][item_id] = item_data["quantity"]
+                        if "description" in dict_of_dicts[key][item_id]:
+                            dict_of_dicts[key][item_id]["description"] = item_data["description"]
+                        elif "value" in dict_of_dicts[key][item_id] and isinstance(dict_of_dicts[key][item_id]["value"], dict):
+                            if "description" in dict_of_dicts[key][item_id]["value"]:
+                                dict_of_dicts[key][item_id]["value"]["description"] = item_data["description"]
+                    else:
+                        # Se l'oggetto non esisteva, crealo come nuova voce diretta
+                        dict_of_dicts[key][item_id] = item_data["quantity"]
+                    record(self.save_data, ("dictionaryOfDictionaries", "value", key, item_id),
+                           before, snapshot(dict_of_dicts[key][item_id]))
                     
             # Se c'è un parent con l'advanced tab, aggiorna l'editor JSON
             self._update_json_editor()
@@ -1616,6 +1637,10 @@ class JsonSyntaxHighlighter(QSyntaxHighlighter):
             for match in pattern.finditer(text):
                 self.setFormat(match.start(), match.end() - match.start(), format)
 
+# Pausa nella digitazione dopo la quale il JSON modificato viene applicato
+JSON_EDIT_DELAY_MS = 500
+
+
 class AdvancedTab(QWidget):
     """Tab for advanced editing of save data"""
     
@@ -1625,17 +1650,58 @@ class AdvancedTab(QWidget):
         self.status_bar = None
         self.init_ui()
         language_manager.add_observer(self.update_translations)
-        # Sincronizzazione bidirezionale
+        # Sincronizzazione bidirezionale, applicata quando si smette di scrivere
+        self._json_edit_timer = QTimer(self)
+        self._json_edit_timer.setSingleShot(True)
+        self._json_edit_timer.setInterval(JSON_EDIT_DELAY_MS)
+        self._json_edit_timer.timeout.connect(self.commit_json_edit)
         self.json_editor.textChanged.connect(self.on_json_edit)
         self._block_json_update = False
 
     def on_json_edit(self):
         if self._block_json_update:
             return
+        # Un passo di cronologia per pausa, non per tasto
+        self._json_edit_timer.start()
+
+    def flush_json_edit(self):
+        """Applica subito al documento il testo modificato ma non ancora applicato"""
+        if self._json_edit_timer.isActive():
+            self._json_edit_timer.stop()
+            self.commit_json_edit()
+
+    def commit_json_edit(self):
         try:
             new_data = json.loads(self.json_editor.toPlainText())
-            self.save_data.clear()
-            self.save_data.update(new_data)
+            if not isinstance(new_data, dict):
+                return
+            document = self.save_data
+            # Solo le chiavi di primo livello cambiate: le altre restano gli stessi
+            # oggetti, con i loro percorsi e frammenti in cache
+            changed = []
+            for key in list(document) + [key for key in new_data if key not in document]:
+                old, new = document.get(key, ABSENT), new_data.get(key, ABSENT)
+                if type(old) is not type(new) or old != new:
+                    changed.append(key)
+            if not changed and list(document) == list(new_data):
+                return
+            with group(document):
+                for key in changed:
+                    # Il vecchio valore resta alla cronologia così com'è, senza copiarlo;
+                    # il passo pesa solo le chiavi sostituite
+                    record(document, (key,), document.get(key, ABSENT), new_data.get(key, ABSENT))
+                    if key in new_data:
+                        document[key] = new_data[key]
+                    else:
+                        del document[key]
+                    mark_dirty(document, key)
+            if list(document) != list(new_data):
+                # Stesso ordine delle chiavi del testo
+                items = [(key, document[key]) for key in new_data]
+                document.clear()
+                document.update(items)
+                mark_dirty(document)
+            invalidate_paths()
             # Aggiorna tutti i tab (player, inventory, ecc.)
             mw = self.parent()
             if mw and hasattr(mw, 'player_tab'):
@@ -1644,13 +1710,28 @@ class AdvancedTab(QWidget):
                 mw.inventory_tab.update_data(self.save_data)
             # Aggiorna la struttura
             self.update_structure_viewer(self.save_data)
+            # Il validatore visita solo le parti note del salvataggio: abbastanza veloce per ogni pausa
+            self.show_schema_status(validate(self.save_data))
         except Exception:
             pass
 
+    def show_schema_status(self, violations):
+        """Mostra nella barra di stato l'esito della validazione dello schema"""
+        if not self.status_bar:
+            return
+        if violations:
+            self.status_bar.showMessage(
+                tr("advanced_tab.schema_violations", "{0} schema problem(s): {1}").format(len(violations), violations[0]))
+        else:
+            self.status_bar.showMessage(tr("advanced_tab.schema_valid", "Save structure is valid."))
+
     def update_json_from_ui(self):
+        # Il testo sta per essere sostituito: prima si applica quello in sospeso
+        self.flush_json_edit()
         self._block_json_update = True
         try:
-            self.json_editor.setText(json.dumps(self.save_data, indent=4))
+            # Riserializza solo le parti modificate; i frammenti restano pronti per il salvataggio
+            self.json_editor.setText(track(self.save_data).dumps())
         finally:
             self._block_json_update = False
 
@@ -1741,9 +1822,13 @@ class AdvancedTab(QWidget):
         try:
             self.save_data = data
             
-            # Format and display the JSON
-            json_str = json.dumps(data, indent=4)
-            self.json_editor.setText(json_str)
+            # Format and display the JSON (the text is not edited: do not write it back)
+            json_str = track(data).dumps()
+            self._block_json_update = True
+            try:
+                self.json_editor.setText(json_str)
+            finally:
+                self._block_json_update = False
             
             # Update the structure viewer
             self.update_structure_viewer(data)
@@ -1851,16 +1936,27 @@ class AdvancedTab(QWidget):
             json_text = self.json_editor.toPlainText()
             
             # Parse to validate
-            json.loads(json_text)
+            data = json.loads(json_text)
             
-            # Update the status bar
-            if self.status_bar:
-                self.status_bar.showMessage(tr("advanced_tab.json_valid", "JSON is syntactically valid."))
+            # Check the structure against the save schema, reporting every problem
+            violations = validate(data)
+            self.show_schema_status(violations)
+            
+            if violations:
+                shown = "\n".join(str(violation) for violation in violations[:20])
+                if len(violations) > 20:
+                    shown += f"\n... (+{len(violations) - 20})"
+                QMessageBox.warning(
+                    self,
+                    tr("general.warning", "Attenzione"),
+                    tr("advanced_tab.schema_invalid", "JSON is valid but does not match the save structure:\n{0}").format(shown)
+                )
+                return
                 
             QMessageBox.information(
                 self,
                 tr("general.success", "Successo"),
-                tr("advanced_tab.json_valid", "JSON is syntactically valid.")
+                tr("advanced_tab.json_schema_valid", "JSON is valid and matches the save structure.")
             )
             
         except Exception as e:
@@ -1923,9 +2019,13 @@ class AdvancedTab(QWidget):
             return
             
         try:
-            # Formatta e visualizza il JSON
-            json_str = json.dumps(self.save_data, indent=4)
-            self.json_editor.setText(json_str)
+            # Formatta e visualizza il JSON (testo non modificato: non va riscritto nei dati)
+            json_str = track(self.save_data).dumps()
+            self._block_json_update = True
+            try:
+                self.json_editor.setText(json_str)
+            finally:
+                self._block_json_update = False
             
             # Aggiorna la visualizzazione della struttura
             self.update_structure_viewer(self.save_data)
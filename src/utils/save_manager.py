@@ -4,19 +4,18 @@ Gestisce l'apertura, la decodifica, la modifica e il salvataggio dei file di gio
 """
 
 import json
-import re
-import requests
-import webbrowser
-import os
 import logging
-from datetime import datetime
-from xml.etree import ElementTree
-from PIL import Image
 from pathlib import Path
-from PyQt6.QtWidgets import QFileDialog, QMessageBox
-from PyQt6.QtGui import QPixmap
-from core.decrypt import decrypt_es3
-from core.encrypt import encrypt_es3
+from core.es3_codec import default_codec
+from core.save_cache import save_cache
+from core.player_table import HEALTH_KEY, UPGRADE_KEYS, PlayerTable
+from core.save_path import (CHARGING_STATION, CURRENCY, LEVEL, LIVES, PLAYER_HEALTH, RUN_STATS,
+                            TEAM_NAME, TOTAL_HAUL)
+from core.save_origin import COPIED, UNCHANGED, SaveOrigin
+from core.edit_journal import ABSENT, journal, journal_of, record
+from core.batch_edit import BatchError, apply_batch
+from core.tracked_document import mark_dirty, track, unchanged
+from core.workspace import estimated_size, release
 
 # Configurazione del logging
 DEBUGLEVEL = None
@@ -28,19 +27,11 @@ if DEBUGLEVEL:
     logger = logging.getLogger(__name__)
     logger.setLevel(DEBUGLEVEL)
 
-# Creare la directory cache se non esiste
+# Directory cache, creata solo quando serve (immagini profilo)
 CACHE_DIR = Path.home() / ".cache" / "seregonwar"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
-if DEBUGLEVEL:
-    logger.info("Cache directory created.")
 
 version = "1.0.0"
-json_data = {}
 savefile_dir = Path.home() / "AppData" / "LocalLow" / "semiwork" / "Repo" / "saves"
-savefilename = None
-players = []
-player_entries = {}
 
 if DEBUGLEVEL:
     logger.info("Save file directory set. Path: " + str(savefile_dir))
@@ -50,18 +41,135 @@ class SaveManager:
     
     def __init__(self):
         """Inizializza il gestore dei salvataggi"""
-        self.json_data = json_data  # Usa la variabile globale
+        # Stato del singolo salvataggio: ogni istanza ha il proprio documento
+        self.json_data = {}
         self.savefile_dir = savefile_dir  # Usa la variabile globale
         self.savefilename = None
         self.version = version  # Usa la variabile globale
         self.current_file = None
-        self.save_data = {}  # Alias per json_data
+        self.save_data = self.json_data  # Alias per json_data
         self.save_dir = self.savefile_dir  # Alias per compatibilità
         self.cache_dir = CACHE_DIR
+        self.players = []
+        self.player_entries = {}
+        self._player_table = None
+        self._origin = None
+        self._size = None
         
         if DEBUGLEVEL:
             logger.info(f"SaveManager inizializzato. Directory predefinita: {self.savefile_dir}")
     
+    def get_player_table(self, data=None):
+        """Restituisce la vista a colonne dei giocatori del documento corrente
+        
+        La tabella viene costruita una sola volta per documento e ricostruita
+        solo quando il documento viene sostituito.
+        
+        Args:
+            data: Documento da usare al posto di json_data
+            
+        Returns:
+            PlayerTable: Statistiche dei giocatori, una colonna per statistica
+        """
+        data = self.json_data if data is None else data
+        if self._player_table is None or self._player_table.document is not data:
+            self._player_table = PlayerTable(data)
+        return self._player_table
+    
+    def flush_player_table(self):
+        """Scrive nel JSON le modifiche ai giocatori ancora in sospeso"""
+        if self._player_table is not None:
+            self._player_table.flush()
+    
+    def undo(self):
+        """Annulla l'ultima modifica al salvataggio
+        
+        Returns:
+            Step: Modifiche annullate, o None se non c'è nulla da annullare
+        """
+        return self._replay("undo")
+    
+    def redo(self):
+        """Ripete l'ultima modifica annullata
+        
+        Returns:
+            Step: Modifiche ripetute, o None se non c'è nulla da ripetere
+        """
+        return self._replay("redo")
+    
+    def _replay(self, action):
+        # Le modifiche ancora nella tabella entrano nella cronologia prima di annullare
+        self.flush_player_table()
+        history = journal_of(self.json_data) if self.json_data else None
+        if history is None:
+            return None
+        step = getattr(history, action)()
+        if step is not None:
+            # La tabella dei giocatori non vede le modifiche fatte sul documento
+            self._player_table = None
+        return step
+    
+    def get_history_stats(self):
+        """Dimensioni della cronologia annulla/ripeti
+        
+        Returns:
+            dict: Passi annullabili e ripetibili e memoria stimata in byte
+        """
+        history = journal_of(self.json_data) if self.json_data else None
+        return history.stats() if history is not None else {}
+    
+    def is_modified(self):
+        """Indica se il salvataggio ha modifiche non salvate
+        
+        Returns:
+            bool: True se il documento è cambiato dall'apertura o dall'ultimo salvataggio
+        """
+        if not self.json_data:
+            return False
+        if self._player_table is not None and self._player_table.dirty:
+            return True
+        origin = self._origin
+        return origin is None or origin.document is not self.json_data or origin.modified
+    
+    def memory_usage(self):
+        """Memoria stimata del documento e della sua cronologia
+        
+        Returns:
+            int: Byte stimati, 0 se non c'è un documento aperto
+        """
+        if not self.json_data:
+            return 0
+        # Stima calcolata una volta per documento
+        if self._size is None or self._size[0] != id(self.json_data):
+            self._size = (id(self.json_data), estimated_size(self.json_data))
+        history = journal_of(self.json_data)
+        return self._size[1] + (history.memory_usage() if history is not None else 0)
+    
+    def close(self, cache=False):
+        """Chiude il salvataggio e libera frammenti JSON, cronologia e indici
+        
+        Args:
+            cache: Se il documento non è modificato, lo scrive prima nella cache
+                dei salvataggi decodificati per riaprirlo senza decifrarlo
+        """
+        if self.json_data:
+            # Solo se il file contiene ancora esattamente questo documento
+            unchanged_file = cache and not self.is_modified() and self._origin.source_unchanged()
+            if unchanged_file:
+                # Chiave della cache: i byte da cui il documento è stato decodificato
+                release(self.json_data, self._origin.path, self._origin.fingerprint, self._origin.digest)
+            else:
+                release(self.json_data)
+        self.json_data = {}
+        self.save_data = self.json_data
+        self.players = []
+        self.player_entries = {}
+        self._player_table = None
+        self._origin = None
+        self._size = None
+        self.savefilename = None
+        self.current_file = None
+    
     def create_entry(self, label, parent, color, update_callback=None, tooltip=None):
         """Funzione di compatibilità per creare campi di input
         
@@ -96,36 +204,32 @@ class SaveManager:
         Returns:
             dict: Dati JSON aggiornati
         """
-        global json_data
-        
         if entries:
             try:
                 if 'level' in entries and entries['level'] is not None:
-                    json_data['dictionaryOfDictionaries']['value']['runStats']['level'] = int(entries['level'])
+                    LEVEL.set(self.json_data, int(entries['level']))
                 
                 if 'currency' in entries and entries['currency'] is not None:
-                    json_data['dictionaryOfDictionaries']['value']['runStats']['currency'] = int(entries['currency'])
+                    CURRENCY.set(self.json_data, int(entries['currency']))
                 
                 if 'lives' in entries and entries['lives'] is not None:
-                    json_data['dictionaryOfDictionaries']['value']['runStats']['lives'] = int(entries['lives'])
+                    LIVES.set(self.json_data, int(entries['lives']))
                 
                 if 'charging' in entries and entries['charging'] is not None:
-                    json_data['dictionaryOfDictionaries']['value']['runStats']['chargingStationCharge'] = int(entries['charging'])
+                    CHARGING_STATION.set(self.json_data, int(entries['charging']))
                 
                 if 'haul' in entries and entries['haul'] is not None:
-                    json_data['dictionaryOfDictionaries']['value']['runStats']['totalHaul'] = int(entries['haul'])
+                    TOTAL_HAUL.set(self.json_data, int(entries['haul']))
                 
                 if 'teamname' in entries and entries['teamname'] is not None:
-                    json_data['teamName']['value'] = entries['teamname']
+                    TEAM_NAME.set(self.json_data, entries['teamname'])
                 
                 if 'players' in entries and entries['players'] is not None:
+                    table = self.get_player_table(self.json_data)
                     for player in entries['players']:
-                        player_id = player['id']
-                        player_health = player['health']
-                        json_data['dictionaryOfDictionaries']['value']['playerHealth'][player_id] = player_health
+                        table.set(player['id'], HEALTH_KEY, player['health'])
                 
-                self.json_data = json_data
-                self.save_data = json_data
+                self.save_data = self.json_data
                 
                 if DEBUGLEVEL:
                     logger.info("JSON data updated.")
@@ -133,7 +237,8 @@ class SaveManager:
                 if DEBUGLEVEL:
                     logger.error(f"Error updating JSON data: {e}")
         
-        return json_data
+        self.flush_player_table()
+        return self.json_data
     
     def on_json_edit(self, json_text):
         """Aggiorna i campi dell'interfaccia quando il testo JSON viene modificato
@@ -144,31 +249,26 @@ class SaveManager:
         Returns:
             dict: Dizionario con i dati estratti dal JSON, o None se il JSON non è valido
         """
-        global json_data
-        
         try:
             updated_data = json.loads(json_text)
-            json_data = updated_data
             self.json_data = updated_data
             self.save_data = updated_data
+            journal(updated_data)
             
             if DEBUGLEVEL:
                 logger.info("JSON data updated from editor.")
                 
             # Estrai i dati da fornire all'UI
             extracted_data = {
-                'level': updated_data['dictionaryOfDictionaries']['value']['runStats']['level'],
-                'currency': updated_data['dictionaryOfDictionaries']['value']['runStats']['currency'],
-                'lives': updated_data['dictionaryOfDictionaries']['value']['runStats']['lives'],
-                'charging': updated_data['dictionaryOfDictionaries']['value']['runStats']['chargingStationCharge'],
-                'haul': updated_data['dictionaryOfDictionaries']['value']['runStats']['totalHaul'],
-                'teamname': updated_data['teamName']['value'],
-                'player_health': {}
+                'level': LEVEL.get(updated_data),
+                'currency': CURRENCY.get(updated_data),
+                'lives': LIVES.get(updated_data),
+                'charging': CHARGING_STATION.get(updated_data),
+                'haul': TOTAL_HAUL.get(updated_data),
+                'teamname': TEAM_NAME.get(updated_data),
+                'player_health': dict(PLAYER_HEALTH.get(updated_data, {}))
             }
             
-            for player_id in updated_data['dictionaryOfDictionaries']['value']['playerHealth']:
-                extracted_data['player_health'][player_id] = updated_data['dictionaryOfDictionaries']['value']['playerHealth'][player_id]
-            
             return extracted_data
         except json.JSONDecodeError:
             if DEBUGLEVEL:
@@ -184,15 +284,18 @@ class SaveManager:
         Returns:
             tuple: (bool, str) dove bool indica se il file è stato aperto con successo e str è un messaggio
         """
-        global json_data, savefilename
-            
         try:
-            decrypted_data = decrypt_es3(file_path, "Why would you want to cheat?... :o It's no fun. :') :'D")
-            json_data = json.loads(decrypted_data)
-            savefilename = Path(file_path).name
-            self.json_data = json_data
-            self.save_data = json_data
-            self.savefilename = savefilename
+            # Riusa il documento in cache se il file non è cambiato, altrimenti
+            # decifra, decomprime e interpreta il JSON in un unico passaggio
+            document, fingerprint, digest = save_cache.open(file_path, default_codec.load)
+            self.json_data = document
+            # Ricorda il file di origine, com'era prima di decodificarlo: se nulla
+            # cambia, salvare non riscrive niente
+            self._origin = SaveOrigin(file_path, document, fingerprint, digest)
+            # Da qui in poi le modifiche si possono annullare
+            journal(self.json_data)
+            self.save_data = self.json_data
+            self.savefilename = Path(file_path).name
             self.current_file = Path(file_path)
             
             if DEBUGLEVEL:
@@ -214,34 +317,38 @@ class SaveManager:
         Returns:
             tuple: (bool, str) dove bool indica se il file è stato salvato con successo e str è un messaggio
         """
-        global json_data, savefilename
-        
-        if not json_data:
+        if not self.json_data:
             if DEBUGLEVEL:
                 logger.error("Nessun dato da salvare.")
                 
             return False, "Nessun dato da salvare."
         
         try:
-            # Converti il JSON in stringa formattata
-            json_str = json.dumps(json_data, indent=4)
+            # Riporta nel JSON le modifiche ai giocatori prima di serializzare
+            self.flush_player_table()
+            
+            # Documento non modificato dall'apertura: nessuna riscrittura o copia byte per byte
+            reused = None
+            if self._origin is not None and self._origin.document is self.json_data:
+                reused = self._origin.reuse(file_path)
+            if reused == UNCHANGED:
+                return True, f"Nessuna modifica da salvare: {file_path}"
+            
+            if reused != COPIED:
+                # Serializza solo le parti modificate dall'ultimo salvataggio e cripta i frammenti man mano
+                default_codec.write_chunks(track(self.json_data).iter_chunks(), file_path)
+            # La voce in cache descrive il file di prima; il documento la riscrive
+            # close(cache=True), senza rileggere il file a ogni salvataggio
+            save_cache.invalidate(file_path)
+            self._origin = SaveOrigin(file_path, self.json_data)
             
-            # Cripta i dati
-            success = encrypt_es3(json_str, file_path, "Why would you want to cheat?... :o It's no fun. :') :'D")
+            self.current_file = Path(file_path)
+            self.savefilename = Path(file_path).name
             
-            if success:
-                self.current_file = Path(file_path)
-                self.savefilename = Path(file_path).name
-                
-                if DEBUGLEVEL:
-                    logger.info(f"File salvato con successo: {file_path}")
-                
-                return True, f"File salvato: {file_path}"
-            else:
-                if DEBUGLEVEL:
-                    logger.error(f"Errore nel salvataggio del file: {file_path}")
-                
-                return False, f"Errore nel salvataggio del file"
+            if DEBUGLEVEL:
+                logger.info(f"File salvato con successo: {file_path}")
+            
+            return True, f"File salvato: {file_path}"
         except Exception as e:
             if DEBUGLEVEL:
                 logger.error(f"Errore nel salvataggio del file: {e}")
@@ -266,6 +373,10 @@ class SaveManager:
             return str(cached_image_path)
 
         try:
+            # Dipendenze opzionali, caricate solo per le funzioni online
+            import requests
+            from xml.etree import ElementTree
+            
             url = f"https://steamcommunity.com/profiles/{player_id}/?xml=1"
             response = requests.get(url)
             
@@ -277,6 +388,7 @@ class SaveManager:
                     img_url = avatar_icon.text
                     img_data = requests.get(img_url).content
                     
+                    self.cache_dir.mkdir(parents=True, exist_ok=True)
                     with open(cached_image_path, 'wb') as file:
                         file.write(img_data)
                         
@@ -307,55 +419,36 @@ class SaveManager:
         Returns:
             dict: Dati estratti pronti per l'UI
         """
-        global json_data, players, player_entries
-        players.clear()
-        player_entries.clear()
+        self.players.clear()
+        self.player_entries.clear()
         
         extracted_data = {
             'world_data': {
-                'level': data['dictionaryOfDictionaries']['value']['runStats']['level'],
-                'currency': data['dictionaryOfDictionaries']['value']['runStats']['currency'],
-                'lives': data['dictionaryOfDictionaries']['value']['runStats']['lives'],
-                'charging': data['dictionaryOfDictionaries']['value']['runStats']['chargingStationCharge'],
-                'haul': data['dictionaryOfDictionaries']['value']['runStats']['totalHaul'],
-                'teamname': data['teamName']['value']
+                'level': LEVEL.get(data),
+                'currency': CURRENCY.get(data),
+                'lives': LIVES.get(data),
+                'charging': CHARGING_STATION.get(data),
+                'haul': TOTAL_HAUL.get(data),
+                'teamname': TEAM_NAME.get(data)
             },
             'players': []
         }
         
-        # Estrai dati dei giocatori
-        for player_id, player_name in data["playerNames"]["value"].items():
-            player_health = data["dictionaryOfDictionaries"]["value"]["playerHealth"][player_id]
-            
-            # Raccogli gli upgrade del giocatore
-            player_upgrades = {
-                'health': data['dictionaryOfDictionaries']['value']['playerUpgradeHealth'][player_id],
-                'stamina': data['dictionaryOfDictionaries']['value']['playerUpgradeStamina'][player_id],
-                'extra_jump': data['dictionaryOfDictionaries']['value']['playerUpgradeExtraJump'][player_id],
-                'launch': data['dictionaryOfDictionaries']['value']['playerUpgradeLaunch'][player_id],
-                'map_player_count': data['dictionaryOfDictionaries']['value']['playerUpgradeMapPlayerCount'][player_id],
-                'speed': data['dictionaryOfDictionaries']['value']['playerUpgradeSpeed'][player_id],
-                'strength': data['dictionaryOfDictionaries']['value']['playerUpgradeStrength'][player_id],
-                'range': data['dictionaryOfDictionaries']['value']['playerUpgradeRange'][player_id],
-                'throw': data['dictionaryOfDictionaries']['value']['playerUpgradeThrow'][player_id]
-            }
-            
-            player_data = {
-                'id': player_id,
-                'name': player_name,
-                'health': player_health,
-                'upgrades': player_upgrades,
-                'avatar': self.fetch_steam_profile_picture(player_id)
-            }
+        # Estrai dati dei giocatori, una riga della tabella per giocatore
+        table = self.get_player_table(data)
+        for player_id in table.ids:
+            player_data = table.player(player_id)
+            player_name = player_data['name']
+            player_health = player_data['health']
+            player_data['avatar'] = self.fetch_steam_profile_picture(player_id)
             
             # Aggiungi il giocatore alla lista principale
-            players.append({"id": player_id, "name": player_name, "health": player_health})
+            self.players.append({"id": player_id, "name": player_name, "health": player_health})
             
             # Aggiungi il giocatore ai dati estratti
             extracted_data['players'].append(player_data)
         
         # Salva i dati JSON
-        json_data = data
         self.json_data = data
         self.save_data = data
         
@@ -370,6 +463,8 @@ class SaveManager:
         Returns:
             str: Versione più recente o "Unknown" in caso di errore
         """
+        import requests
+        
         try:
             response = requests.get(f"https://api.github.com/repos/seregonwar/R.E.P.O-Save-Editor/releases/latest", timeout=5)
             data = response.json()
@@ -387,46 +482,36 @@ class SaveManager:
         Returns:
             list: Lista di dizionari contenenti informazioni sui giocatori
         """
-        global players
-        
         if not self.json_data or "playerNames" not in self.json_data:
             return []
             
         try:
-            players = []
+            self.players = []
             
-            for player_id, player_name in self.json_data["playerNames"]["value"].items():
-                if "dictionaryOfDictionaries" in self.json_data and "value" in self.json_data["dictionaryOfDictionaries"]:
-                    player_data = self.json_data["dictionaryOfDictionaries"]["value"]
-                    
-                    # Valori predefiniti
-                    health = 100
-                    if "playerHealth" in player_data and player_id in player_data["playerHealth"]:
-                        health = player_data["playerHealth"][player_id]
+            if "dictionaryOfDictionaries" in self.json_data and "value" in self.json_data["dictionaryOfDictionaries"]:
+                table = self.get_player_table()
+                for row, player_id in enumerate(table.ids):
+                    stats = table.stats(player_id)
                     
                     # Raccogli tutti gli upgrade disponibili per il giocatore
                     upgrades = {}
-                    for upgrade_type in ["playerUpgradeHealth", "playerUpgradeStamina", 
-                                        "playerUpgradeExtraJump", "playerUpgradeLaunch",
-                                        "playerUpgradeMapPlayerCount", "playerUpgradeSpeed",
-                                        "playerUpgradeStrength", "playerUpgradeRange",
-                                        "playerUpgradeThrow"]:
-                        if upgrade_type in player_data and player_id in player_data[upgrade_type]:
-                            upgrades[upgrade_type.replace("playerUpgrade", "").lower()] = player_data[upgrade_type][player_id]
+                    for upgrade_type in UPGRADE_KEYS.values():
+                        if upgrade_type in stats:
+                            upgrades[upgrade_type.replace("playerUpgrade", "").lower()] = stats[upgrade_type]
                     
                     player_info = {
                         "id": player_id,
-                        "name": player_name,
-                        "health": health,
+                        "name": table.names[row],
+                        "health": stats.get(HEALTH_KEY, 100),
                         "upgrades": upgrades
                     }
                     
-                    players.append(player_info)
+                    self.players.append(player_info)
             
             if DEBUGLEVEL:
-                logger.info(f"Ottenuti {len(players)} giocatori dal file di salvataggio.")
+                logger.info(f"Ottenuti {len(self.players)} giocatori dal file di salvataggio.")
                 
-            return players
+            return self.players
             
         except Exception as e:
             if DEBUGLEVEL:
@@ -452,19 +537,16 @@ class SaveManager:
         Returns:
             bool: True se l'aggiornamento è riuscito, False altrimenti
         """
-        global json_data
-        
         try:
-            if not json_data or "dictionaryOfDictionaries" not in json_data:
+            if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
                 return False
                 
-            data = json_data["dictionaryOfDictionaries"]["value"]
+            # La tabella evita di ripercorrere i dizionari delle statistiche a ogni modifica
+            table = self.get_player_table(self.json_data)
             
             # Gestisci i diversi campi
             if field == "health":
-                if "playerHealth" not in data:
-                    data["playerHealth"] = {}
-                data["playerHealth"][player_id] = value
+                table.set(player_id, HEALTH_KEY, value)
             elif field.startswith("upgrade_"):
                 upgrade_type = field.split("_")[1]
                 # Gestisci la capitalizzazione delle prime lettere delle parole in camelCase
@@ -484,13 +566,10 @@ class SaveManager:
                     # Capitalizza solo la prima lettera per gli altri campi
                     upgrade_key = f"playerUpgrade{upgrade_type.capitalize()}"
 
-                if upgrade_key not in data:
-                    data[upgrade_key] = {}
-                data[upgrade_key][player_id] = value
+                table.set(player_id, upgrade_key, value)
             
-            # Aggiorna il riferimento a json_data
-            self.json_data = json_data
-            self.save_data = json_data
+            # Scrive subito nel JSON: la modifica entra nella cronologia nell'ordine in cui è avvenuta
+            table.flush()
             
             if DEBUGLEVEL:
                 logger.info(f"Aggiornato {field} per il giocatore {player_id} a {value}")
@@ -512,22 +591,22 @@ class SaveManager:
         Returns:
             bool: True se l'aggiornamento è riuscito, False altrimenti
         """
-        global json_data
-        
         try:
-            if not json_data or "dictionaryOfDictionaries" not in json_data:
+            if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
                 return False
                 
-            data = json_data["dictionaryOfDictionaries"]["value"]
-            
-            if "runStats" not in data:
-                data["runStats"] = {}
+            stats = RUN_STATS.get(self.json_data)
+            if not isinstance(stats, dict):
+                stats = {}
+                if not RUN_STATS.set(self.json_data, stats):
+                    return False
                 
-            data["runStats"][stat_name] = value
-            
-            # Aggiorna il riferimento a json_data
-            self.json_data = json_data
-            self.save_data = json_data
+            previous = stats.get(stat_name, ABSENT)
+            if unchanged(previous, value):
+                return True
+            record(self.json_data, RUN_STATS.keys + (stat_name,), previous, value)
+            stats[stat_name] = value
+            mark_dirty(self.json_data, *RUN_STATS.keys, stat_name)
             
             if DEBUGLEVEL:
                 logger.info(f"Aggiornata statistica {stat_name} a {value}")
@@ -568,17 +647,11 @@ class SaveManager:
         Returns:
             bool: True se l'aggiornamento è riuscito, False altrimenti
         """
-        global json_data
-        
         try:
-            if not json_data:
+            if not self.json_data:
                 return False
                 
-            json_data["teamName"] = {"value": name}
-            
-            # Aggiorna il riferimento a json_data
-            self.json_data = json_data
-            self.save_data = json_data
+            TEAM_NAME.set(self.json_data, name, create=True)
             
             if DEBUGLEVEL:
                 logger.info(f"Aggiornato nome del team: {name}")
@@ -600,12 +673,9 @@ class SaveManager:
             if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
                 return {}
                 
-            data = self.json_data["dictionaryOfDictionaries"]["value"]
-            
-            if "runStats" not in data:
+            stats = RUN_STATS.get(self.json_data)
+            if stats is None:
                 return {}
-                
-            stats = data["runStats"]
             
             if DEBUGLEVEL:
                 logger.info(f"Statistiche di gioco ottenute: {len(stats)} elementi")
@@ -624,10 +694,10 @@ class SaveManager:
             str: Nome del team
         """
         try:
-            if not self.json_data or "teamName" not in self.json_data:
+            if not self.json_data:
                 return ""
                 
-            return self.json_data["teamName"].get("value", "")
+            return TEAM_NAME.get(self.json_data, "")
             
         except Exception as e:
             if DEBUGLEVEL:
@@ -640,8 +710,7 @@ class SaveManager:
         Returns:
             dict: Dati JSON completi
         """
-        global json_data
-        return json_data
+        return self.json_data
     
     def update_json_data(self, new_data):
         """Aggiorna i dati JSON completi
@@ -652,12 +721,10 @@ class SaveManager:
         Returns:
             bool: True se l'aggiornamento è riuscito, False altrimenti
         """
-        global json_data
-        
         try:
-            json_data = new_data
             self.json_data = new_data
             self.save_data = new_data
+            journal(new_data)
             
             if DEBUGLEVEL:
                 logger.info("Dati JSON aggiornati completamente")
@@ -678,14 +745,12 @@ class SaveManager:
         Returns:
             dict: Dizionario con gli upgrade del giocatore
         """
-        global json_data
-        
         upgrades = {}
         
-        if not json_data or "dictionaryOfDictionaries" not in json_data:
+        if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
             return upgrades
             
-        data = json_data["dictionaryOfDictionaries"]["value"]
+        table = self.get_player_table(self.json_data)
         
         # Mappa degli upgrade e relativi campi
         upgrade_mapping = {
@@ -703,13 +768,33 @@ class SaveManager:
         
         # Estrai tutti gli upgrade disponibili
         for ui_field, data_field in upgrade_mapping.items():
-            if data_field in data and player_id in data[data_field]:
-                upgrades[ui_field] = data[data_field][player_id]
-            else:
-                upgrades[ui_field] = 0
+            upgrades[ui_field] = table.get(player_id, data_field, 0)
         
         return upgrades
     
+    def apply_player_batch(self, operations):
+        """Applica in un solo passaggio una serie di modifiche ai giocatori
+        
+        Tutte le operazioni vengono validate prima di scrivere: se una non è
+        valida viene sollevato BatchError e il salvataggio resta invariato.
+        
+        Args:
+            operations: Tuple (giocatore, campo, valore); il giocatore è uno
+                Steam ID, un nome o "*" per tutti i giocatori
+            
+        Returns:
+            ChangeSet: Valori effettivamente cambiati
+        """
+        if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
+            raise BatchError(["Nessun dato JSON valido disponibile"])
+        
+        changes = apply_batch(self.get_player_table(self.json_data), operations)
+        
+        if DEBUGLEVEL:
+            logger.info(f"Modifiche ai giocatori applicate: {len(changes)} valori cambiati")
+        
+        return changes
+    
     def save_player_changes(self, player_id, data):
         """Salva le modifiche ai dati del giocatore
         
@@ -720,22 +805,20 @@ class SaveManager:
         Returns:
             bool: True se le modifiche sono state salvate con successo
         """
-        global json_data
-        
         try:
-            if not json_data or "dictionaryOfDictionaries" not in json_data:
+            if not self.json_data or "dictionaryOfDictionaries" not in self.json_data:
                 if DEBUGLEVEL:
                     logger.error("Nessun dato JSON valido disponibile")
                 return False
             
-            # Aggiorna la salute del giocatore
+            # Salute e upgrade vengono validati e applicati insieme, o per niente
+            operations = []
             if 'health' in data:
-                self.update_player_data(player_id, "health", data['health'])
-            
-            # Aggiorna gli upgrade del giocatore
-            if 'upgrades' in data:
-                for upgrade_key, value in data['upgrades'].items():
-                    self.update_player_data(player_id, f"upgrade_{upgrade_key}", value)
+                operations.append((player_id, "health", data['health']))
+            for upgrade_key, value in data.get('upgrades', {}).items():
+                operations.append((player_id, f"upgrade_{upgrade_key}", value))
+            if operations:
+                self.apply_player_batch(operations)
             
             # Aggiorna i dati di gioco generali
             if 'game_data' in data: